@@ -1,88 +1,332 @@
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Query
+from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, or_
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import StreamingResponse, Response
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import func, and_, or_, case, table, column
 from openpyxl import load_workbook
 from typing import List, Optional
 import io
+import os
 import re
-
-from app.database import engine, get_db, Base
+import json
+import threading
+import time
+import uuid
+import shutil
+import tempfile
+import secrets
+import hashlib
+import zlib
+import unicodedata
+import asyncio
+from collections import namedtuple
+from contextlib import contextmanager
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+
+try:
+    import orjson
+except ImportError:  # sin orjson se usa json de la stdlib
+    orjson = None
+
+from app.database import engine, get_db, Base, SessionLocal
 from app.models.models import (
     Sede, Cuatrimestre, Catedra, Docente, DocenteSede,
     Alumno, Curso, CatedraCurso, Asignacion, Inscripcion
 )
+from app.parseo import (
+    abrir_planilla, parsear_hojas, parsear_hoja_alumnos, parsear_hoja_bce_bea,
+    normalizar_sede, clasificar_alumno_curso, extraer_turno_materia,
+)
 
 Base.metadata.create_all(bind=engine)
 
 app = FastAPI(title="Sistema Horarios IEA", version="16.0")
 
+# Listados de varios MB: se comprimen si el cliente acepta gzip (es el middleware más interno)
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+# ===== v17.0: ETag / If-None-Match en lecturas pesadas =====
+# El ETag sale de la versión de datos (ver data_version) y no del cuerpo: si coincide, se responde 304
+# sin tocar la base ni serializar. Se registra antes que CORS para que los 304 también lleven sus headers.
+_BOOT_ID = secrets.token_hex(4)  # distingue reinicios: los contadores vuelven a cero
+ETAG_RUTAS = {
+    "/api/sedes", "/api/cuatrimestres", "/api/catedras", "/api/catedras/stats",
+    "/api/catedras/necesitan-docente", "/api/catedras/criterio-apertura", "/api/inscriptos/por-curso",
+    "/api/docentes", "/api/docentes/estadisticas", "/api/cursos", "/api/edi-inscripciones",
+    "/api/horarios/solapamientos", "/api/dashboard", "/api/plan-carrera/sugerencias",
+    "/api/sugerencias-armado", "/api/solapamientos-carreras",
+}
+# Lecturas que cruzan cuatrimestres aunque lleguen con ?cuatrimestre_id=: usan la versión total.
+# /api/docentes: tipo_modalidad sale de las asignaciones de todos los cuatrimestres.
+# asignacion_id (horarios/solapamientos): filtra por el cuatrimestre de la asignación, no el del query.
+ETAG_RUTAS_VERSION_TOTAL = {"/api/docentes"}
+ETAG_PARAMS_VERSION_TOTAL = {"asignacion_id"}
+
+@app.middleware("http")
+async def etag_por_version(request: Request, call_next):
+    if request.method != "GET" or request.url.path not in ETAG_RUTAS:
+        return await call_next(request)
+    try: cuat = int(request.query_params.get("cuatrimestre_id") or 0) or None
+    except ValueError: return await call_next(request)
+    if request.url.path in ETAG_RUTAS_VERSION_TOTAL or ETAG_PARAMS_VERSION_TOTAL & request.query_params.keys():
+        cuat = None
+    # La versión se toma antes de ejecutar el endpoint: una escritura concurrente invalida el ETag
+    version = ".".join(str(v) for v in data_version(cuat))
+    gz = "gzip" in request.headers.get("accept-encoding", "")  # el cuerpo comprimido es otra representación
+    recurso = zlib.crc32(f"{request.url.path}?{request.url.query}|{gz}".encode()) & 0xffffffff
+    etag = f'"{_BOOT_ID}-{recurso:08x}-{version}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in [t.strip() for t in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+    response = await call_next(request)
+    if response.status_code == 200: response.headers.update(headers)
+    return response
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=False,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Total-Count", "ETag"],
 )
 
 # ==================== HELPERS ====================
 
+class JSONRapida(Response):
+    """Respuesta JSON que serializa dicts/listas planos directamente (orjson si está instalado),
+    sin pasar por jsonable_encoder. Los endpoints la devuelven explícitamente."""
+    media_type = "application/json"
+
+    def render(self, content):
+        if orjson is not None:
+            return orjson.dumps(content, default=str, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+# ===== v17.0: Ingesta de planillas =====
+# UploadFile ya es un SpooledTemporaryFile (en memoria hasta 1 MB, después en disco): se abre directo,
+# sin file.read() ni BytesIO, siempre read-only para que openpyxl recorra las filas en streaming.
+# Además de xlsx se aceptan CSV/TSV (export del SIS), que se leen con el módulo csv sin pasar por openpyxl.
+# La lectura (abrir_planilla) y el parseo por hoja viven en app/parseo.py.
+MAX_UPLOAD_MB = int(os.environ.get("MAX_UPLOAD_MB", "60"))
+
+def verificar_tamano_upload(file):
+    f = file.file
+    f.seek(0, 2)
+    if f.tell() > MAX_UPLOAD_MB * 1024 * 1024:
+        raise HTTPException(status_code=413, detail=f"Archivo demasiado grande (máximo {MAX_UPLOAD_MB} MB)")
+    f.seek(0)
+    return f
+
+def titulo_upload(file):
+    """Nombre de la única hoja de un CSV: el del archivo subido (plan de carrera lo usa como sede)."""
+    return os.path.splitext(file.filename or "")[0][:31] or "Hoja1"
+
+def abrir_excel(file):
+    return abrir_planilla(verificar_tamano_upload(file), titulo_upload(file))
+
+def copiar_upload(file):
+    """Copia el upload a un archivo con nombre (lo pueden abrir otros threads/procesos). Lo borra quien lo usa."""
+    origen = verificar_tamano_upload(file)
+    # Misma extensión que el upload; el formato real se detecta por contenido (ver abrir_planilla)
+    with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename or "")[1].lower()) as tmp:
+        shutil.copyfileobj(origen, tmp)
+    return tmp.name
+
+@contextmanager
+def upload_en_disco(file):
+    ruta = copiar_upload(file)
+    try:
+        yield ruta
+    finally:
+        try: os.remove(ruta)
+        except OSError: pass
+
 def sort_key_codigo(codigo):
     m = re.match(r'c\.(\d+)', codigo or '', re.IGNORECASE)
     return int(m.group(1)) if m else 9999
 
-SEDES_NORMALIZADAS = {
-    'avellaneda': 'Avellaneda',
-    'caballito': 'Caballito',
-    'vicente lopez': 'Vicente López',
-    'vicente lópez': 'Vicente López',
-    'online interior': 'Online - Interior',
-    'online - interior': 'Online - Interior',
-    'online- interior': 'Online - Interior',
-    'online': 'Online - Interior',
-    'liniers': 'Liniers',
-}
+@lru_cache(maxsize=8192)
+def normalizar_nombre(texto):
+    """Minúsculas, sin acentos y con espacios colapsados: clave para comparar nombres."""
+    t = unicodedata.normalize('NFD', (texto or '').lower())
+    return ' '.join(''.join(c for c in t if unicodedata.category(c) != 'Mn').split())
 
-def normalizar_sede(texto):
-    if not texto:
-        return None
-    t = texto.strip().lower()
-    return SEDES_NORMALIZADAS.get(t, texto.strip())
+def clasificar_curso(curso_raw):
+    """
+    Clasificación completa de un texto de CURSO tal como se guarda en inscripciones.curso_nombre.
+    Se calcula una sola vez por texto y se persiste en curso_clasificado (ver registrar_cursos_clasificados).
+    """
+    modalidad_alumno, sede, es_cied = clasificar_alumno_curso(curso_raw)
+    nombre_limpio = re.split(r'\s*[-–]\s*(?:CIED|Cursada)', curso_raw, maxsplit=1)[0].strip()
+    nombre_limpio = re.split(r'\s*\(', nombre_limpio, maxsplit=1)[0].strip()
+    up = curso_raw.upper()
+    es_bce = 'BCE' in up or 'SECUNDARIO' in up
+    tipo_curso = 'BCE' if es_bce else ('BEA' if 'BEA' in up else 'Superior')
+    return {
+        "curso_nombre": curso_raw, "nombre_limpio": nombre_limpio, "sede": sede,
+        "modalidad": 'CIED' if modalidad_alumno == 'virtual' else 'Presencial',
+        "tipo_curso": tipo_curso, "carrera": _extract_carrera(curso_raw),
+    }
+
+def registrar_cursos_clasificados(db, cursos):
+    """Persiste la clasificación de los textos de curso nuevos. Hace commit propio: llamar después del commit del import."""
+    from sqlalchemy import text
+    filas = [clasificar_curso(c) for c in {c for c in cursos if c}]
+    if not filas: return 0
+    try:
+        db.execute(text("""INSERT INTO curso_clasificado (curso_nombre, nombre_limpio, sede, modalidad, tipo_curso, carrera)
+            VALUES (:curso_nombre, :nombre_limpio, :sede, :modalidad, :tipo_curso, :carrera)
+            ON CONFLICT (curso_nombre) DO NOTHING"""), filas)
+        db.commit()
+        return len(filas)
+    except Exception:
+        db.rollback()
+        return 0
 
-def clasificar_alumno_curso(curso_texto):
+def sincronizar_cursos_clasificados(db):
+    """Clasifica los curso_nombre de inscripciones que todavía no están en curso_clasificado."""
+    from sqlalchemy import text
+    try:
+        rows = db.execute(text("""SELECT DISTINCT i.curso_nombre FROM inscripciones i
+            LEFT JOIN curso_clasificado cc ON cc.curso_nombre = i.curso_nombre
+            WHERE cc.curso_nombre IS NULL AND i.curso_nombre IS NOT NULL AND i.curso_nombre != ''""")).fetchall()
+    except Exception:
+        db.rollback()
+        return 0
+    return registrar_cursos_clasificados(db, [r[0] for r in rows])
+
+# ===== v17.0: Rollup de inscripciones =====
+# inscripciones_rollup guarda COUNT(*) por (cuatrimestre, cátedra, turno, sede_key, modalidad).
+# Los NULL se guardan como '' para que la clave primaria funcione; sede_key: 'av' | 'cab' | 'vl' | '' (CIED).
+_SEDE_KEY_SQL = """CASE WHEN LOWER(sede_referencia) LIKE '%avellaneda%' THEN 'av'
+    WHEN LOWER(sede_referencia) LIKE '%caballito%' THEN 'cab'
+    WHEN LOWER(sede_referencia) LIKE '%vicente%' THEN 'vl' ELSE '' END"""
+_ROLLUP = table("inscripciones_rollup", column("cuatrimestre_id"), column("catedra_id"), column("turno"),
+    column("sede_key"), column("modalidad"), column("count"))
+
+def refrescar_rollup(db, cuatrimestre_id=None, catedra_ids=None):
     """
-    Clasifica un alumno según su CURSO:
-    - es_cied: True si dice CIED o es Online/Interior
-    - sede_referencia: sede normalizada extraída del paréntesis
-    - modalidad_alumno: 'virtual' si CIED/Online, 'presencial' si no
+    Recalcula el rollup de las cátedras tocadas (o de todo el cuatrimestre / toda la tabla).
+    No hace commit: se llama antes del commit del import para quedar en la misma transacción.
     """
-    if not curso_texto:
-        return 'virtual', None, True
-    curso = curso_texto.strip()
-    es_cied = 'CIED' in curso.upper()
-    # Extraer sede del paréntesis
-    m_sede = re.search(r'\(([^)]+)\)', curso)
-    sede_raw = m_sede.group(1).strip() if m_sede else None
-    sede = normalizar_sede(sede_raw) if sede_raw else None
-    # Online-Interior siempre es virtual (igual que CIED)
-    es_online = sede in ['Online - Interior'] if sede else False
-    if es_cied or es_online:
-        modalidad = 'virtual'
-    else:
-        modalidad = 'presencial'
-    return modalidad, sede, es_cied
-
-def extraer_turno_materia(materia_texto):
-    """Extrae el turno de la columna MATERIA: Mañana, Noche, Virtual"""
-    if not materia_texto:
-        return None
-    m = re.search(r'-\s*(Mañana|Noche|Virtual|Tarde)', materia_texto, re.IGNORECASE)
-    return m.group(1).capitalize() if m else None
+    from sqlalchemy import text
+    filtros = []
+    if cuatrimestre_id: filtros.append(f"cuatrimestre_id = {int(cuatrimestre_id)}")
+    if catedra_ids is not None:
+        if not catedra_ids: return
+        filtros.append(f"catedra_id IN ({','.join(str(int(c)) for c in catedra_ids)})")
+    where = f" WHERE {' AND '.join(filtros)}" if filtros else ""
+    db.flush()
+    db.execute(text(f"DELETE FROM inscripciones_rollup{where}"))
+    db.execute(text(f"""INSERT INTO inscripciones_rollup (cuatrimestre_id, catedra_id, turno, sede_key, modalidad, count)
+        SELECT cuatrimestre_id, catedra_id, COALESCE(turno, ''), sede_key, COALESCE(modalidad_alumno, ''), COUNT(*)
+        FROM (SELECT cuatrimestre_id, catedra_id, turno, modalidad_alumno, {_SEDE_KEY_SQL} AS sede_key
+            FROM inscripciones{where}) i
+        GROUP BY cuatrimestre_id, catedra_id, COALESCE(turno, ''), sede_key, COALESCE(modalidad_alumno, '')"""))
+
+
+# ==================== VERSIÓN DE DATOS ====================
+# Contadores en memoria que invalidan los caches derivados (índices, agregados).
+# Cambios sin cuatrimestre (cátedras, docentes, disponibilidad) afectan a todos los cuatrimestres.
+_DATA_VERSION = {"total": 0, "global": 0, "cuat": {}}
+_DATA_VERSION_LOCK = threading.Lock()
+# Funciones hook(cuatrimestre_id) llamadas en cada bump local. Con varios workers, un hook puede
+# publicar el cambio (NOTIFY, Redis, HTTP...) y los demás lo aplican vía POST /api/cache/invalidar.
+_INVALIDACION_HOOKS = []
+
+def bump_data_version(cuatrimestre_id=None, propagar=True):
+    with _DATA_VERSION_LOCK:
+        _DATA_VERSION["total"] += 1
+        if cuatrimestre_id:
+            _DATA_VERSION["cuat"][cuatrimestre_id] = _DATA_VERSION["cuat"].get(cuatrimestre_id, 0) + 1
+        else:
+            _DATA_VERSION["global"] += 1
+    if propagar:
+        for hook in _INVALIDACION_HOOKS:
+            try: hook(cuatrimestre_id)
+            except Exception: pass
+
+def data_version(cuatrimestre_id=None):
+    if not cuatrimestre_id: return (_DATA_VERSION["total"],)
+    return (_DATA_VERSION["global"], _DATA_VERSION["cuat"].get(cuatrimestre_id, 0))
 
 
 # ==================== MIGRACIÓN ====================
 
+# v17.0: Índices de los caminos de acceso calientes (importadores, desgloses, asignaciones, disponibilidad).
+# La unicidad de inscripciones (alumno, cátedra, cuatrimestre) se crea aparte porque requiere deduplicar.
+INDICES = [
+    ('ix_inscripciones_cuat_catedra', """CREATE INDEX IF NOT EXISTS ix_inscripciones_cuat_catedra
+        ON inscripciones (cuatrimestre_id, catedra_id) INCLUDE (turno, modalidad_alumno, sede_referencia)"""),
+    ('ix_inscripciones_cuat_modalidad', "CREATE INDEX IF NOT EXISTS ix_inscripciones_cuat_modalidad ON inscripciones (cuatrimestre_id, modalidad_alumno)"),
+    ('ix_inscripciones_catedra', "CREATE INDEX IF NOT EXISTS ix_inscripciones_catedra ON inscripciones (catedra_id)"),
+    ('ix_inscripciones_edi', "CREATE INDEX IF NOT EXISTS ix_inscripciones_edi ON inscripciones (cuatrimestre_id, catedra_id) WHERE es_edi = TRUE"),
+    ('ix_asignaciones_catedra_cuat', "CREATE INDEX IF NOT EXISTS ix_asignaciones_catedra_cuat ON asignaciones (catedra_id, cuatrimestre_id)"),
+    ('ix_asignaciones_docente_cuat', "CREATE INDEX IF NOT EXISTS ix_asignaciones_docente_cuat ON asignaciones (docente_id, cuatrimestre_id)"),
+    ('ix_asignaciones_cuat_dia_hora', "CREATE INDEX IF NOT EXISTS ix_asignaciones_cuat_dia_hora ON asignaciones (cuatrimestre_id, dia, hora_inicio)"),
+    ('ix_disponibilidad_mask_cuat', """CREATE INDEX IF NOT EXISTS ix_disponibilidad_mask_cuat
+        ON docente_disponibilidad_mask (cuatrimestre_id) INCLUDE (docente_id, mascara)"""),
+    ('ix_docente_sede_docente', "CREATE INDEX IF NOT EXISTS ix_docente_sede_docente ON docente_sede (docente_id)"),
+    ('ix_catedra_curso_catedra', "CREATE INDEX IF NOT EXISTS ix_catedra_curso_catedra ON catedra_curso (catedra_id)"),
+    ('ix_cursos_nombre', "CREATE INDEX IF NOT EXISTS ix_cursos_nombre ON cursos (nombre)"),
+]
+
+# Consultas representativas de cada camino: /api/diagnostico/indices verifica con EXPLAIN que usen índice.
+CONSULTAS_INDEXADAS = [
+    ('inscripcion por alumno+cátedra+cuatrimestre', "SELECT id FROM inscripciones WHERE alumno_id = 1 AND catedra_id = 1 AND cuatrimestre_id = 1"),
+    ('inscripciones por cuatrimestre+modalidad', "SELECT COUNT(*) FROM inscripciones WHERE cuatrimestre_id = 1 AND modalidad_alumno = 'virtual'"),
+    ('rollup: inscripciones por cuatrimestre+cátedras', "SELECT catedra_id, turno, modalidad_alumno, sede_referencia FROM inscripciones WHERE cuatrimestre_id = 1 AND catedra_id IN (1, 2)"),
+    ('inscripciones EDI', "SELECT id FROM inscripciones WHERE es_edi = TRUE AND cuatrimestre_id = 1"),
+    ('asignaciones por cátedra+cuatrimestre', "SELECT id FROM asignaciones WHERE catedra_id = 1 AND cuatrimestre_id = 1"),
+    ('asignaciones por docente', "SELECT id FROM asignaciones WHERE docente_id = 1"),
+    ('solapamiento por día y hora', "SELECT id FROM asignaciones WHERE cuatrimestre_id = 1 AND dia = 'Lunes' AND hora_inicio = '19:00'"),
+    ('disponibilidad vigente del cuatrimestre', "SELECT docente_id, cuatrimestre_id, mascara FROM docente_disponibilidad_mask WHERE cuatrimestre_id IN (0, 1) ORDER BY cuatrimestre_id"),
+    ('rollup por cuatrimestre', "SELECT catedra_id, count FROM inscripciones_rollup WHERE cuatrimestre_id = 1"),
+]
+
+# v17.0: El upsert de alumnos (ON CONFLICT) necesita una inscripción por (alumno, cátedra, cuatrimestre).
+# Si hay duplicados, borrarlos es irreversible: el arranque solo lo hace con DEDUPLICAR_INSCRIPCIONES=1;
+# si no, informa cuántos hay y deja el índice sin crear (también: POST /api/inscripciones/deduplicar).
+DEDUPLICAR_INSCRIPCIONES = os.environ.get("DEDUPLICAR_INSCRIPCIONES", "") == "1"
+
+def hay_indice_unico_inscripciones(db):
+    from sqlalchemy import text
+    return db.execute(text("SELECT 1 FROM pg_indexes WHERE indexname = 'uq_inscripciones_alumno_catedra_cuat'")).fetchone() is not None
+
+def exigir_indice_unico_inscripciones(db):
+    """Los importadores de alumnos hacen ON CONFLICT sobre el índice único: sin él, 409 explicando cómo crearlo."""
+    if not hay_indice_unico_inscripciones(db):
+        raise HTTPException(status_code=409, detail="Falta el índice único de inscripciones porque hay inscripciones "
+            "duplicadas. Deduplicarlas con POST /api/inscripciones/deduplicar (se conserva la más reciente) y reintentar.")
+
+def asegurar_unicidad_inscripciones(db, deduplicar=False):
+    """
+    Crea uq_inscripciones_alumno_catedra_cuat si falta. Devuelve (mensaje o None, inscripciones borradas).
+    Al deduplicar se conserva la fila de id mayor: la última escrita, como en el upsert ("la última fila manda").
+    """
+    from sqlalchemy import text
+    if hay_indice_unico_inscripciones(db):
+        return None, 0
+    dup = db.execute(text("""SELECT COALESCE(SUM(n - 1), 0) FROM (SELECT COUNT(*) AS n FROM inscripciones
+        GROUP BY alumno_id, catedra_id, cuatrimestre_id HAVING COUNT(*) > 1) d""")).scalar() or 0
+    if dup and not deduplicar:
+        return (f"⚠️ Índice único de inscripciones NO creado: hay {dup} inscripciones duplicadas y la importación "
+            "de alumnos lo necesita. Revisarlas y deduplicar con DEDUPLICAR_INSCRIPCIONES=1 o "
+            "POST /api/inscripciones/deduplicar (se conserva la más reciente)"), 0
+    borradas = 0
+    if dup:
+        borradas = db.execute(text("""DELETE FROM inscripciones a USING inscripciones b
+            WHERE a.alumno_id = b.alumno_id AND a.catedra_id = b.catedra_id
+            AND a.cuatrimestre_id = b.cuatrimestre_id AND a.id < b.id""")).rowcount
+    db.execute(text("""CREATE UNIQUE INDEX uq_inscripciones_alumno_catedra_cuat
+        ON inscripciones (alumno_id, catedra_id, cuatrimestre_id)"""))
+    db.commit()
+    return "✅ Índice único de inscripciones" + (f" ({borradas} duplicadas eliminadas, se conservó la más reciente)" if borradas else ""), borradas
+
 def run_migration(db):
     from sqlalchemy import text, inspect
     resultado = []
@@ -215,6 +459,18 @@ def run_migration(db):
                 id SERIAL PRIMARY KEY, sede VARCHAR NOT NULL, carrera VARCHAR NOT NULL,
                 anno VARCHAR, codigo_catedra VARCHAR NOT NULL, nombre_catedra VARCHAR,
                 dia_tm VARCHAR, hora_tm VARCHAR, dia_tn VARCHAR, hora_tn VARCHAR)"""),
+            ('curso_clasificado', """CREATE TABLE IF NOT EXISTS curso_clasificado (
+                curso_nombre VARCHAR PRIMARY KEY, nombre_limpio VARCHAR, sede VARCHAR,
+                modalidad VARCHAR, tipo_curso VARCHAR, carrera VARCHAR)"""),
+            ('docente_disponibilidad_mask', """CREATE TABLE IF NOT EXISTS docente_disponibilidad_mask (
+                docente_id INTEGER NOT NULL REFERENCES docentes(id) ON DELETE CASCADE,
+                cuatrimestre_id INTEGER NOT NULL DEFAULT 0, mascara NUMERIC(28, 0) NOT NULL DEFAULT 0,
+                PRIMARY KEY (docente_id, cuatrimestre_id))"""),
+            ('inscripciones_rollup', """CREATE TABLE IF NOT EXISTS inscripciones_rollup (
+                cuatrimestre_id INTEGER NOT NULL, catedra_id INTEGER NOT NULL,
+                turno VARCHAR NOT NULL DEFAULT '', sede_key VARCHAR NOT NULL DEFAULT '',
+                modalidad VARCHAR NOT NULL DEFAULT '', count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (cuatrimestre_id, catedra_id, turno, sede_key, modalidad))"""),
         ]:
             if tbl not in tables:
                 try:
@@ -223,6 +479,52 @@ def run_migration(db):
                     resultado.append(f"✅ Tabla {tbl}")
                 except Exception as e:
                     db.rollback()
+        # --- v17.0: Una inscripción por (alumno, cátedra, cuatrimestre): la usa el upsert de alumnos ---
+        try:
+            mensaje, _ = asegurar_unicidad_inscripciones(db, DEDUPLICAR_INSCRIPCIONES)
+            if mensaje: resultado.append(mensaje)
+        except Exception as e:
+            db.rollback()
+            resultado.append(f"❌ Índice único de inscripciones: {str(e)[:200]}")
+        # --- v17.0: Índices de acceso ---
+        for idx, ddl in INDICES:
+            try:
+                db.execute(text(ddl))
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                resultado.append(f"⚠️ Índice {idx}: {str(e)[:100]}")
+        # --- v17.0: Pasar la disponibilidad fila-por-franja a bitmask ---
+        # Se decide por los datos y no por la existencia de la tabla (que se crea más arriba): mientras
+        # docente_disponibilidad_mask esté vacía y la tabla vieja tenga filas, cada arranque reintenta.
+        # Después de la migración el PUT guarda también las máscaras en 0, así que la tabla no se vacía.
+        if 'docente_disponibilidad' in tables:
+            try:
+                if not db.execute(text("SELECT 1 FROM docente_disponibilidad_mask LIMIT 1")).fetchone():
+                    masks = {}; omitidas = 0
+                    for did, dia, hora in db.execute(text("SELECT docente_id, dia, hora FROM docente_disponibilidad WHERE disponible = TRUE")).fetchall():
+                        bit = slot_mask(dia, hora)
+                        if not bit: omitidas += 1; continue
+                        masks[did] = masks.get(did, 0) | bit
+                    if masks:
+                        n = guardar_disponibilidad(db, masks)
+                        db.commit()
+                        resultado.append(f"✅ docente_disponibilidad_mask: {n} docentes migrados")
+                    if omitidas:
+                        resultado.append(f"⚠️ docente_disponibilidad: {omitidas} franjas fuera de la grilla (día/hora desconocidos) no se migraron")
+            except Exception as e:
+                db.rollback()
+                resultado.append(f"❌ Migración de disponibilidad a bitmask: {str(e)[:200]}")
+        # --- v17.0: Clasificar cursos ya importados ---
+        n_cursos = sincronizar_cursos_clasificados(db)
+        if n_cursos: resultado.append(f"✅ curso_clasificado: {n_cursos} cursos")
+        # --- v17.0: Reconstruir rollup de inscripciones (también corrige cambios hechos fuera de la API) ---
+        try:
+            refrescar_rollup(db)
+            db.commit()
+            resultado.append("✅ inscripciones_rollup reconstruido")
+        except Exception as e:
+            db.rollback()
         # --- Limpiar sedes duplicadas ---
         try:
             sede_sin = db.query(Sede).filter(Sede.nombre == "Vicente Lopez").first()
@@ -313,8 +615,54 @@ def reparar_bd(db: Session = Depends(get_db)):
         db.commit()
     except Exception as e:
         resultado.append(f"⚠️ {e}")
+    bump_data_version()
     return {"resultado": resultado}
 
+@app.get("/api/diagnostico/indices")
+def diagnostico_indices(forzar: bool = False, db: Session = Depends(get_db)):
+    """
+    EXPLAIN de cada consulta de CONSULTAS_INDEXADAS con el planner tal cual: muestra el plan que se usaría
+    hoy. Con tablas chicas o sin ANALYZE, un Seq Scan puede ser la elección correcta y no indica un índice
+    faltante. forzar=true corre con enable_seqscan = off (solo en esta transacción): así solo se verifica
+    que exista un índice aplicable, no que el planner lo vaya a elegir.
+    """
+    from sqlalchemy import text
+    def nodos(plan):
+        yield plan
+        for sub in plan.get("Plans", []): yield from nodos(sub)
+    result = []
+    def configurar():
+        if forzar: db.execute(text("SET LOCAL enable_seqscan = off"))
+    try:
+        configurar()
+        for nombre, sql in CONSULTAS_INDEXADAS:
+            try:
+                plan = db.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+                if isinstance(plan, str): plan = json.loads(plan)
+                plan_nodos = list(nodos(plan[0]["Plan"]))
+                indices = sorted({n["Index Name"] for n in plan_nodos if n.get("Index Name")})
+                result.append({"consulta": nombre, "usa_indice": bool(indices), "indices": indices,
+                    "nodos": [n["Node Type"] for n in plan_nodos]})
+            except Exception as e:
+                db.rollback(); configurar()
+                result.append({"consulta": nombre, "usa_indice": False, "error": str(e)[:200]})
+    finally:
+        db.rollback()
+    return {"ok": all(r["usa_indice"] for r in result), "forzado": forzar, "consultas": result}
+
+@app.post("/api/inscripciones/deduplicar")
+def deduplicar_inscripciones(db: Session = Depends(get_db)):
+    """Borra inscripciones repetidas (queda la más reciente) y crea el índice único. Irreversible."""
+    try:
+        mensaje, borradas = asegurar_unicidad_inscripciones(db, deduplicar=True)
+        if borradas:
+            refrescar_rollup(db); db.commit()
+            bump_data_version()
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=str(e)[:300])
+    return {"borradas": borradas, "mensaje": mensaje or "El índice único ya existía: no hay duplicados"}
+
 @app.get("/api/diagnostico")
 def diagnostico_bd(db: Session = Depends(get_db)):
     from sqlalchemy import text, inspect
@@ -337,101 +685,252 @@ def login(data: dict):
 
 @app.get("/api/sedes")
 def get_sedes(db: Session = Depends(get_db)):
-    return [{"id": s.id, "nombre": s.nombre, "color": s.color} for s in db.query(Sede).all()]
+    return [s._asdict() for s in referencias(db).sedes]
 
 @app.get("/api/cuatrimestres")
 def get_cuatrimestres(db: Session = Depends(get_db)):
-    return [{"id": c.id, "nombre": c.nombre, "anio": c.anio, "numero": c.numero, "activo": c.activo}
-            for c in db.query(Cuatrimestre).order_by(Cuatrimestre.anio, Cuatrimestre.numero).all()]
+    return [c._asdict() for c in referencias(db).cuatrimestres]
+
+
+# ==================== DATOS DE REFERENCIA ====================
+# Snapshot inmutable de sedes, cuatrimestres y cátedras compartido entre requests. Se reconstruye
+# cuando cambia la parte global de data_version (toda escritura de cátedras/sedes la incrementa).
+SedeRef = namedtuple('SedeRef', 'id nombre color')
+CuatrimestreRef = namedtuple('CuatrimestreRef', 'id nombre anio numero activo')
+CatedraRef = namedtuple('CatedraRef', 'id codigo nombre')
+Referencias = namedtuple('Referencias', 'version sedes sede_por_id sede_por_nombre sede_por_clave sede_indice '
+    'cuatrimestres cuatrimestre_por_id catedras catedra_por_codigo catedra_por_nombre catedra_indice')
+_REFERENCIAS = {"snapshot": None}
+_REFERENCIAS_LOCK = threading.Lock()
+
+def _cargar_referencias(db, version):
+    sedes = tuple(SedeRef(s.id, s.nombre, s.color) for s in db.query(Sede).order_by(Sede.id).all())
+    cuats = tuple(CuatrimestreRef(c.id, c.nombre, c.anio, c.numero, c.activo)
+        for c in db.query(Cuatrimestre).order_by(Cuatrimestre.anio, Cuatrimestre.numero).all())
+    cats = {c.id: CatedraRef(c.id, c.codigo, c.nombre) for c in db.query(Catedra).order_by(Catedra.id).all()}
+    por_nombre = {}
+    catedra_indice = IndiceNombres()
+    for c in cats.values():
+        por_nombre.setdefault(normalizar_nombre(c.nombre), c)  # ante nombres repetidos gana el id menor
+        catedra_indice.agregar(c.nombre, c)
+    sede_indice = IndiceNombres()
+    for s in sedes: sede_indice.agregar(s.nombre, s)
+    return Referencias(
+        version=version, sedes=sedes,
+        sede_por_id=MappingProxyType({s.id: s for s in sedes}),
+        sede_por_nombre=MappingProxyType({s.nombre: s for s in sedes}),
+        sede_por_clave=MappingProxyType({normalizar_nombre(s.nombre).replace(' ', ''): s for s in sedes}),
+        sede_indice=sede_indice,
+        cuatrimestres=cuats, cuatrimestre_por_id=MappingProxyType({c.id: c for c in cuats}),
+        catedras=MappingProxyType(cats),
+        catedra_por_codigo=MappingProxyType({c.codigo: c for c in cats.values()}),
+        catedra_por_nombre=MappingProxyType(por_nombre),
+        catedra_indice=catedra_indice,
+    )
+
+def referencias(db):
+    """Snapshot vigente de datos de referencia (solo lectura: CatedraRef/SedeRef, no objetos ORM)."""
+    version = _DATA_VERSION["global"]
+    snap = _REFERENCIAS["snapshot"]
+    if snap is not None and snap.version == version: return snap
+    with _REFERENCIAS_LOCK:
+        snap = _REFERENCIAS["snapshot"]
+        if snap is None or snap.version != version:
+            snap = _cargar_referencias(db, version)
+            _REFERENCIAS["snapshot"] = snap
+    return snap
+
+@app.post("/api/cache/invalidar")
+def invalidar_cache(cuatrimestre_id: int = None):
+    """Invalida los caches de este worker (p. ej. tras un cambio hecho por otro worker)."""
+    bump_data_version(cuatrimestre_id, propagar=False)
+    return {"ok": True, "version": data_version(cuatrimestre_id)}
+
+
+# ===== v17.0: Búsqueda de nombres indexada =====
+# Los importadores resuelven nombres escritos a mano (docentes, sedes, materias) con la regla: clave
+# exacta y, si no, la primera clave que contiene al texto o está contenida en él. IndiceNombres aplica
+# esa misma regla sin recorrer todas las claves y memoriza cada consulta.
+DocenteRef = namedtuple('DocenteRef', 'id nombre apellido')
+_INDICE_DOCENTES = {"version": None, "indice": None}
+_INDICE_DOCENTES_LOCK = threading.Lock()
+
+class IndiceNombres:
+    """
+    Claves y consultas se comparan plegadas con normalizar_nombre (sin acentos ni mayúsculas); alias
+    (p. ej. DOCENTE_TYPO_MAP) se normaliza una vez y se aplica a la consulta antes de buscar.
+    - texto ⊂ clave: candidatas = intersección del índice invertido de trigramas del texto;
+    - clave ⊂ texto: se buscan en el dict los substrings del texto con largo de alguna clave.
+    Desempate determinístico: gana la clave dada de alta primero (a igual clave, el primer valor).
+    """
+    N = 3
+
+    def __init__(self, alias=None):
+        self._claves = []  # rango → clave
+        self._valores = []  # rango → valor
+        self._rango = {}  # clave → rango
+        self._largos = set()
+        self._ngramas = {}  # trigrama → {rangos}
+        self._alias = {normalizar_nombre(k): normalizar_nombre(v) for k, v in (alias or {}).items()}
+        self._memo = {}
+
+    @classmethod
+    def _trigramas(cls, clave):
+        return {clave[i:i + cls.N] for i in range(len(clave) - cls.N + 1)}
+
+    def agregar(self, texto, valor):
+        clave = normalizar_nombre(texto)
+        if not clave or clave in self._rango: return
+        rango = len(self._claves)
+        self._claves.append(clave); self._valores.append(valor)
+        self._rango[clave] = rango
+        self._largos.add(len(clave))
+        for g in self._trigramas(clave):
+            self._ngramas.setdefault(g, set()).add(rango)
+        self._memo.clear()
+
+    def buscar(self, texto):
+        """Valor por clave exacta o, si no, por inclusión en cualquiera de los dos sentidos; None si no hay."""
+        return self._consultar(texto, True)
+
+    def buscar_parcial(self, texto):
+        """Valor por clave exacta o, si no, de la primera clave que contiene al texto."""
+        return self._consultar(texto, False)
+
+    def _consultar(self, texto, inversa):
+        q = normalizar_nombre(texto)
+        q = self._alias.get(q, q)
+        memo = (q, inversa)
+        if memo not in self._memo:
+            self._memo[memo] = self._resolver(q, inversa)
+        return self._memo[memo]
+
+    def _resolver(self, q, inversa):
+        rango = self._rango.get(q)
+        if rango is not None: return self._valores[rango]
+        candidatos = []
+        if len(q) >= self.N:
+            listas = sorted((self._ngramas.get(g, ()) for g in self._trigramas(q)), key=len)
+            if listas[0]:
+                comunes = set(listas[0]).intersection(*listas[1:])
+                candidatos.extend(r for r in comunes if q in self._claves[r])
+        else:  # consultas de 0-2 caracteres: no hay trigramas
+            candidatos.extend(r for r, clave in enumerate(self._claves) if q in clave)
+        if inversa:
+            for i in range(len(q)):
+                for largo in self._largos:
+                    r = self._rango.get(q[i:i + largo]) if i + largo <= len(q) else None
+                    if r is not None: candidatos.append(r)
+        return self._valores[min(candidatos)] if candidatos else None
+
+def indice_docentes(db):
+    """Docentes por apellido, 'apellido nombre' y 'nombre apellido', con DOCENTE_TYPO_MAP. Cacheado por versión global."""
+    version = _DATA_VERSION["global"]
+    if _INDICE_DOCENTES["version"] == version: return _INDICE_DOCENTES["indice"]
+    with _INDICE_DOCENTES_LOCK:
+        if _INDICE_DOCENTES["version"] != version:
+            indice = IndiceNombres(alias=DOCENTE_TYPO_MAP)
+            for did, nombre, apellido in db.query(Docente.id, Docente.nombre, Docente.apellido).order_by(Docente.id).all():
+                ref = DocenteRef(did, nombre, apellido)
+                indice.agregar(apellido, ref)
+                indice.agregar(f"{apellido or ''} {nombre or ''}", ref)
+                indice.agregar(f"{nombre or ''} {apellido or ''}", ref)
+            _INDICE_DOCENTES.update(version=version, indice=indice)
+    return _INDICE_DOCENTES["indice"]
+
+
+# ==================== CACHE DE INSCRIPCIONES ====================
+# Desglose turno × sede de inscripciones por cátedra, compartido por cátedras, necesitan-docente,
+# sugerencias y exportación. Se lee de inscripciones_rollup y se recalcula solo cuando cambia
+# data_version del cuatrimestre.
+SEDE_KEY_NOMBRE = {'av': 'Avellaneda', 'cab': 'Caballito', 'vl': 'Vicente López'}
+_DESGLOSE_CACHE = {}  # cuatrimestre_id → (version, desglose)
+_DESGLOSE_STATS = {"hits": 0, "misses": 0}
+
+def desglose_vacio():
+    return {'total': 0, 'tm_av': 0, 'tm_cab': 0, 'tm_vl': 0, 'tm_cied': 0,
+        'tn_av': 0, 'tn_cab': 0, 'tn_vl': 0, 'tn_cied': 0,
+        'virt_cied': 0, 'sin_clasificar': 0, 'combos': {}}
+
+def _calcular_desglose(db, cuatrimestre_id):
+    from sqlalchemy import text
+    q = "SELECT catedra_id, turno, modalidad, sede_key, SUM(count) FROM inscripciones_rollup"
+    if cuatrimestre_id: q += f" WHERE cuatrimestre_id = {cuatrimestre_id}"
+    q += " GROUP BY catedra_id, turno, modalidad, sede_key"
+    try:
+        rows = db.execute(text(q)).fetchall()
+    except Exception:
+        db.rollback(); rows = []
+    desglose = {}
+    for cat_id, turno, mod, sk, cnt in rows:
+        if cat_id not in desglose: desglose[cat_id] = desglose_vacio()
+        d = desglose[cat_id]
+        d['total'] += cnt
+        # Solo se desglosan las inscripciones ya clasificadas (con modalidad_alumno)
+        if not mod:
+            d['sin_clasificar'] += cnt
+            continue
+        turno = turno or None
+        sk = None if mod == 'virtual' else (sk or None)
+        if turno == 'Mañana': d[f"tm_{sk or 'cied'}"] += cnt
+        elif turno == 'Noche': d[f"tn_{sk or 'cied'}"] += cnt
+        else: d['virt_cied'] += cnt
+        combo = f"{turno or 'Virtual'}|{SEDE_KEY_NOMBRE.get(sk, 'CIED')}"
+        d['combos'][combo] = d['combos'].get(combo, 0) + cnt
+    return desglose
+
+def desglose_inscripciones(db, cuatrimestre_id=None):
+    """
+    catedra_id → {total, tm_av..tn_cied, virt_cied, sin_clasificar, combos{'turno|sede': n}}.
+    Resultado compartido entre requests: no modificar.
+    """
+    version = data_version(cuatrimestre_id)
+    cached = _DESGLOSE_CACHE.get(cuatrimestre_id)
+    if cached and cached[0] == version:
+        _DESGLOSE_STATS["hits"] += 1
+        return cached[1]
+    _DESGLOSE_STATS["misses"] += 1
+    desglose = _calcular_desglose(db, cuatrimestre_id)
+    _DESGLOSE_CACHE[cuatrimestre_id] = (version, desglose)
+    return desglose
+
+@app.get("/api/cache/estadisticas")
+def get_cache_estadisticas():
+    hits = _DESGLOSE_STATS["hits"]; misses = _DESGLOSE_STATS["misses"]
+    return {"desglose": {"hits": hits, "misses": misses,
+        "hit_ratio": round(hits / (hits + misses), 3) if hits + misses else None,
+        "entradas": len(_DESGLOSE_CACHE)},
+        "data_version": {"total": _DATA_VERSION["total"], "global": _DATA_VERSION["global"],
+            "por_cuatrimestre": dict(_DATA_VERSION["cuat"])}}
 
 
 # ==================== CÁTEDRAS ====================
 
 @app.get("/api/catedras")
 def get_catedras(cuatrimestre_id: int = None, db: Session = Depends(get_db)):
-    from sqlalchemy import text
     catedras = db.query(Catedra).all()
     catedras_sorted = sorted(catedras, key=lambda c: sort_key_codigo(c.codigo))
-    # Pre-cargar desglose: turno × (sede presencial o CIED)
-    # IMPORTANTE: solo contar inscripciones que YA fueron clasificadas (tienen turno y modalidad_alumno)
-    desglose_query = """
-        SELECT catedra_id,
-            turno,
-            modalidad_alumno,
-            sede_referencia,
-            COUNT(*) as cnt
-        FROM inscripciones
-        WHERE modalidad_alumno IS NOT NULL
-    """
+    # Desglose turno × (sede presencial o CIED), cacheado por cuatrimestre
+    desglose_map = desglose_inscripciones(db, cuatrimestre_id)
+    # Asignaciones del cuatrimestre y cursos vinculados: una consulta cada una (sin lazy loads por cátedra)
+    asig_q = db.query(Asignacion).options(joinedload(Asignacion.sede), joinedload(Asignacion.docente))
     if cuatrimestre_id:
-        desglose_query += f" AND cuatrimestre_id = {cuatrimestre_id}"
-    desglose_query += " GROUP BY catedra_id, turno, modalidad_alumno, sede_referencia"
-    # Contar sin clasificar aparte
-    sin_clasif_query = "SELECT catedra_id, COUNT(*) FROM inscripciones WHERE modalidad_alumno IS NULL"
-    if cuatrimestre_id:
-        sin_clasif_query += f" AND cuatrimestre_id = {cuatrimestre_id}"
-    sin_clasif_query += " GROUP BY catedra_id"
-    try:
-        desglose_rows = db.execute(text(desglose_query)).fetchall()
-    except Exception:
-        desglose_rows = []
-    sin_clasif_map = {}
-    try:
-        for r in db.execute(text(sin_clasif_query)).fetchall():
-            sin_clasif_map[r[0]] = r[1]
-    except Exception:
-        pass
-    # Organizar: por cátedra → {turno → {sede → count}}
-    desglose_map = {}
-    for row in desglose_rows:
-        cat_id, turno, mod_alumno, sede, cnt = row[0], row[1], row[2], row[3], row[4]
-        if cat_id not in desglose_map:
-            desglose_map[cat_id] = {
-                'total': 0,
-                'tm_av': 0, 'tm_cab': 0, 'tm_vl': 0, 'tm_cied': 0,
-                'tn_av': 0, 'tn_cab': 0, 'tn_vl': 0, 'tn_cied': 0,
-                'virt_cied': 0, 'sin_clasificar': 0,
-            }
-        d = desglose_map[cat_id]
-        d['total'] += cnt
-        es_cied = (mod_alumno == 'virtual')
-        sede_norm = (sede or '').strip()
-        sede_key = None
-        if not es_cied:
-            if 'avellaneda' in sede_norm.lower(): sede_key = 'av'
-            elif 'caballito' in sede_norm.lower(): sede_key = 'cab'
-            elif 'vicente' in sede_norm.lower(): sede_key = 'vl'
-        if turno == 'Mañana':
-            if es_cied or not sede_key:
-                d['tm_cied'] += cnt
-            else:
-                d[f'tm_{sede_key}'] += cnt
-        elif turno == 'Noche':
-            if es_cied or not sede_key:
-                d['tn_cied'] += cnt
-            else:
-                d[f'tn_{sede_key}'] += cnt
-        else:
-            d['virt_cied'] += cnt
-    # Agregar sin clasificar
-    for cat_id, cnt in sin_clasif_map.items():
-        if cat_id not in desglose_map:
-            desglose_map[cat_id] = {
-                'total': 0, 'tm_av': 0, 'tm_cab': 0, 'tm_vl': 0, 'tm_cied': 0,
-                'tn_av': 0, 'tn_cab': 0, 'tn_vl': 0, 'tn_cied': 0,
-                'virt_cied': 0, 'sin_clasificar': 0,
-            }
-        desglose_map[cat_id]['sin_clasificar'] = cnt
-        desglose_map[cat_id]['total'] += cnt
+        asig_q = asig_q.filter(Asignacion.cuatrimestre_id == cuatrimestre_id)
+    asigs_por_cat = {}
+    for a in asig_q.order_by(Asignacion.id).all():
+        if a.catedra_id not in asigs_por_cat: asigs_por_cat[a.catedra_id] = []
+        asigs_por_cat[a.catedra_id].append(a)
+    cursos_por_cat = {}
+    cc_q = db.query(CatedraCurso).options(joinedload(CatedraCurso.curso), joinedload(CatedraCurso.sede))
+    for cc in cc_q.order_by(CatedraCurso.id).all():
+        if cc.catedra_id not in cursos_por_cat: cursos_por_cat[cc.catedra_id] = []
+        cursos_por_cat[cc.catedra_id].append(cc)
     result = []
     for cat in catedras_sorted:
         try:
             asigs = []
             try:
-                all_asigs = cat.asignaciones or []
-                if cuatrimestre_id:
-                    all_asigs = [a for a in all_asigs if a.cuatrimestre_id == cuatrimestre_id]
-                for a in all_asigs:
+                for a in asigs_por_cat.get(cat.id, []):
                     asigs.append({
                         "id": a.id, "modalidad": a.modalidad, "dia": a.dia,
                         "hora_inicio": a.hora_inicio, "hora_fin": a.hora_fin,
@@ -442,10 +941,7 @@ def get_catedras(cuatrimestre_id: int = None, db: Session = Depends(get_db)):
                     })
             except Exception:
                 pass
-            desg = desglose_map.get(cat.id, {
-                'total': 0, 'tm_av': 0, 'tm_cab': 0, 'tm_vl': 0, 'tm_cied': 0,
-                'tn_av': 0, 'tn_cab': 0, 'tn_vl': 0, 'tn_cied': 0, 'virt_cied': 0, 'sin_clasificar': 0,
-            })
+            desg = desglose_map.get(cat.id) or desglose_vacio()
             inscriptos = desg['total']
             tm_total = desg['tm_av'] + desg['tm_cab'] + desg['tm_vl'] + desg['tm_cied']
             tn_total = desg['tn_av'] + desg['tn_cab'] + desg['tn_vl'] + desg['tn_cied']
@@ -458,7 +954,7 @@ def get_catedras(cuatrimestre_id: int = None, db: Session = Depends(get_db)):
             docentes_sugeridos = (1 if inscriptos <= 100 else (1 + -(-max(0, inscriptos - 100) // 100))) if inscriptos >= 10 else 0
             cursos_vinc = []
             try:
-                for cc in (cat.cursos or []):
+                for cc in cursos_por_cat.get(cat.id, []):
                     cursos_vinc.append({"id": cc.id, "curso_id": cc.curso_id, "curso_nombre": cc.curso.nombre if cc.curso else None, "turno": cc.turno, "sede_nombre": cc.sede.nombre if cc.sede else None})
             except Exception:
                 pass
@@ -485,40 +981,30 @@ def get_catedras(cuatrimestre_id: int = None, db: Session = Depends(get_db)):
                 "virt_cied": 0, "sede_av": 0, "sede_cab": 0, "sede_vl": 0, "sede_cied": 0,
                 "sin_clasificar": 0, "docentes_sugeridos": 0,
                 "cursos_vinculados": [], "asignaciones": []})
-    return result
+    return JSONRapida(result)
 
 @app.get("/api/catedras/stats")
 def get_catedras_stats(cuatrimestre_id: int = None, db: Session = Depends(get_db)):
-    from sqlalchemy import text
     total = db.query(Catedra).count()
     q = db.query(Asignacion)
     if cuatrimestre_id:
         q = q.filter(Asignacion.cuatrimestre_id == cuatrimestre_id)
     asigs = q.all()
-    q_insc = db.query(Inscripcion)
+    q_roll = db.query(func.coalesce(func.sum(_ROLLUP.c.count), 0),
+        func.count(func.distinct(_ROLLUP.c.catedra_id)),
+        func.coalesce(func.sum(case((_ROLLUP.c.modalidad == 'virtual', _ROLLUP.c.count), else_=0)), 0),
+        func.coalesce(func.sum(case((_ROLLUP.c.modalidad == 'presencial', _ROLLUP.c.count), else_=0)), 0))
     if cuatrimestre_id:
-        q_insc = q_insc.filter(Inscripcion.cuatrimestre_id == cuatrimestre_id)
-    total_inscripciones = q_insc.count()
+        q_roll = q_roll.filter(_ROLLUP.c.cuatrimestre_id == cuatrimestre_id)
+    try:
+        total_inscripciones, materias_con_inscriptos, virtuales, presenciales = q_roll.one()
+    except Exception:
+        db.rollback()
+        total_inscripciones = materias_con_inscriptos = virtuales = presenciales = 0
     alumnos_unicos = db.query(func.count(func.distinct(Inscripcion.alumno_id)))
     if cuatrimestre_id:
         alumnos_unicos = alumnos_unicos.filter(Inscripcion.cuatrimestre_id == cuatrimestre_id)
     alumnos_unicos = alumnos_unicos.scalar() or 0
-    materias_con_inscriptos = db.query(func.count(func.distinct(Inscripcion.catedra_id)))
-    if cuatrimestre_id:
-        materias_con_inscriptos = materias_con_inscriptos.filter(Inscripcion.cuatrimestre_id == cuatrimestre_id)
-    materias_con_inscriptos = materias_con_inscriptos.scalar() or 0
-    # Desglose virtual/presencial
-    try:
-        virt_q = "SELECT COUNT(*) FROM inscripciones WHERE modalidad_alumno = 'virtual'"
-        pres_q = "SELECT COUNT(*) FROM inscripciones WHERE modalidad_alumno = 'presencial'"
-        if cuatrimestre_id:
-            virt_q += f" AND cuatrimestre_id = {cuatrimestre_id}"
-            pres_q += f" AND cuatrimestre_id = {cuatrimestre_id}"
-        virtuales = db.execute(text(virt_q)).scalar() or 0
-        presenciales = db.execute(text(pres_q)).scalar() or 0
-    except Exception:
-        virtuales = 0
-        presenciales = 0
     return {
         "total_catedras": total,
         "catedras_abiertas": len(set(a.catedra_id for a in asigs)),
@@ -547,56 +1033,34 @@ def actualizar_catedra(catedra_id: int, data: dict, db: Session = Depends(get_db
         try: db.execute(sql_text(f"UPDATE catedras SET decision_apertura = :val WHERE id = :id"), {"val": data["decision_apertura"], "id": catedra_id})
         except: pass
     db.commit()
+    bump_data_version()
     return {"ok": True}
 
 @app.get("/api/catedras/necesitan-docente")
 def get_catedras_necesitan_docente(cuatrimestre_id: int = None, db: Session = Depends(get_db)):
-    from sqlalchemy import text
-    # Total inscriptos por cátedra
-    total_q = "SELECT catedra_id, COUNT(*) FROM inscripciones"
-    if cuatrimestre_id: total_q += f" WHERE cuatrimestre_id = {cuatrimestre_id}"
-    total_q += " GROUP BY catedra_id"
-    total_map = {}
-    try:
-        for r in db.execute(text(total_q)).fetchall(): total_map[r[0]] = r[1]
-    except: pass
-    # Desglose por turno+sede para info
-    q_txt = """SELECT catedra_id, COALESCE(turno,'Virtual') as turno, COALESCE(modalidad_alumno,'virtual') as mod,
-        COALESCE(sede_referencia,'') as sede, COUNT(*) as cnt
-        FROM inscripciones WHERE modalidad_alumno IS NOT NULL"""
-    if cuatrimestre_id: q_txt += f" AND cuatrimestre_id = {cuatrimestre_id}"
-    q_txt += " GROUP BY catedra_id, turno, modalidad_alumno, sede_referencia"
-    cat_combos = {}
-    try:
-        for r in db.execute(text(q_txt)).fetchall():
-            cid, turno, mod, sede, cnt = r
-            if cid not in cat_combos: cat_combos[cid] = {}
-            es_cied = (mod == 'virtual')
-            if es_cied: sede_tipo = 'CIED'
-            else:
-                sn = (sede or '').lower()
-                if 'avellaneda' in sn: sede_tipo = 'Avellaneda'
-                elif 'caballito' in sn: sede_tipo = 'Caballito'
-                elif 'vicente' in sn: sede_tipo = 'Vicente López'
-                else: sede_tipo = 'CIED'
-            key = f"{turno}|{sede_tipo}"
-            cat_combos[cid][key] = cat_combos[cid].get(key, 0) + cnt
-    except: pass
+    # Total inscriptos y desglose por turno+sede (cacheado por cuatrimestre)
+    desglose = desglose_inscripciones(db, cuatrimestre_id)
+    # Todas las asignaciones del cuatrimestre (con docente y sede) de una sola vez, agrupadas por cátedra
+    asig_q = db.query(Asignacion).options(joinedload(Asignacion.docente), joinedload(Asignacion.sede))
+    if cuatrimestre_id: asig_q = asig_q.filter(Asignacion.cuatrimestre_id == cuatrimestre_id)
+    asigs_por_cat = {}
+    for a in asig_q.order_by(Asignacion.id).all():
+        if a.catedra_id not in asigs_por_cat: asigs_por_cat[a.catedra_id] = []
+        asigs_por_cat[a.catedra_id].append(a)
     result = []
     all_cats = db.query(Catedra).all()
     for cat in all_cats:
-        total = total_map.get(cat.id, 0)
+        desg = desglose.get(cat.id)
+        total = desg['total'] if desg else 0
         if total < 10: continue
         # Docentes necesarios vs asignados
         docs_necesarios = 1 if total <= 100 else (1 + -(-max(0, total - 100) // 100))
-        asigs = db.query(Asignacion).filter(Asignacion.catedra_id == cat.id)
-        if cuatrimestre_id: asigs = asigs.filter(Asignacion.cuatrimestre_id == cuatrimestre_id)
-        asigs_list = asigs.all()
+        asigs_list = asigs_por_cat.get(cat.id, [])
         docs_actuales = len([a for a in asigs_list if a.docente_id])
         faltan = max(0, docs_necesarios - docs_actuales)
         if faltan == 0: continue  # Cátedra cubierta, no la mostramos
         # Build desglose for display
-        combos = cat_combos.get(cat.id, {})
+        combos = desg['combos']
         aperturas_info = []
         for key, cnt in sorted(combos.items(), key=lambda x: -x[1]):
             turno, sede_tipo = key.split('|')
@@ -622,6 +1086,26 @@ def get_catedras_necesitan_docente(cuatrimestre_id: int = None, db: Session = De
     return result
 
 # ===== v8.0: Criterio de apertura simplificado =====
+def _criterio_apertura_rows(db, cuatrimestre_id=None):
+    """
+    Una sola consulta: por cátedra → (id, codigo, nombre, inscriptos, asignaciones,
+    asignaciones con docente, docentes sugeridos). Sugeridos = 1 hasta 100 inscriptos
+    y +1 cada 100 adicionales (1 + (total-1) // 100) si total >= 10, si no 0.
+    """
+    insc = db.query(_ROLLUP.c.catedra_id.label('catedra_id'), func.sum(_ROLLUP.c.count).label('total'))
+    if cuatrimestre_id: insc = insc.filter(_ROLLUP.c.cuatrimestre_id == cuatrimestre_id)
+    insc = insc.group_by(_ROLLUP.c.catedra_id).subquery()
+    asg = db.query(Asignacion.catedra_id.label('catedra_id'), func.count(Asignacion.id).label('asignaciones'),
+        func.count(Asignacion.docente_id).label('con_docente'))
+    if cuatrimestre_id: asg = asg.filter(Asignacion.cuatrimestre_id == cuatrimestre_id)
+    asg = asg.group_by(Asignacion.catedra_id).subquery()
+    total = func.coalesce(insc.c.total, 0)
+    return db.query(
+        Catedra.id, Catedra.codigo, Catedra.nombre, total,
+        func.coalesce(asg.c.asignaciones, 0), func.coalesce(asg.c.con_docente, 0),
+        case((total >= 10, 1 + (total - 1) // 100), else_=0),
+    ).outerjoin(insc, insc.c.catedra_id == Catedra.id).outerjoin(asg, asg.c.catedra_id == Catedra.id).all()
+
 @app.get("/api/catedras/criterio-apertura")
 def get_criterio_apertura(cuatrimestre_id: int = None, db: Session = Depends(get_db)):
     """
@@ -629,32 +1113,17 @@ def get_criterio_apertura(cuatrimestre_id: int = None, db: Session = Depends(get
     1-9 total → ASINCRÓNICA
     0 → SIN ALUMNOS
     """
-    from sqlalchemy import text
-    total_q = "SELECT catedra_id, COUNT(*) FROM inscripciones"
-    if cuatrimestre_id: total_q += f" WHERE cuatrimestre_id = {cuatrimestre_id}"
-    total_q += " GROUP BY catedra_id"
-    total_map = {}
-    try:
-        for r in db.execute(text(total_q)).fetchall(): total_map[r[0]] = r[1]
-    except: pass
-    all_cats = sorted(db.query(Catedra).all(), key=lambda c: sort_key_codigo(c.codigo))
+    rows = sorted(_criterio_apertura_rows(db, cuatrimestre_id), key=lambda r: sort_key_codigo(r[1]))
     abrir = []; asincronica = []; sin_alumnos = []
-    for cat in all_cats:
-        total = total_map.get(cat.id, 0)
+    for cat_id, codigo, nombre, total, n_asigs, docs_actuales, docs in rows:
         if total == 0:
-            sin_alumnos.append({"codigo": cat.codigo, "nombre": cat.nombre, "total": 0})
+            sin_alumnos.append({"codigo": codigo, "nombre": nombre, "total": 0})
         elif total < 10:
-            asincronica.append({"codigo": cat.codigo, "nombre": cat.nombre, "total": total})
+            asincronica.append({"codigo": codigo, "nombre": nombre, "total": total})
         else:
-            docs = 1 if total <= 100 else (1 + -(-max(0, total - 100) // 100))
-            # Check if already has asignacion
-            tiene = db.query(Asignacion).filter(Asignacion.catedra_id == cat.id)
-            if cuatrimestre_id: tiene = tiene.filter(Asignacion.cuatrimestre_id == cuatrimestre_id)
-            tiene_asig = tiene.count() > 0
-            docs_actuales = tiene.filter(Asignacion.docente_id.isnot(None)).count() if tiene_asig else 0
-            abrir.append({"codigo": cat.codigo, "nombre": cat.nombre, "total": total,
+            abrir.append({"codigo": codigo, "nombre": nombre, "total": total,
                 "docentes_sugeridos": docs, "docentes_actuales": docs_actuales,
-                "faltan": max(0, docs - docs_actuales), "tiene_asignacion": tiene_asig})
+                "faltan": max(0, docs - docs_actuales), "tiene_asignacion": n_asigs > 0})
     return {"abrir": abrir, "asincronica": asincronica, "sin_alumnos": sin_alumnos,
         "stats": {"total_abrir": len(abrir), "total_asincronica": len(asincronica),
             "total_sin_alumnos": len(sin_alumnos),
@@ -666,55 +1135,39 @@ def auto_decision_asincronicas(cuatrimestre_id: int = None, db: Session = Depend
     from sqlalchemy import text
     criterio = get_criterio_apertura(cuatrimestre_id, db)
     count = 0
-    for item in criterio['asincronica']:
-        cat = db.query(Catedra).filter(Catedra.codigo == item['codigo']).first()
-        if cat:
-            try:
-                db.execute(text("UPDATE catedras SET decision_apertura = :val WHERE id = :id"),
-                    {"val": "Asincrónica", "id": cat.id})
-                count += 1
-            except: pass
-    for item in criterio['sin_alumnos']:
-        cat = db.query(Catedra).filter(Catedra.codigo == item['codigo']).first()
-        if cat:
-            try:
-                db.execute(text("UPDATE catedras SET decision_apertura = :val WHERE id = :id"),
-                    {"val": "No abrir", "id": cat.id})
-                count += 1
-            except: pass
+    for items, val in [(criterio['asincronica'], "Asincrónica"), (criterio['sin_alumnos'], "No abrir")]:
+        if not items: continue
+        try:
+            db.execute(text("UPDATE catedras SET decision_apertura = :val WHERE codigo = :cod"),
+                [{"val": val, "cod": item['codigo']} for item in items])
+            count += len(items)
+        except: pass
     db.commit()
+    bump_data_version()
     return {"marcadas": count, "asincronicas": len(criterio['asincronica']), "sin_alumnos": len(criterio['sin_alumnos'])}
 
 
 @app.get("/api/inscriptos/por-curso")
 def get_inscriptos_por_curso(cuatrimestre_id: int = None, db: Session = Depends(get_db)):
     from sqlalchemy import text
-    q = """SELECT curso_nombre, 
+    q = """SELECT i.curso_nombre,
         COUNT(*) as total_inscripciones,
-        COUNT(DISTINCT alumno_id) as alumnos_unicos
-        FROM inscripciones WHERE curso_nombre IS NOT NULL AND curso_nombre != ''"""
+        COUNT(DISTINCT i.alumno_id) as alumnos_unicos,
+        cc.nombre_limpio, cc.sede, cc.modalidad, cc.tipo_curso
+        FROM inscripciones i LEFT JOIN curso_clasificado cc ON cc.curso_nombre = i.curso_nombre
+        WHERE i.curso_nombre IS NOT NULL AND i.curso_nombre != ''"""
     if cuatrimestre_id:
-        q += f" AND cuatrimestre_id = {cuatrimestre_id}"
-    q += " GROUP BY curso_nombre ORDER BY total_inscripciones DESC"
+        q += f" AND i.cuatrimestre_id = {cuatrimestre_id}"
+    q += " GROUP BY i.curso_nombre, cc.nombre_limpio, cc.sede, cc.modalidad, cc.tipo_curso ORDER BY total_inscripciones DESC"
     try:
         rows = db.execute(text(q)).fetchall()
         result = []
         for r in rows:
             curso_raw = r[0]; total_insc = r[1]; alumnos = r[2]
-            nombre_limpio = re.split(r'\s*[-–]\s*(?:CIED|Cursada)', curso_raw, maxsplit=1)[0].strip()
-            nombre_limpio = re.split(r'\s*\(', nombre_limpio, maxsplit=1)[0].strip()
-            es_cied = 'CIED' in curso_raw.upper()
-            m_sede = re.search(r'\(([^)]+)\)', curso_raw)
-            sede_raw = m_sede.group(1).strip() if m_sede else ''
-            sede = normalizar_sede(sede_raw) if sede_raw else 'Sin sede'
-            es_online = sede in ['Online - Interior']
-            modalidad = 'CIED' if (es_cied or es_online) else 'Presencial'
-            es_bce = 'BCE' in curso_raw.upper() or 'SECUNDARIO' in curso_raw.upper()
-            es_bea = 'BEA' in curso_raw.upper()
-            tipo_curso = 'BCE' if es_bce else ('BEA' if es_bea else 'Superior')
+            cc = {"nombre_limpio": r[3], "sede": r[4], "modalidad": r[5], "tipo_curso": r[6]} if r[5] else clasificar_curso(curso_raw)
             result.append({
-                "curso_completo": curso_raw, "curso_nombre": nombre_limpio,
-                "sede": sede, "modalidad": modalidad, "tipo_curso": tipo_curso,
+                "curso_completo": curso_raw, "curso_nombre": cc["nombre_limpio"],
+                "sede": cc["sede"] or 'Sin sede', "modalidad": cc["modalidad"], "tipo_curso": cc["tipo_curso"],
                 "inscripciones": total_insc, "alumnos_unicos": alumnos,
             })
         return result
@@ -740,17 +1193,9 @@ def crear_asignacion(data: dict, db: Session = Depends(get_db)):
                 raise HTTPException(status_code=400, detail=conflict)
         # v9.0: Verificar disponibilidad del docente
         if docente_id and dia and hora:
-            from sqlalchemy import text
-            try:
-                disp_rows = db.execute(text(f"SELECT COUNT(*) FROM docente_disponibilidad WHERE docente_id = {docente_id}")).scalar()
-                if disp_rows and disp_rows > 0:
-                    tiene_disp = db.execute(text(
-                        f"SELECT disponible FROM docente_disponibilidad WHERE docente_id = {docente_id} AND dia = '{dia}' AND hora = '{hora}'"
-                    )).fetchone()
-                    if not tiene_disp or not tiene_disp[0]:
-                        raise HTTPException(status_code=400, detail=f"⛔ El docente no tiene disponibilidad el {dia} a las {hora}. Revisá su disponibilidad horaria antes de asignarle.")
-            except HTTPException: raise
-            except Exception: pass
+            mascara = disponibilidad_masks(db, cuat_id).get(docente_id, 0)
+            if mascara and not mascara & slot_mask(dia, hora):
+                raise HTTPException(status_code=400, detail=f"⛔ El docente no tiene disponibilidad el {dia} a las {hora}. Revisá su disponibilidad horaria antes de asignarle.")
         asig = Asignacion(
             catedra_id=cat_id, cuatrimestre_id=cuat_id,
             docente_id=docente_id if docente_id else None,
@@ -761,6 +1206,7 @@ def crear_asignacion(data: dict, db: Session = Depends(get_db)):
             recibe_alumnos_presenciales=data.get("recibe_alumnos_presenciales", False),
         )
         db.add(asig); db.commit()
+        bump_data_version(cuat_id)
         return {"id": asig.id, "ok": True}
     except HTTPException: raise
     except Exception as e:
@@ -785,6 +1231,7 @@ def actualizar_asignacion(asignacion_id: int, data: dict, db: Session = Depends(
                 setattr(asig, field, val if val else None)
         asig.modificada = True
         db.commit()
+        bump_data_version(asig.cuatrimestre_id)
         return {"ok": True}
     except HTTPException: raise
     except Exception as e:
@@ -795,48 +1242,77 @@ def actualizar_asignacion(asignacion_id: int, data: dict, db: Session = Depends(
 def eliminar_asignacion(asignacion_id: int, db: Session = Depends(get_db)):
     asig = db.query(Asignacion).filter(Asignacion.id == asignacion_id).first()
     if not asig: raise HTTPException(status_code=404, detail="No encontrada")
+    cuat_id = asig.cuatrimestre_id
     db.delete(asig); db.commit()
+    bump_data_version(cuat_id)
     return {"ok": True}
 
 
 # ==================== DOCENTES ====================
 
+def _modalidad_por_docente_query(db, cuatrimestre_id=None):
+    """docente_id, asignaciones que reciben presenciales, asignaciones con sede (agrupado por docente)."""
+    q = db.query(
+        Asignacion.docente_id.label('docente_id'),
+        func.sum(case((Asignacion.recibe_alumnos_presenciales.is_(True), 1), else_=0)).label('presenciales'),
+        func.count(Asignacion.sede_id).label('con_sede'),
+    ).filter(Asignacion.docente_id.isnot(None))
+    if cuatrimestre_id: q = q.filter(Asignacion.cuatrimestre_id == cuatrimestre_id)
+    return q.group_by(Asignacion.docente_id)
+
+def calcular_tipos_modalidad(db, docente_id=None, cuatrimestre_id=None):
+    """
+    Clasifica docentes según sus asignaciones con una sola consulta agrupada:
+    alguna recibe presenciales → PRESENCIAL_VIRTUAL, alguna con sede → SEDE_VIRTUAL,
+    resto → REMOTO. Los docentes que no aparecen son SIN_ASIGNACIONES.
+    """
+    q = _modalidad_por_docente_query(db, cuatrimestre_id)
+    if docente_id: q = q.filter(Asignacion.docente_id == docente_id)
+    tipos = {}
+    for did, presenciales, con_sede in q.all():
+        if presenciales: tipos[did] = "PRESENCIAL_VIRTUAL"
+        elif con_sede: tipos[did] = "SEDE_VIRTUAL"
+        else: tipos[did] = "REMOTO"
+    return tipos
+
 def calcular_tipo_modalidad(docente, db):
-    asigs = db.query(Asignacion).filter(Asignacion.docente_id == docente.id).all()
-    if not asigs: return "SIN_ASIGNACIONES"
-    if any(a.recibe_alumnos_presenciales for a in asigs): return "PRESENCIAL_VIRTUAL"
-    if any(a.sede_id for a in asigs): return "SEDE_VIRTUAL"
-    return "REMOTO"
+    return calcular_tipos_modalidad(db, docente.id).get(docente.id, "SIN_ASIGNACIONES")
 
 @app.get("/api/docentes")
 def get_docentes(cuatrimestre_id: int = None, db: Session = Depends(get_db)):
     from sqlalchemy import text
     docentes = db.query(Docente).order_by(Docente.apellido, Docente.nombre).all()
-    # Pre-load disponibilidad
-    disp_map = {}
-    try:
-        for r in db.execute(text("SELECT docente_id, dia, hora, disponible FROM docente_disponibilidad WHERE disponible = TRUE")).fetchall():
-            if r[0] not in disp_map: disp_map[r[0]] = []
-            disp_map[r[0]].append(f"{r[1]} {r[2]}")
-    except: pass
+    # Pre-load disponibilidad (bitmask por docente)
+    disp_masks = disponibilidad_masks(db, cuatrimestre_id)
+    # Tipo de modalidad, asignaciones y sedes: una consulta agrupada/joineada cada una
+    tipos = calcular_tipos_modalidad(db)
+    asig_q = db.query(
+        Asignacion.docente_id, Asignacion.id, Asignacion.modalidad, Asignacion.dia, Asignacion.hora_inicio,
+        Catedra.codigo, Catedra.nombre, Sede.nombre, Asignacion.recibe_alumnos_presenciales,
+    ).outerjoin(Catedra, Asignacion.catedra_id == Catedra.id).outerjoin(Sede, Asignacion.sede_id == Sede.id)
+    asig_q = asig_q.filter(Asignacion.docente_id.isnot(None))
+    if cuatrimestre_id: asig_q = asig_q.filter(Asignacion.cuatrimestre_id == cuatrimestre_id)
+    asigs_map = {}
+    for r in asig_q.order_by(Asignacion.id).all():
+        if r[0] not in asigs_map: asigs_map[r[0]] = []
+        asigs_map[r[0]].append({
+            "id": r[1], "modalidad": r[2], "dia": r[3],
+            "hora_inicio": r[4],
+            "catedra_codigo": r[5], "catedra_nombre": r[6],
+            "sede_nombre": r[7],
+            "recibe_alumnos_presenciales": r[8],
+        })
+    sedes_map = {}
+    for did, sid, snombre in db.query(DocenteSede.docente_id, Sede.id, Sede.nombre).join(
+            Sede, DocenteSede.sede_id == Sede.id).order_by(DocenteSede.id).all():
+        if did not in sedes_map: sedes_map[did] = []
+        sedes_map[did].append({"id": sid, "nombre": snombre})
     result = []
     for d in docentes:
         try:
-            asigs_data = []
-            all_asigs = d.asignaciones or []
-            if cuatrimestre_id:
-                all_asigs = [a for a in all_asigs if a.cuatrimestre_id == cuatrimestre_id]
-            for a in all_asigs:
-                asigs_data.append({
-                    "id": a.id, "modalidad": a.modalidad, "dia": a.dia,
-                    "hora_inicio": a.hora_inicio,
-                    "catedra_codigo": a.catedra.codigo if a.catedra else None,
-                    "catedra_nombre": a.catedra.nombre if a.catedra else None,
-                    "sede_nombre": a.sede.nombre if a.sede else None,
-                    "recibe_alumnos_presenciales": getattr(a, 'recibe_alumnos_presenciales', False),
-                })
-            sedes_data = [{"id": ds.sede.id, "nombre": ds.sede.nombre} for ds in (d.sedes or []) if ds.sede]
-            tipo = calcular_tipo_modalidad(d, db)
+            asigs_data = asigs_map.get(d.id, [])
+            sedes_data = sedes_map.get(d.id, [])
+            tipo = tipos.get(d.id, "SIN_ASIGNACIONES")
             horas = getattr(d, 'horas_asignadas', 0) or 0
             cfpea = getattr(d, 'sociedad_cfpea', False) or False
             isftea = getattr(d, 'sociedad_isftea', False) or False
@@ -844,7 +1320,7 @@ def get_docentes(cuatrimestre_id: int = None, db: Session = Depends(get_db)):
             mat_cab = getattr(d, 'materias_cab', 0) or 0
             mat_vl = getattr(d, 'materias_vl', 0) or 0
             # v16.0: availability summary
-            disp_list = disp_map.get(d.id, [])
+            disp_list = [f"{dia} {hora}" for dia, hora in franjas_de_mascara(disp_masks.get(d.id, 0))]
             disp_resumen = f"{len(disp_list)} franjas" if disp_list else "Sin asignar"
             result.append({
                 "id": d.id, "dni": d.dni, "nombre": d.nombre, "apellido": d.apellido,
@@ -866,7 +1342,7 @@ def get_docentes(cuatrimestre_id: int = None, db: Session = Depends(get_db)):
                 "especialidad": None, "catedras_referencia": None,
                 "disponibilidad_resumen": "Sin asignar", "disponibilidad_franjas": [],
                 "sedes": [], "asignaciones": []})
-    return result
+    return JSONRapida(result)
 
 @app.post("/api/docentes")
 def crear_docente(data: dict, db: Session = Depends(get_db)):
@@ -876,6 +1352,7 @@ def crear_docente(data: dict, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail="DNI ya existe")
     d = Docente(dni=dni, nombre=data.get("nombre", ""), apellido=data.get("apellido", ""), email=data.get("email"))
     db.add(d); db.commit()
+    bump_data_version()
     return {"id": d.id, "ok": True}
 
 @app.put("/api/docentes/{docente_id}")
@@ -906,6 +1383,7 @@ def actualizar_docente(docente_id: int, data: dict, db: Session = Depends(get_db
             try: db.execute(text(f"UPDATE docentes SET {fld} = :val WHERE id = :id"), {"val": data[fld], "id": docente_id})
             except: pass
     db.commit()
+    bump_data_version()
     return {"ok": True}
 
 @app.delete("/api/docentes/{docente_id}")
@@ -915,9 +1393,12 @@ def eliminar_docente(docente_id: int, db: Session = Depends(get_db)):
     db.query(Asignacion).filter(Asignacion.docente_id == docente_id).update({"docente_id": None})
     db.query(DocenteSede).filter(DocenteSede.docente_id == docente_id).delete()
     from sqlalchemy import text
-    try: db.execute(text(f"DELETE FROM docente_disponibilidad WHERE docente_id = {docente_id}"))
+    try:
+        db.execute(text(f"DELETE FROM docente_disponibilidad WHERE docente_id = {docente_id}"))
+        db.execute(text(f"DELETE FROM docente_disponibilidad_mask WHERE docente_id = {docente_id}"))
     except: pass
     db.delete(d); db.commit()
+    bump_data_version()
     return {"ok": True}
 
 @app.put("/api/docentes/{docente_id}/sedes")
@@ -928,67 +1409,221 @@ def actualizar_sedes_docente(docente_id: int, data: dict, db: Session = Depends(
     for sid in data.get("sede_ids", []):
         db.add(DocenteSede(docente_id=docente_id, sede_id=sid))
     db.commit()
+    bump_data_version()
     return {"ok": True}
 
-# ===== v5.0: Disponibilidad horaria =====
-@app.get("/api/docentes/{docente_id}/disponibilidad")
-def get_disponibilidad(docente_id: int, db: Session = Depends(get_db)):
+# ===== v17.0: Disponibilidad horaria como bitmask semanal =====
+# Un bit por franja de la grilla (día × hora, ver SLOTS) en un entero de Python; se guarda una fila
+# por (docente, cuatrimestre) en docente_disponibilidad_mask. cuatrimestre_id = 0 es la disponibilidad
+# base; una fila del cuatrimestre la reemplaza. "Libre" = disponible & ~ocupado.
+DIAS_SEMANA = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado']
+HORAS_FRANJA = ['07:00','08:00','09:00','10:00','11:00','12:00','13:00','14:00','17:00','18:00','19:00','20:00','21:00','22:00','23:00']
+SLOTS = [(d, h) for d in DIAS_SEMANA for h in HORAS_FRANJA]
+SLOT_BIT = {slot: i for i, slot in enumerate(SLOTS)}
+_DISPONIBILIDAD_CACHE = {}  # cuatrimestre_id → (version, {docente_id: mascara})
+
+def slot_mask(dia, hora):
+    """Bit de la franja (dia, hora); 0 si no está en la grilla."""
+    i = SLOT_BIT.get((dia, (hora or '')[:5]))
+    return 1 << i if i is not None else 0
+
+def mascara_desde_franjas(items):
+    m = 0
+    for item in items or []:
+        if item.get("disponible", True): m |= slot_mask(item.get("dia"), item.get("hora"))
+    return m
+
+def parse_mascara(v):
+    """En la API las máscaras viajan como hex (exceden los enteros seguros de JS); se aceptan también ints."""
+    return int(v, 16) if isinstance(v, str) else int(v)
+
+def franjas_de_mascara(mascara):
+    return [SLOTS[i] for i in range(len(SLOTS)) if mascara >> i & 1]
+
+def disponibilidad_masks(db, cuatrimestre_id=None):
+    """docente_id → mascara vigente para el cuatrimestre (base si no tiene una propia). Cacheado por data_version."""
     from sqlalchemy import text
+    cuat = cuatrimestre_id or 0
+    version = data_version(cuatrimestre_id)
+    cached = _DISPONIBILIDAD_CACHE.get(cuat)
+    if cached and cached[0] == version: return cached[1]
+    masks = {}
     try:
-        rows = db.execute(text(f"SELECT dia, hora, disponible FROM docente_disponibilidad WHERE docente_id = {docente_id}")).fetchall()
-        return [{"dia": r[0], "hora": r[1], "disponible": r[2]} for r in rows]
+        rows = db.execute(text(f"""SELECT docente_id, cuatrimestre_id, mascara FROM docente_disponibilidad_mask
+            WHERE cuatrimestre_id IN (0, {int(cuat)}) ORDER BY cuatrimestre_id""")).fetchall()
+        for did, c, m in rows: masks[did] = int(m)  # la fila del cuatrimestre pisa a la base
     except Exception:
-        return []
+        db.rollback()
+    masks = {did: m for did, m in masks.items() if m}
+    _DISPONIBILIDAD_CACHE[cuat] = (version, masks)
+    return masks
 
-@app.put("/api/docentes/{docente_id}/disponibilidad")
-def set_disponibilidad(docente_id: int, data: dict, db: Session = Depends(get_db)):
+def guardar_disponibilidad(db, masks, cuatrimestre_id=None):
+    """Upsert en bloque de {docente_id: mascara}. No hace commit."""
     from sqlalchemy import text
+    if not masks: return 0
+    db.execute(text("""INSERT INTO docente_disponibilidad_mask (docente_id, cuatrimestre_id, mascara)
+        VALUES (:did, :cuat, :m) ON CONFLICT (docente_id, cuatrimestre_id) DO UPDATE SET mascara = EXCLUDED.mascara"""),
+        [{"did": int(did), "cuat": cuatrimestre_id or 0, "m": int(m)} for did, m in masks.items()])
+    return len(masks)
+
+@app.get("/api/docentes/{docente_id}/disponibilidad")
+def get_disponibilidad(docente_id: int, cuatrimestre_id: int = None, db: Session = Depends(get_db)):
+    mascara = disponibilidad_masks(db, cuatrimestre_id).get(docente_id, 0)
+    return [{"dia": dia, "hora": hora, "disponible": True} for dia, hora in franjas_de_mascara(mascara)]
+
+@app.put("/api/docentes/{docente_id}/disponibilidad")
+def set_disponibilidad(docente_id: int, data: dict, cuatrimestre_id: int = None, db: Session = Depends(get_db)):
     try:
-        db.execute(text(f"DELETE FROM docente_disponibilidad WHERE docente_id = {docente_id}"))
-        for item in data.get("disponibilidad", []):
-            dia = item.get("dia")
-            hora = item.get("hora")
-            disponible = item.get("disponible", True)
-            if dia and hora:
-                db.execute(text(
-                    f"INSERT INTO docente_disponibilidad (docente_id, dia, hora, disponible) VALUES ({docente_id}, '{dia}', '{hora}', {disponible})"
-                ))
+        mascara = parse_mascara(data["mascara"]) if "mascara" in data else mascara_desde_franjas(data.get("disponibilidad"))
+        guardar_disponibilidad(db, {docente_id: mascara}, cuatrimestre_id)
         db.commit()
-        return {"ok": True}
+        bump_data_version()
+        return {"ok": True, "mascara": format(mascara, 'x')}
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/disponibilidad")
+def get_disponibilidad_bulk(cuatrimestre_id: int = None, dia: str = None, hora: str = None, db: Session = Depends(get_db)):
+    """Máscaras de todos los docentes; con dia+hora además devuelve quiénes están libres en esa franja."""
+    masks = disponibilidad_masks(db, cuatrimestre_id)
+    result = {"slots": [f"{d} {h}" for d, h in SLOTS], "docentes": {str(did): format(m, 'x') for did, m in masks.items()}}
+    if dia and hora:
+        bit = slot_mask(dia, hora)
+        busy_q = db.query(Asignacion.docente_id).filter(Asignacion.docente_id.isnot(None),
+            Asignacion.dia == dia, Asignacion.hora_inicio == hora)
+        if cuatrimestre_id: busy_q = busy_q.filter(Asignacion.cuatrimestre_id == cuatrimestre_id)
+        ocupados = {r[0] for r in busy_q.all()}
+        result["libres"] = sorted(did for did, m in masks.items() if m & bit and did not in ocupados)
+    return result
+
+@app.put("/api/disponibilidad")
+def set_disponibilidad_bulk(data: dict, cuatrimestre_id: int = None, db: Session = Depends(get_db)):
+    """Body: {"docentes": {docente_id: mascara hex | [{dia, hora, disponible}]}}. Un solo upsert para todos."""
+    masks = {}
+    for did, v in (data.get("docentes") or {}).items():
+        masks[int(did)] = mascara_desde_franjas(v) if isinstance(v, list) else parse_mascara(v)
+    try:
+        n = guardar_disponibilidad(db, masks, cuatrimestre_id)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    bump_data_version()
+    return {"ok": True, "actualizados": n}
+
 
 # ==================== CURSOS ====================
 
 @app.get("/api/cursos")
-def get_cursos(sede_id: int = None, db: Session = Depends(get_db)):
-    q = db.query(Curso)
-    if sede_id: q = q.filter(Curso.sede_id == sede_id)
-    result = []
-    for c in q.order_by(Curso.nombre).all():
-        catedras_vinc = []
-        try:
-            for cc in (c.catedras or []):
-                catedras_vinc.append({"id": cc.id, "catedra_id": cc.catedra_id, "catedra_codigo": cc.catedra.codigo if cc.catedra else None, "catedra_nombre": cc.catedra.nombre if cc.catedra else None, "turno": cc.turno})
-        except Exception: pass
-        result.append({"id": c.id, "nombre": c.nombre, "sede_id": c.sede_id, "sede_nombre": c.sede.nombre if c.sede else None, "cant_catedras": len(catedras_vinc), "catedras": catedras_vinc})
+def get_cursos(response: Response, sede_id: int = None, limit: int = Query(None, ge=1, le=1000),
+        offset: int = Query(0, ge=0), db: Session = Depends(get_db)):
+    """
+    Una sola consulta: página de cursos (subconsulta ordenada por nombre) LEFT JOIN sede,
+    catedra_curso y cátedra, proyectando solo las columnas que se devuelven.
+    Con limit/offset pagina por curso y devuelve el total en el header X-Total-Count.
+    """
+    cur_q = db.query(Curso.id, Curso.nombre, Curso.sede_id)
+    if sede_id: cur_q = cur_q.filter(Curso.sede_id == sede_id)
+    if limit:
+        response.headers["X-Total-Count"] = str(cur_q.count())
+        cur_q = cur_q.order_by(Curso.nombre, Curso.id).limit(limit).offset(offset)
+    page = cur_q.subquery()
+    rows = db.query(page.c.id, page.c.nombre, page.c.sede_id, Sede.nombre,
+        CatedraCurso.id, CatedraCurso.catedra_id, Catedra.codigo, Catedra.nombre, CatedraCurso.turno,
+    ).outerjoin(Sede, Sede.id == page.c.sede_id).outerjoin(CatedraCurso, CatedraCurso.curso_id == page.c.id
+    ).outerjoin(Catedra, Catedra.id == CatedraCurso.catedra_id).order_by(page.c.nombre, page.c.id, CatedraCurso.id).all()
+    result = []; por_id = {}
+    for cid, nombre, c_sede_id, sede_nombre, cc_id, cat_id, cat_cod, cat_nombre, turno in rows:
+        c = por_id.get(cid)
+        if c is None:
+            c = {"id": cid, "nombre": nombre, "sede_id": c_sede_id, "sede_nombre": sede_nombre, "cant_catedras": 0, "catedras": []}
+            por_id[cid] = c; result.append(c)
+        if cc_id is not None:
+            c["catedras"].append({"id": cc_id, "catedra_id": cat_id, "catedra_codigo": cat_cod, "catedra_nombre": cat_nombre, "turno": turno})
+            c["cant_catedras"] += 1
     return result
 
 
 # ==================== IMPORTACIONES ====================
 
+# ===== v17.0: Importación en lote de tablas maestras =====
+# Cátedras, cursos, sedes, docentes y catedra_curso son tablas chicas: se precargan enteras en un dict
+# por clave natural, el diff contra la planilla se hace en memoria y se escribe al final con INSERT
+# multi-fila (RETURNING id) y UPDATE executemany, en vez de un SELECT ... first() por fila.
+class LoteMaestro:
+    def __init__(self, db, modelo, clave, columnas=()):
+        from sqlalchemy import select
+        self.db = db
+        self.tabla = modelo.__table__
+        self.clave = (clave,) if isinstance(clave, str) else tuple(clave)
+        self.columnas = self.clave + tuple(c for c in columnas if c not in self.clave)
+        self.filas = {}  # clave → {"id", columnas...}; las altas quedan con id None hasta guardar()
+        self._nuevas = []
+        self._cambios = {}  # id → {columna: valor}
+        t = self.tabla
+        for r in db.execute(select(t.c.id, *[t.c[c] for c in self.columnas]).order_by(t.c.id)):
+            fila = dict(r._mapping)
+            self.filas.setdefault(self._clave_de(fila), fila)  # clave repetida en la base: la primera, como .first()
+
+    def _clave_de(self, valores):
+        return valores[self.clave[0]] if len(self.clave) == 1 else tuple(valores[c] for c in self.clave)
+
+    def get(self, clave):
+        return self.filas.get(clave)
+
+    def id_de(self, clave):
+        fila = self.filas.get(clave)
+        return fila["id"] if fila else None
+
+    def agregar(self, valores):
+        """Alta pendiente si la clave no existe (en la base ni en el lote). True si se agregó."""
+        fila = {c: valores.get(c) for c in self.columnas}
+        fila["id"] = None
+        k = self._clave_de(fila)
+        if k in self.filas: return False
+        self.filas[k] = fila; self._nuevas.append(fila)
+        return True
+
+    def actualizar(self, clave, **valores):
+        """Cambia columnas de una fila existente o pendiente. True si algo cambió."""
+        fila = self.filas[clave]
+        difs = {c: v for c, v in valores.items() if fila[c] != v}
+        if not difs: return False
+        fila.update(difs)
+        if fila["id"] is not None: self._cambios.setdefault(fila["id"], {}).update(difs)
+        return True
+
+    def guardar(self):
+        """Escribe altas y cambios pendientes (sin commit); las altas quedan con su id. Devuelve (altas, cambios)."""
+        from sqlalchemy import insert, update, bindparam
+        t = self.tabla
+        for i in range(0, len(self._nuevas), LOTE_UPSERT):
+            lote = [{c: f[c] for c in self.columnas} for f in self._nuevas[i:i + LOTE_UPSERT]]
+            for r in self.db.execute(insert(t).values(lote).returning(t.c.id, *[t.c[c] for c in self.clave])):
+                self.filas[self._clave_de(r._mapping)]["id"] = r.id
+        por_columnas = {}  # un UPDATE executemany por combinación de columnas cambiadas
+        for fid, difs in self._cambios.items():
+            por_columnas.setdefault(tuple(sorted(difs)), []).append(
+                dict({f"v_{c}": v for c, v in difs.items()}, b_id=fid))
+        for cols, params in por_columnas.items():
+            self.db.execute(update(t).where(t.c.id == bindparam("b_id")).values({c: bindparam(f"v_{c}") for c in cols}), params)
+        resultado = (len(self._nuevas), len(self._cambios))
+        self._nuevas = []; self._cambios = {}
+        return resultado
+
+
 @app.post("/api/importar/catedras")
 async def importar_catedras(file: UploadFile = File(...), db: Session = Depends(get_db)):
+    wb = abrir_excel(file)
     try:
-        content = await file.read()
-        wb = load_workbook(filename=io.BytesIO(content), read_only=True)
         ws = None
         for name in wb.sheetnames:
             if "catedr" in name.lower() or "cátedr" in name.lower(): ws = wb[name]; break
         if ws is None: ws = wb[wb.sheetnames[0]]
         creadas = actualizadas = 0
+        catedras = LoteMaestro(db, Catedra, "codigo", ("nombre",))
         for row in ws.iter_rows(min_row=2, values_only=True):
             vals = [str(c).strip() if c is not None else "" for c in row]
             codigo = nombre = None
@@ -1004,21 +1639,21 @@ async def importar_catedras(file: UploadFile = File(...), db: Session = Depends(
                         else: codigo, nombre = f"c.{num}", vals[1]
                 except: pass
             if codigo:
-                ex = db.query(Catedra).filter(Catedra.codigo == codigo).first()
-                if ex:
-                    if nombre and nombre != ex.nombre: ex.nombre = nombre; actualizadas += 1
+                if catedras.get(codigo):
+                    if nombre and catedras.actualizar(codigo, nombre=nombre): actualizadas += 1
                 else:
-                    db.add(Catedra(codigo=codigo, nombre=nombre or f"Cátedra {codigo}")); creadas += 1
+                    catedras.agregar({"codigo": codigo, "nombre": nombre or f"Cátedra {codigo}"}); creadas += 1
+        catedras.guardar()
         db.commit(); wb.close()
+        bump_data_version()
         return {"creadas": creadas, "actualizadas": actualizadas}
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error: {str(e)}")
 
 @app.post("/api/importar/apertura-catedras")
 async def importar_apertura_catedras(file: UploadFile = File(...), cuatrimestre_id: int = 1, db: Session = Depends(get_db)):
+    wb = abrir_excel(file)
     try:
-        content = await file.read()
-        wb = load_workbook(filename=io.BytesIO(content), read_only=True)
         ws = wb[wb.sheetnames[0]]
         abiertas = ya_existentes = 0
         errores = []
@@ -1045,6 +1680,7 @@ async def importar_apertura_catedras(file: UploadFile = File(...), cuatrimestre_
             db.add(Asignacion(catedra_id=catedra.id, cuatrimestre_id=cuatrimestre_id, modalidad='virtual_tm'))
             abiertas += 1
         db.commit(); wb.close()
+        bump_data_version(cuatrimestre_id)
         return {"abiertas": abiertas, "ya_existentes": ya_existentes, "errores": errores[:20]}
     except Exception as e:
         db.rollback()
@@ -1052,34 +1688,38 @@ async def importar_apertura_catedras(file: UploadFile = File(...), cuatrimestre_
 
 @app.post("/api/importar/cursos")
 async def importar_cursos(file: UploadFile = File(...), db: Session = Depends(get_db)):
+    wb = abrir_excel(file)
     try:
-        content = await file.read()
-        wb = load_workbook(filename=io.BytesIO(content), read_only=True)
         ws = wb[wb.sheetnames[0]]
         creados = omitidos = 0
+        sedes = LoteMaestro(db, Sede, "nombre", ("color",))
+        cursos = LoteMaestro(db, Curso, "nombre", ("sede_id",))
+        pendientes = []  # (curso, sede): los cursos se resuelven después de dar de alta las sedes
         for row in ws.iter_rows(min_row=2, values_only=True):
             vals = [str(c).strip() if c is not None else "" for c in row]
             sede_texto = vals[0] if len(vals) > 0 else ""
             nombre = vals[1] if len(vals) > 1 else ""
             if not nombre or len(nombre) < 3: continue
             if any(x in nombre.lower() for x in ['no disponible', '//bajas//', 'test ']): omitidos += 1; continue
-            sede = db.query(Sede).filter(Sede.nombre == sede_texto).first() if sede_texto else None
-            if not sede and sede_texto and len(sede_texto) > 2:
-                sede = Sede(nombre=sede_texto, color="bg-gray-500"); db.add(sede); db.flush()
-            if not db.query(Curso).filter(Curso.nombre == nombre).first():
-                db.add(Curso(nombre=nombre, sede_id=sede.id if sede else None)); creados += 1
+            if sede_texto and len(sede_texto) > 2:
+                sedes.agregar({"nombre": sede_texto, "color": "bg-gray-500"})
+            pendientes.append((nombre, sede_texto))
+        sedes.guardar()
+        for nombre, sede_texto in pendientes:
+            if cursos.agregar({"nombre": nombre, "sede_id": sedes.id_de(sede_texto) if sede_texto else None}): creados += 1
+        cursos.guardar()
         db.commit(); wb.close()
+        bump_data_version()
         return {"creados": creados, "omitidos": omitidos}
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error: {str(e)}")
 
 @app.post("/api/importar/docentes")
 async def importar_docentes(file: UploadFile = File(...), db: Session = Depends(get_db)):
+    wb = abrir_excel(file)
     try:
-        content = await file.read()
-        wb = load_workbook(filename=io.BytesIO(content), read_only=True)
         ws = wb[wb.sheetnames[0]]
-        headers = [str(c.value).lower().strip() if c.value else "" for c in ws[1]]
+        headers = [str(v).lower().strip() if v else "" for v in next(ws.iter_rows(max_row=1, values_only=True), ())]
         col_map = {"dni": -1, "nombre": -1, "apellido": -1, "email": -1}
         for i, h in enumerate(headers):
             if any(x in h for x in ["dni", "documento"]): col_map["dni"] = i
@@ -1088,6 +1728,7 @@ async def importar_docentes(file: UploadFile = File(...), db: Session = Depends(
             elif any(x in h for x in ["mail", "email", "correo"]): col_map["email"] = i
         es_combinado = any("apellido y nombre" in h or "apellido, nombre" in h for h in headers)
         creados = actualizados = 0; errores = []
+        docentes = LoteMaestro(db, Docente, "dni", ("nombre", "apellido", "email"))
         for row_num, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
             vals = [str(c).strip() if c is not None else "" for c in row]
             if es_combinado:
@@ -1105,27 +1746,29 @@ async def importar_docentes(file: UploadFile = File(...), db: Session = Depends(
                 if dni.endswith(".0"): dni = dni[:-2]
                 nombre = gv("nombre") or ""; apellido = gv("apellido") or ""; email = gv("email")
             if not dni or len(dni) < 7: continue
-            ex = db.query(Docente).filter(Docente.dni == dni).first()
-            if ex:
-                if nombre: ex.nombre = nombre
-                if apellido: ex.apellido = apellido
-                if email: ex.email = email
+            if docentes.get(dni):
+                docentes.actualizar(dni, **{k: v for k, v in (("nombre", nombre), ("apellido", apellido), ("email", email)) if v})
                 actualizados += 1
             else:
                 if not nombre and not apellido: continue
-                db.add(Docente(dni=dni, nombre=nombre, apellido=apellido, email=email)); creados += 1
+                docentes.agregar({"dni": dni, "nombre": nombre, "apellido": apellido, "email": email}); creados += 1
+        docentes.guardar()
         db.commit(); wb.close()
+        bump_data_version()
         return {"creados": creados, "actualizados": actualizados, "errores": errores[:10]}
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error: {str(e)}")
 
 @app.post("/api/importar/catedra-cursos")
 async def importar_catedra_cursos(file: UploadFile = File(...), db: Session = Depends(get_db)):
+    wb = abrir_excel(file)
     try:
-        content = await file.read()
-        wb = load_workbook(filename=io.BytesIO(content), read_only=True)
         ws = wb[wb.sheetnames[0]]
         creados = 0; errores = []
+        refs = referencias(db)
+        cursos = LoteMaestro(db, Curso, "nombre", ("sede_id",))
+        relaciones = LoteMaestro(db, CatedraCurso, ("catedra_id", "curso_id", "turno"), ("sede_id",))
+        pendientes = []  # (catedra_id, curso, turno, sede_id): las relaciones van después del alta de cursos
         for row_num, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
             vals = [str(c).strip() if c is not None else "" for c in row]
             if len(vals) < 3: continue
@@ -1134,27 +1777,30 @@ async def importar_catedra_cursos(file: UploadFile = File(...), db: Session = De
             codigo = m.group(1) if m else (f"c.{vals[0]}" if vals[0] else None)
             turno = m.group(3) if m else None
             if not codigo or not curso_nombre: continue
-            catedra = db.query(Catedra).filter(Catedra.codigo == codigo).first()
+            catedra = refs.catedra_por_codigo.get(codigo)
             if not catedra: continue
-            curso = db.query(Curso).filter(Curso.nombre == curso_nombre).first()
-            if not curso:
-                sede = db.query(Sede).filter(Sede.nombre == sede_nombre).first() if sede_nombre else None
-                curso = Curso(nombre=curso_nombre, sede_id=sede.id if sede else None); db.add(curso); db.flush()
-            sede = db.query(Sede).filter(Sede.nombre == sede_nombre).first() if sede_nombre else None
-            if not db.query(CatedraCurso).filter(CatedraCurso.catedra_id == catedra.id, CatedraCurso.curso_id == curso.id, CatedraCurso.turno == turno).first():
-                db.add(CatedraCurso(catedra_id=catedra.id, curso_id=curso.id, turno=turno, sede_id=sede.id if sede else None)); creados += 1
+            sede = refs.sede_por_nombre.get(sede_nombre) if sede_nombre else None
+            sede_id = sede.id if sede else None
+            cursos.agregar({"nombre": curso_nombre, "sede_id": sede_id})
+            pendientes.append((catedra.id, curso_nombre, turno, sede_id))
+        cursos.guardar()
+        for catedra_id, curso_nombre, turno, sede_id in pendientes:
+            if relaciones.agregar({"catedra_id": catedra_id, "curso_id": cursos.id_de(curso_nombre), "turno": turno, "sede_id": sede_id}):
+                creados += 1
+        relaciones.guardar()
         db.commit(); wb.close()
+        bump_data_version()
         return {"creados": creados, "errores": errores[:20]}
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error: {str(e)}")
 
 @app.post("/api/importar/links-meet")
 async def importar_links_meet(file: UploadFile = File(...), db: Session = Depends(get_db)):
+    wb = abrir_excel(file)
     try:
-        content = await file.read()
-        wb = load_workbook(filename=io.BytesIO(content), read_only=True)
         ws = wb[wb.sheetnames[0]]
         actualizados = 0; errores = []
+        catedras = LoteMaestro(db, Catedra, "codigo", ("link_meet",))
         for row_num, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
             vals = [str(c).strip() if c is not None else "" for c in row]
             if len(vals) < 2: continue
@@ -1163,113 +1809,125 @@ async def importar_links_meet(file: UploadFile = File(...), db: Session = Depend
                 if re.match(r'^c\.\d+', v, re.IGNORECASE): codigo = v
                 elif 'meet.google.com' in v or 'http' in v: link = v
             if not codigo or not link: continue
-            cat = db.query(Catedra).filter(Catedra.codigo == codigo).first()
-            if cat: cat.link_meet = link; actualizados += 1
+            if catedras.get(codigo): catedras.actualizar(codigo, link_meet=link); actualizados += 1
+        catedras.guardar()
         db.commit(); wb.close()
+        bump_data_version()
         return {"actualizados": actualizados, "errores": errores[:10]}
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error: {str(e)}")
 
+# ===== v17.0: Escritura en bloque de alumnos e inscripciones =====
+LOTE_UPSERT = 1000
+_INSCRIPCIONES = table("inscripciones", column("alumno_id"), column("catedra_id"), column("cuatrimestre_id"),
+    column("turno"), column("modalidad_alumno"), column("sede_referencia"), column("curso_nombre"),
+    column("es_edi"), column("edi_materia"))
+_INSCRIPCION_CLASIF = ("turno", "modalidad_alumno", "sede_referencia", "curso_nombre", "es_edi", "edi_materia")
+
+def resolver_alumnos_por_dni(db, nombres):
+    """
+    nombres: dni → (nombre, apellido). Devuelve (dni → alumno_id, creados): una consulta para los
+    existentes y un INSERT ... ON CONFLICT DO NOTHING RETURNING por lote para los nuevos.
+    """
+    from sqlalchemy import text
+    from sqlalchemy.dialects.postgresql import insert as pg_insert
+    dnis = list(nombres)
+    ids = {}
+    for i in range(0, len(dnis), LOTE_UPSERT):
+        lote = dnis[i:i + LOTE_UPSERT]
+        for aid, dni in db.execute(text("SELECT id, dni FROM alumnos WHERE dni = ANY(:dnis)"), {"dnis": lote}).fetchall():
+            ids[dni] = aid
+    nuevos = [{"dni": dni, "nombre": nombres[dni][0], "apellido": nombres[dni][1]} for dni in dnis if dni not in ids]
+    creados = 0
+    for i in range(0, len(nuevos), LOTE_UPSERT):
+        stmt = pg_insert(Alumno.__table__).values(nuevos[i:i + LOTE_UPSERT]).on_conflict_do_nothing(index_elements=["dni"])
+        for aid, dni in db.execute(stmt.returning(Alumno.__table__.c.id, Alumno.__table__.c.dni)).fetchall():
+            ids[dni] = aid; creados += 1
+    faltan = [d["dni"] for d in nuevos if d["dni"] not in ids]  # creados en paralelo por otra importación
+    if faltan:
+        for aid, dni in db.execute(text("SELECT id, dni FROM alumnos WHERE dni = ANY(:dnis)"), {"dnis": faltan}).fetchall():
+            ids[dni] = aid
+    return ids, creados
+
+def upsert_inscripciones(db, cuatrimestre_id, filas, al_lote=None, columnas=_INSCRIPCION_CLASIF):
+    """
+    filas: [{alumno_id, catedra_id, turno, modalidad_alumno, ...}] sin claves repetidas.
+    INSERT ... ON CONFLICT (alumno, cátedra, cuatrimestre) DO UPDATE con la clasificación en la misma
+    sentencia, por lotes. Devuelve cuántas inscripciones eran nuevas (xmax = 0 ⇒ insertada).
+    al_lote(n) se llama después de cada lote (p. ej. para confirmar en imports en background).
+    columnas: qué campos de clasificación pisa el conflicto (BCE/BEA no toca es_edi/edi_materia).
+    """
+    from sqlalchemy import literal_column
+    from sqlalchemy.dialects.postgresql import insert as pg_insert
+    nuevas = 0
+    for i in range(0, len(filas), LOTE_UPSERT):
+        stmt = pg_insert(_INSCRIPCIONES).values([dict(f, cuatrimestre_id=cuatrimestre_id) for f in filas[i:i + LOTE_UPSERT]])
+        stmt = stmt.on_conflict_do_update(index_elements=["alumno_id", "catedra_id", "cuatrimestre_id"],
+            set_={c: stmt.excluded[c] for c in columnas})
+        nuevas += sum(1 for (insertada,) in db.execute(stmt.returning(literal_column("xmax = 0"))).fetchall() if insertada)
+        if al_lote: al_lote(min(i + LOTE_UPSERT, len(filas)))
+    return nuevas
+
 # ===== v5.0: Importar alumnos con clasificación sede/turno/modalidad =====
+def _importar_alumnos(hojas, cuatrimestre_id, db, job=None):
+    """
+    Merge y escritura de las hojas ya parseadas (ver parsear_hojas + parsear_hoja_alumnos).
+    Endpoint y jobs; con job, reporta avance y confirma por lotes.
+    """
+    exigir_indice_unico_inscripciones(db)
+    errores = []; edi_total = 0; n_filas = 0
+    stats = {'virtual': 0, 'presencial': 0, 'turnos': {}, 'sedes': {}}
+    cursos_vistos = set()
+    cat_por_codigo = referencias(db).catedra_por_codigo
+    # v17.0: 1) Merge de las tuplas. Si (alumno, cátedra) se repite, la última fila define la
+    # clasificación (como el UPDATE fila a fila); el nombre sale de la primera aparición del DNI.
+    filas = {}  # (dni, catedra_id) → (turno, modalidad, sede, curso, es_edi, edi_materia)
+    nombres = {}  # dni → (nombre, apellido)
+    for filas_hoja, edi_count in hojas:
+        for dni, nombre, apellido, codigo, turno, modalidad_alumno, sede_ref, curso, is_edi, edi_mat in filas_hoja:
+            catedra = cat_por_codigo.get(codigo)
+            if not catedra: continue
+            if curso: cursos_vistos.add(curso)
+            if dni not in nombres: nombres[dni] = (nombre, apellido)
+            filas[(dni, catedra.id)] = (turno, modalidad_alumno, sede_ref, curso, is_edi, edi_mat)
+            n_filas += 1
+            if job is not None: job["filas"] += 1
+            # Contar stats siempre
+            stats[modalidad_alumno] = stats.get(modalidad_alumno, 0) + 1
+            if turno: stats['turnos'][turno] = stats['turnos'].get(turno, 0) + 1
+            if sede_ref: stats['sedes'][sede_ref] = stats['sedes'].get(sede_ref, 0) + 1
+        edi_total += edi_count
+    # 2) Alumnos: una búsqueda en bloque por DNI + alta de los nuevos
+    alumno_ids, creados = resolver_alumnos_por_dni(db, nombres)
+    if job is not None: db.commit()  # en background se confirma por lotes
+    # 3) Inscripciones: upsert por lotes con la clasificación incluida
+    inscripciones = upsert_inscripciones(db, cuatrimestre_id, [
+        dict(zip(_INSCRIPCION_CLASIF, clasif), alumno_id=alumno_ids[dni], catedra_id=cat_id)
+        for (dni, cat_id), clasif in filas.items()], al_lote=(lambda n: db.commit()) if job is not None else None)
+    actualizados = n_filas - inscripciones  # existentes o repetidas en el archivo
+    refrescar_rollup(db, cuatrimestre_id, {cat_id for _, cat_id in filas})
+    db.commit()
+    bump_data_version(cuatrimestre_id)
+    registrar_cursos_clasificados(db, cursos_vistos)
+    return {
+        "alumnos_nuevos": creados, "inscripciones_nuevas": inscripciones,
+        "inscripciones_actualizadas": actualizados,
+        "edi_contabilizados": edi_total,
+        "virtuales": stats.get('virtual', 0), "presenciales": stats.get('presencial', 0),
+        "por_turno": stats['turnos'], "por_sede": stats['sedes'],
+        "errores": errores[:20]
+    }
+
 @app.post("/api/importar/alumnos")
 async def importar_alumnos(file: UploadFile = File(...), cuatrimestre_id: int = 1, db: Session = Depends(get_db)):
-    from sqlalchemy import text
-    try:
-        content = await file.read()
-        wb = load_workbook(filename=io.BytesIO(content), read_only=True)
-        creados = 0; inscripciones = 0; actualizados = 0; errores = []; edi_total = 0
-        stats = {'virtual': 0, 'presencial': 0, 'turnos': {}, 'sedes': {}}
-        for ws in wb:
-            # v16.0: Collect all rows, find dominant code per sheet for EDI matching
-            all_rows = list(ws.iter_rows(min_row=2, values_only=True))
-            sheet_codes = {}
-            for pre_row in all_rows:
-                pv = [str(c).strip() if c is not None else "" for c in pre_row]
-                if len(pv) < 4: continue
-                pm = re.match(r'^(c\.\d+)', pv[3], re.IGNORECASE)
-                if pm:
-                    pc = pm.group(1)
-                    sheet_codes[pc] = sheet_codes.get(pc, 0) + 1
-            dominant_code = max(sheet_codes, key=sheet_codes.get) if sheet_codes else None
-            edi_count = 0
-            for row_num, row in enumerate(all_rows, start=2):
-                vals = [str(c).strip() if c is not None else "" for c in row]
-                if len(vals) < 4: continue
-                alumno_texto = vals[1]
-                dni_raw = str(vals[2]).strip() if vals[2] else ""
-                materia_texto = vals[3]
-                curso_texto = vals[4] if len(vals) > 4 else ""
-                dni = re.sub(r'[.\-\s]', '', dni_raw)
-                if '.' in dni:
-                    try: dni = str(int(float(dni)))
-                    except: pass
-                if not dni or len(dni) < 6: continue
-                m_nombre = re.match(r'^(.+?)\s*\(\d+\)', alumno_texto)
-                nombre_completo = m_nombre.group(1).strip() if m_nombre else alumno_texto
-                partes = nombre_completo.strip().split(' ')
-                nombre = ' '.join(partes[:-1]) if len(partes) >= 2 else nombre_completo
-                apellido = partes[-1] if len(partes) >= 2 else ""
-                m_cod = re.match(r'^(c\.\d+)', materia_texto, re.IGNORECASE)
-                is_edi = False; edi_mat = None
-                if not m_cod:
-                    # v16.0: If it says EDI, use the dominant cátedra code of this sheet
-                    if 'EDI' in materia_texto.upper() and dominant_code:
-                        codigo = dominant_code
-                        is_edi = True; edi_mat = materia_texto[:100]
-                        edi_count += 1
-                    else:
-                        continue
-                else:
-                    codigo = m_cod.group(1)
-                catedra = db.query(Catedra).filter(Catedra.codigo == codigo).first()
-                if not catedra: continue
-                # v5.0: Clasificar por curso
-                modalidad_alumno, sede_ref, es_cied = clasificar_alumno_curso(curso_texto)
-                turno = extraer_turno_materia(materia_texto)
-                alumno = db.query(Alumno).filter(Alumno.dni == dni).first()
-                if not alumno:
-                    alumno = Alumno(dni=dni, nombre=nombre, apellido=apellido)
-                    db.add(alumno); db.flush(); creados += 1
-                existe = db.query(Inscripcion).filter(
-                    Inscripcion.alumno_id == alumno.id,
-                    Inscripcion.catedra_id == catedra.id,
-                    Inscripcion.cuatrimestre_id == cuatrimestre_id
-                ).first()
-                if not existe:
-                    insc = Inscripcion(alumno_id=alumno.id, catedra_id=catedra.id, cuatrimestre_id=cuatrimestre_id)
-                    db.add(insc); db.flush()
-                    try:
-                        db.execute(text(
-                            "UPDATE inscripciones SET turno = :turno, modalidad_alumno = :mod, sede_referencia = :sede, curso_nombre = :curso, es_edi = :edi, edi_materia = :edim WHERE id = :id"
-                        ), {"turno": turno, "mod": modalidad_alumno, "sede": sede_ref, "curso": curso_texto[:200] if curso_texto else None, "edi": is_edi, "edim": edi_mat, "id": insc.id})
-                    except Exception:
-                        pass
-                    inscripciones += 1
-                else:
-                    try:
-                        db.execute(text(
-                            "UPDATE inscripciones SET turno = :turno, modalidad_alumno = :mod, sede_referencia = :sede, curso_nombre = :curso, es_edi = :edi, edi_materia = :edim WHERE id = :id"
-                        ), {"turno": turno, "mod": modalidad_alumno, "sede": sede_ref, "curso": curso_texto[:200] if curso_texto else None, "edi": is_edi, "edim": edi_mat, "id": existe.id})
-                        actualizados += 1
-                    except Exception:
-                        pass
-                # Contar stats siempre
-                stats[modalidad_alumno] = stats.get(modalidad_alumno, 0) + 1
-                if turno: stats['turnos'][turno] = stats['turnos'].get(turno, 0) + 1
-                if sede_ref: stats['sedes'][sede_ref] = stats['sedes'].get(sede_ref, 0) + 1
-            edi_total += edi_count
-        db.commit(); wb.close()
-        return {
-            "alumnos_nuevos": creados, "inscripciones_nuevas": inscripciones,
-            "inscripciones_actualizadas": actualizados,
-            "edi_contabilizados": edi_total,
-            "virtuales": stats.get('virtual', 0), "presenciales": stats.get('presencial', 0),
-            "por_turno": stats['turnos'], "por_sede": stats['sedes'],
-            "errores": errores[:20]
-        }
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=400, detail=f"Error: {str(e)}")
+    with upload_en_disco(file) as ruta:
+        try:
+            hojas = await asyncio.get_running_loop().run_in_executor(None, parsear_hojas, ruta, parsear_hoja_alumnos)
+            return _importar_alumnos(hojas, cuatrimestre_id, db)
+        except HTTPException: raise
+        except Exception as e:
+            db.rollback()
+            raise HTTPException(status_code=400, detail=f"Error: {str(e)}")
 
 
 # ===== v16.0: EDI Inscripciones — listar alumnos EDI por cátedra =====
@@ -1293,7 +1951,7 @@ def get_edi_inscripciones(cuatrimestre_id: int = None, db: Session = Depends(get
             "sede": r[4], "turno": r[5],
         })
         por_cat[key]["total"] += 1
-    return {"por_catedra": por_cat, "total": len(rows)}
+    return JSONRapida({"por_catedra": por_cat, "total": len(rows)})
 
 
 # ==================== SOLAPAMIENTOS ====================
@@ -1304,114 +1962,149 @@ def verificar_solapamiento_catedra(catedra_id, dia, hora_inicio, cuatrimestre_id
     if q.first(): return f"⛔ La cátedra ya tiene clase el {dia} a las {hora_inicio}."
     return None
 
+DURACION_CLASE_DEFAULT = 60  # minutos, para asignaciones sin hora_fin
+
+def _hora_a_minutos(hora):
+    m = re.match(r'^\s*(\d{1,2})[:.](\d{2})', hora or '')
+    return int(m.group(1)) * 60 + int(m.group(2)) if m else None
+
+def _pares_solapados(items):
+    """
+    items: [(inicio, fin, payload)] de un mismo bucket (mismo día y misma cátedra/docente).
+    Barrido sobre intervalos [inicio, fin): ordena por inicio y mantiene un heap de activos
+    por fin. Devuelve los pares (anterior, posterior) que se pisan. O(n log n + k).
+    """
+    import heapq
+    activos = []; pares = []
+    for seq, (ini, fin, p) in enumerate(sorted(items, key=lambda x: (x[0], x[1]))):
+        while activos and activos[0][0] <= ini: heapq.heappop(activos)
+        for _, _, q in activos: pares.append((q, p))
+        heapq.heappush(activos, (fin, seq, p))
+    return pares
+
+def detectar_solapamientos(rows):
+    """
+    rows: [(id, catedra_id, docente_id, dia, hora_inicio, hora_fin, cat_codigo, doc_nombre, doc_apellido)].
+    Agrupa por día y cátedra (CATEDRA) y por día y docente (DOCENTE, solo entre cátedras distintas).
+    """
+    por_cat = {}; por_doc = {}
+    for r in rows:
+        ini = _hora_a_minutos(r[4])
+        if ini is None: continue
+        fin = _hora_a_minutos(r[5])
+        if fin is None or fin <= ini: fin = ini + DURACION_CLASE_DEFAULT
+        item = (ini, fin, r)
+        key = (r[3], r[1])
+        if key not in por_cat: por_cat[key] = []
+        por_cat[key].append(item)
+        if r[2]:
+            key = (r[3], r[2])
+            if key not in por_doc: por_doc[key] = []
+            por_doc[key].append(item)
+    solapamientos = []
+    for items in por_cat.values():
+        if len(items) < 2: continue
+        for a1, a2 in _pares_solapados(items):
+            solapamientos.append({"tipo": "CATEDRA", "severidad": "CRITICO", "mensaje": f"Cátedra {a1[6] or '?'} tiene dos clases {a1[3]} {a2[4]}.", "dia": a1[3], "hora": a2[4], "asignaciones": [a1[0], a2[0]]})
+    for items in por_doc.values():
+        if len(items) < 2: continue
+        for a1, a2 in _pares_solapados(items):
+            if a1[1] == a2[1]: continue  # misma cátedra → ya reportado como CATEDRA
+            solapamientos.append({"tipo": "DOCENTE", "severidad": "ALTO", "mensaje": f"{a1[7]} {a1[8]} tiene {a1[6]} y {a2[6]} el {a1[3]} {a2[4]}.", "dia": a1[3], "hora": a2[4], "asignaciones": [a1[0], a2[0]]})
+    return solapamientos
+
 @app.get("/api/horarios/solapamientos")
-def get_solapamientos(cuatrimestre_id: int = None, db: Session = Depends(get_db)):
+def get_solapamientos(cuatrimestre_id: int = None, db: Session = Depends(get_db), asignacion_id: int = None):
+    """
+    Solapamientos reales de intervalos [hora_inicio, hora_fin) por día, de cátedra y de docente.
+    Con asignacion_id solo se revisan las asignaciones del mismo día que comparten cátedra o
+    docente con ella (validación rápida de una edición).
+    """
     try:
-        q = db.query(Asignacion).filter(Asignacion.dia.isnot(None), Asignacion.hora_inicio.isnot(None), Asignacion.modalidad != 'asincronica')
-        if cuatrimestre_id: q = q.filter(Asignacion.cuatrimestre_id == cuatrimestre_id)
-        asigs = q.all()
-        solapamientos = []; checked = set()
-        for i, a1 in enumerate(asigs):
-            for a2 in asigs[i+1:]:
-                if a1.dia != a2.dia or a1.hora_inicio != a2.hora_inicio: continue
-                pair = tuple(sorted([a1.id, a2.id]))
-                if pair in checked: continue
-                checked.add(pair)
-                cat1 = a1.catedra; cat2 = a2.catedra
-                if a1.catedra_id == a2.catedra_id:
-                    solapamientos.append({"tipo": "CATEDRA", "severidad": "CRITICO", "mensaje": f"Cátedra {cat1.codigo if cat1 else '?'} tiene dos clases {a1.dia} {a1.hora_inicio}.", "dia": a1.dia, "hora": a1.hora_inicio})
-                elif a1.docente_id and a1.docente_id == a2.docente_id:
-                    doc = a1.docente
-                    solapamientos.append({"tipo": "DOCENTE", "severidad": "ALTO", "mensaje": f"{doc.nombre} {doc.apellido} tiene {cat1.codigo} y {cat2.codigo} el {a1.dia} {a1.hora_inicio}.", "dia": a1.dia, "hora": a1.hora_inicio})
+        q = db.query(Asignacion.id, Asignacion.catedra_id, Asignacion.docente_id, Asignacion.dia,
+            Asignacion.hora_inicio, Asignacion.hora_fin, Catedra.codigo, Docente.nombre, Docente.apellido
+        ).outerjoin(Catedra, Asignacion.catedra_id == Catedra.id).outerjoin(Docente, Asignacion.docente_id == Docente.id)
+        q = q.filter(Asignacion.dia.isnot(None), Asignacion.hora_inicio.isnot(None), Asignacion.modalidad != 'asincronica')
+        if asignacion_id:
+            target = db.query(Asignacion).filter(Asignacion.id == asignacion_id).first()
+            if not target or not target.dia or not target.hora_inicio or target.modalidad == 'asincronica': return []
+            vecinos = Asignacion.catedra_id == target.catedra_id
+            if target.docente_id: vecinos = or_(vecinos, Asignacion.docente_id == target.docente_id)
+            q = q.filter(Asignacion.cuatrimestre_id == target.cuatrimestre_id, Asignacion.dia == target.dia, vecinos)
+        elif cuatrimestre_id: q = q.filter(Asignacion.cuatrimestre_id == cuatrimestre_id)
+        solapamientos = detectar_solapamientos(q.all())
+        if asignacion_id:
+            solapamientos = [s for s in solapamientos if asignacion_id in s["asignaciones"]]
         return solapamientos
     except Exception: return []
 
 @app.get("/api/docentes/estadisticas")
 def get_estadisticas_docentes(cuatrimestre_id: int = None, db: Session = Depends(get_db)):
-    stats = {"presencial_virtual": 0, "sede_virtual": 0, "remoto": 0, "sin_asignaciones": 0}
-    for d in db.query(Docente).all():
-        tipo = calcular_tipo_modalidad(d, db)
-        if tipo == "PRESENCIAL_VIRTUAL": stats["presencial_virtual"] += 1
-        elif tipo == "SEDE_VIRTUAL": stats["sede_virtual"] += 1
-        elif tipo == "REMOTO": stats["remoto"] += 1
-        else: stats["sin_asignaciones"] += 1
-    return stats
+    """Conteo por tipo de modalidad en una sola consulta (docentes LEFT JOIN agregado por docente)."""
+    sub = _modalidad_por_docente_query(db, cuatrimestre_id).subquery()
+    total, pres_virt, sede_virt, remoto = db.query(
+        func.count(Docente.id),
+        func.sum(case((sub.c.presenciales > 0, 1), else_=0)),
+        func.sum(case((and_(sub.c.presenciales == 0, sub.c.con_sede > 0), 1), else_=0)),
+        func.sum(case((and_(sub.c.presenciales == 0, sub.c.con_sede == 0), 1), else_=0)),
+    ).outerjoin(sub, sub.c.docente_id == Docente.id).one()
+    pres_virt = pres_virt or 0; sede_virt = sede_virt or 0; remoto = remoto or 0
+    return {"presencial_virtual": pres_virt, "sede_virtual": sede_virt, "remoto": remoto,
+        "sin_asignaciones": (total or 0) - pres_virt - sede_virt - remoto}
 
 # ===== v15.0: Importar alumnos BCE/BEA =====
-@app.post("/api/importar/alumnos-bce-bea")
-async def importar_alumnos_bce_bea(file: UploadFile = File(...), cuatrimestre_id: int = 1, db: Session = Depends(get_db)):
+_INSCRIPCION_BCE_BEA = ("turno", "modalidad_alumno", "sede_referencia", "curso_nombre")
+
+def _importar_alumnos_bce_bea(hojas, cuatrimestre_id, db, job=None):
     """BCE/BEA: todos virtuales, sin turno. BEA siempre a Caballito Virtual. BCE a la sede del alumno + Virtual."""
-    from openpyxl import load_workbook
-    import io
-    content = await file.read()
-    wb = load_workbook(io.BytesIO(content), read_only=True)
-    total = 0; errores = []; no_encontradas = set()
-    # Pre-load all catedras for name matching
-    all_cats = {c.nombre.lower().strip(): c for c in db.query(Catedra).all()}
-    all_cats_by_code = {c.codigo: c for c in db.query(Catedra).all()}
-    for ws in wb.worksheets:
-        for row in ws.iter_rows(min_row=2, values_only=True):
-            try:
-                vals = list(row)
-                if len(vals) < 5: continue
-                alumno_nombre = str(vals[1] or '').strip()
-                dni = str(vals[2] or '').strip()
-                materia = str(vals[3] or '').strip()
-                curso = str(vals[4] or '').strip()
-                if not alumno_nombre or not materia: continue
-                # Try to find cátedra: first by code pattern, then by name
-                cat = None
-                cod_match = re.search(r'c\.(\d+)', materia)
-                if cod_match:
-                    cat = all_cats_by_code.get(f"c.{cod_match.group(1)}")
-                if not cat:
-                    cod_match = re.search(r'c\.(\d+)', curso)
-                    if cod_match:
-                        cat = all_cats_by_code.get(f"c.{cod_match.group(1)}")
-                if not cat:
-                    # Match by name (BCE files only have the name, e.g. "Lengua I")
-                    mat_lower = materia.lower().strip()
-                    cat = all_cats.get(mat_lower)
-                    if not cat:
-                        # Partial match
-                        for nombre, c in all_cats.items():
-                            if mat_lower in nombre or nombre in mat_lower:
-                                cat = c; break
-                if not cat:
-                    no_encontradas.add(materia)
-                    continue
-                # Determine BCE or BEA
-                es_bea = 'BEA' in curso.upper() or 'BEA' in materia.upper()
-                if es_bea:
-                    sede_ref = 'Caballito'
-                else:
-                    sede_match = re.search(r'\(([^)]+)\)', curso)
-                    sede_ref = normalizar_sede(sede_match.group(1).strip()) if sede_match else 'Online - Interior'
-                # Clean DNI
-                dni = re.sub(r'[^\d]', '', dni)[:10]
-                # Find or create alumno
-                al = db.query(Alumno).filter(Alumno.dni == dni).first() if dni else None
-                if not al:
-                    al_nombre = re.sub(r'\s*\(.*\)', '', alumno_nombre).strip()
-                    al = Alumno(nombre=al_nombre, dni=dni)
-                    db.add(al); db.flush()
-                # Upsert inscription
-                existing = db.query(Inscripcion).filter(
-                    Inscripcion.alumno_id == al.id, Inscripcion.catedra_id == cat.id,
-                    Inscripcion.cuatrimestre_id == cuatrimestre_id).first()
-                if existing:
-                    existing.turno = 'Virtual'; existing.modalidad_alumno = 'virtual'
-                    existing.sede_referencia = sede_ref; existing.curso_nombre = curso
-                else:
-                    db.add(Inscripcion(alumno_id=al.id, catedra_id=cat.id, cuatrimestre_id=cuatrimestre_id,
-                        turno='Virtual', modalidad_alumno='virtual', sede_referencia=sede_ref, curso_nombre=curso))
-                total += 1
-            except Exception as e:
-                errores.append(str(e)[:100])
+    exigir_indice_unico_inscripciones(db)
+    total = 0; errores = []; no_encontradas = set(); cursos_vistos = set()
+    # Cátedras por nombre normalizado y por código (snapshot compartido)
+    refs = referencias(db)
+    all_cats_by_code = refs.catedra_por_codigo
+    filas = {}  # (dni, catedra_id) → (turno, modalidad, sede, curso); la última fila manda
+    nombres = {}  # dni → (nombre, apellido)
+    for filas_hoja, errores_hoja in hojas:
+        errores.extend(errores_hoja)
+        for al_nombre, dni, materia, curso, cod_materia, cod_curso, sede_ref in filas_hoja:
+            if job is not None: job["filas"] += 1
+            # Try to find cátedra: first by code pattern, then by name
+            cat = (all_cats_by_code.get(cod_materia) if cod_materia else None) or \
+                (all_cats_by_code.get(cod_curso) if cod_curso else None)
+            if not cat:
+                # Match by name (BCE files only have the name, e.g. "Lengua I"), exacto o parcial
+                cat = refs.catedra_indice.buscar(materia)
+            if not cat:
+                no_encontradas.add(materia)
+                continue
+            if not dni:
+                errores.append(f"Sin DNI: {al_nombre}"[:100])
+                continue
+            if dni not in nombres: nombres[dni] = (al_nombre, None)
+            filas[(dni, cat.id)] = ('Virtual', 'virtual', sede_ref, curso)
+            cursos_vistos.add(curso)
+            total += 1
+    alumno_ids, _ = resolver_alumnos_por_dni(db, nombres)
+    upsert_inscripciones(db, cuatrimestre_id, [
+        dict(zip(_INSCRIPCION_BCE_BEA, clasif), alumno_id=alumno_ids[dni], catedra_id=cat_id)
+        for (dni, cat_id), clasif in filas.items()], columnas=_INSCRIPCION_BCE_BEA)
+    refrescar_rollup(db, cuatrimestre_id, {cat_id for _, cat_id in filas})
     db.commit()
-    wb.close()
+    bump_data_version(cuatrimestre_id)
+    registrar_cursos_clasificados(db, cursos_vistos)
     return {"importados": total, "tipo": "BCE/BEA", "errores": errores[:10], "no_encontradas": list(no_encontradas)[:20]}
 
+@app.post("/api/importar/alumnos-bce-bea")
+async def importar_alumnos_bce_bea(file: UploadFile = File(...), cuatrimestre_id: int = 1, db: Session = Depends(get_db)):
+    with upload_en_disco(file) as ruta:
+        try:
+            hojas = await asyncio.get_running_loop().run_in_executor(None, parsear_hojas, ruta, parsear_hoja_bce_bea)
+            return _importar_alumnos_bce_bea(hojas, cuatrimestre_id, db)
+        except HTTPException: raise
+        except Exception as e:
+            db.rollback()
+            raise HTTPException(status_code=400, detail=f"Error: {str(e)}")
+
 @app.post("/api/cuatrimestres/replicar")
 def replicar_cuatrimestre(data: dict, db: Session = Depends(get_db)):
     origen_id = data.get("origen_id"); destino_id = data.get("destino_id")
@@ -1425,6 +2118,7 @@ def replicar_cuatrimestre(data: dict, db: Session = Depends(get_db)):
         db.add(Asignacion(catedra_id=a.catedra_id, cuatrimestre_id=destino_id, modalidad=a.modalidad, dia=a.dia, hora_inicio=a.hora_inicio, hora_fin=a.hora_fin, sede_id=a.sede_id, recibe_alumnos_presenciales=a.recibe_alumnos_presenciales))
         replicadas += 1
     db.commit()
+    bump_data_version(destino_id)
     return {"replicadas": replicadas, "ya_existentes": ya_existentes}
 
 # ===== v11.0: Dashboard con flujo guiado =====
@@ -1442,23 +2136,18 @@ def get_dashboard(cuatrimestre_id: int = None, db: Session = Depends(get_db)):
     con_docente = len([a for a in asigs if a.docente_id])
     sin_docente = len([a for a in asigs if not a.docente_id])
     # Inscriptos
-    q_i = "SELECT COUNT(*) FROM inscripciones"
+    # Inscriptos clasificados vs sin clasificar y cátedras con inscriptos, desde el rollup
+    q_i = """SELECT COALESCE(SUM(count), 0), COALESCE(SUM(CASE WHEN modalidad != '' THEN count ELSE 0 END), 0),
+        COUNT(DISTINCT catedra_id) FROM inscripciones_rollup"""
     if cuatrimestre_id: q_i += f" WHERE cuatrimestre_id = {cuatrimestre_id}"
-    total_insc = db.execute(text(q_i)).scalar() or 0
-    # Inscriptos clasificados vs sin clasificar
-    q_clas = "SELECT COUNT(*) FROM inscripciones WHERE modalidad_alumno IS NOT NULL"
-    if cuatrimestre_id: q_clas += f" AND cuatrimestre_id = {cuatrimestre_id}"
-    clasificados = db.execute(text(q_clas)).scalar() or 0
+    total_insc, clasificados, cats_con_inscriptos = db.execute(text(q_i)).fetchone()
     sin_clasificar = total_insc - clasificados
     # Decisiones tomadas
     q_dec = "SELECT COUNT(*) FROM catedras WHERE decision_apertura IS NOT NULL AND decision_apertura != ''"
     decisiones_tomadas = db.execute(text(q_dec)).scalar() or 0
-    cats_con_inscriptos_q = "SELECT COUNT(DISTINCT catedra_id) FROM inscripciones"
-    if cuatrimestre_id: cats_con_inscriptos_q += f" WHERE cuatrimestre_id = {cuatrimestre_id}"
-    cats_con_inscriptos = db.execute(text(cats_con_inscriptos_q)).scalar() or 0
     decisiones_pendientes = max(0, cats_con_inscriptos - decisiones_tomadas)
     # Disponibilidad docentes
-    docs_con_dispo = db.execute(text("SELECT COUNT(DISTINCT docente_id) FROM docente_disponibilidad")).scalar() or 0
+    docs_con_dispo = len(disponibilidad_masks(db, cuatrimestre_id))
     # Solapamientos
     solaps = len(get_solapamientos(cuatrimestre_id, db))
     # Criterio
@@ -1518,13 +2207,8 @@ def get_dashboard(cuatrimestre_id: int = None, db: Session = Depends(get_db)):
 
 
 # ===== v13.0: Plan Carrera - Importar molde de horarios =====
-@app.post("/api/importar/plan-carrera")
-async def importar_plan_carrera(file: UploadFile = File(...), db: Session = Depends(get_db)):
-    from openpyxl import load_workbook
+def _importar_plan_carrera(wb, db, job=None):
     from sqlalchemy import text
-    import io
-    content = await file.read()
-    wb = load_workbook(io.BytesIO(content), read_only=True)
     total = 0
     # Clear existing plan
     try: db.execute(text("DELETE FROM plan_carrera")); db.commit()
@@ -1546,6 +2230,7 @@ async def importar_plan_carrera(file: UploadFile = File(...), db: Session = Depe
                 all_records.append((sede, carrera_act, anno_to_use, pc[0], pc[1], pc[2], pc[3], pc[4], pc[5]))
             pending_cats = []
         for vals in raw_rows:
+            if job is not None: job["filas"] += 1
             if len(vals) < 5: continue
             b = str(vals[1] or '').strip()
             c = str(vals[2] or '').strip()
@@ -1615,26 +2300,40 @@ async def importar_plan_carrera(file: UploadFile = File(...), db: Session = Depe
         if key in seen: continue
         seen.add(key)
         unique_records.append(rec)
-    # PHASE 3: Insert
-    for rec in unique_records:
+    # PHASE 3: Insert por lotes (executemany); si un lote falla se reintenta fila a fila
+    insert_q = text("""INSERT INTO plan_carrera (sede,carrera,anno,codigo_catedra,nombre_catedra,dia_tm,hora_tm,dia_tn,hora_tn)
+        VALUES (:s,:ca,:an,:co,:no,:dtm,:htm,:dtn,:htn)""")
+    params = [{"s":rec[0],"ca":rec[1],"an":rec[2],"co":rec[3],"no":rec[4],"dtm":rec[5],"htm":rec[6],"dtn":rec[7],"htn":rec[8]}
+        for rec in unique_records]
+    for i in range(0, len(params), LOTE_UPSERT):
+        lote = params[i:i + LOTE_UPSERT]
         try:
-            db.execute(text("""INSERT INTO plan_carrera (sede,carrera,anno,codigo_catedra,nombre_catedra,dia_tm,hora_tm,dia_tn,hora_tn)
-                VALUES (:s,:ca,:an,:co,:no,:dtm,:htm,:dtn,:htn)"""),
-                {"s":rec[0],"ca":rec[1],"an":rec[2],"co":rec[3],"no":rec[4],"dtm":rec[5],"htm":rec[6],"dtn":rec[7],"htn":rec[8]})
-            total += 1
-        except: pass
-    db.commit()
-    wb.close()
+            db.execute(insert_q, lote); total += len(lote)
+        except Exception:
+            db.rollback()
+            for p in lote:
+                try: db.execute(insert_q, p); db.commit(); total += 1
+                except Exception: db.rollback()
+        db.commit()
+    bump_data_version()
     return {"importados": total, "hojas": wb.sheetnames}
 
+@app.post("/api/importar/plan-carrera")
+async def importar_plan_carrera(file: UploadFile = File(...), db: Session = Depends(get_db)):
+    wb = abrir_excel(file)
+    try:
+        return _importar_plan_carrera(wb, db)
+    finally:
+        wb.close()
+
 # ===== v15.0: Importar docentes desde archivo CUIT =====
 @app.post("/api/importar/docentes-cuit")
 async def importar_docentes_cuit(file: UploadFile = File(...), db: Session = Depends(get_db)):
     from openpyxl import load_workbook
     import io
-    content = await file.read()
-    wb = load_workbook(io.BytesIO(content), read_only=True)
+    wb = abrir_excel(file)
     nuevos = 0; existentes = 0; errores = []
+    docentes = LoteMaestro(db, Docente, "dni", ("nombre", "apellido"))
     for ws in wb.worksheets:
         for row in ws.iter_rows(values_only=True):
             vals = list(row)
@@ -1649,19 +2348,17 @@ async def importar_docentes_cuit(file: UploadFile = File(...), db: Session = Dep
             parts = nombre_completo.split(',', 1)
             apellido = parts[0].strip()
             nombre = parts[1].strip() if len(parts) > 1 else ''
-            # Check if exists
-            existing = db.query(Docente).filter(Docente.dni == dni).first()
-            if existing:
-                # Update name if needed
-                if not existing.nombre or existing.nombre != nombre: existing.nombre = nombre
-                if not existing.apellido or existing.apellido != apellido: existing.apellido = apellido
+            # Check if exists (update name if needed)
+            if docentes.get(dni):
+                docentes.actualizar(dni, nombre=nombre, apellido=apellido)
                 existentes += 1
             else:
-                doc = Docente(nombre=nombre, apellido=apellido, dni=dni)
-                db.add(doc)
+                docentes.agregar({"dni": dni, "nombre": nombre, "apellido": apellido})
                 nuevos += 1
+    docentes.guardar()
     db.commit()
     wb.close()
+    bump_data_version()
     return {"nuevos": nuevos, "actualizados": existentes}
 
 # ===== v16.0: Auto-asignar cátedras de referencia desde asignaciones actuales =====
@@ -1685,6 +2382,7 @@ def auto_referencia_docentes(cuatrimestre_id: int = 1, db: Session = Depends(get
             actualizados += 1
         except: pass
     db.commit()
+    bump_data_version()
     return {"actualizados": actualizados}
 
 # ===== v16.0: Importar cátedras de referencia desde Excel de designaciones =====
@@ -1692,8 +2390,7 @@ def auto_referencia_docentes(cuatrimestre_id: int = 1, db: Session = Depends(get
 async def importar_catedras_referencia(file: UploadFile = File(...), db: Session = Depends(get_db)):
     from openpyxl import load_workbook
     import io
-    content = await file.read()
-    wb = load_workbook(io.BytesIO(content), read_only=True)
+    wb = abrir_excel(file)
     # Build docente_name → set of codes
     doc_cats = {}
     for ws in wb.worksheets:
@@ -1707,42 +2404,35 @@ async def importar_catedras_referencia(file: UploadFile = File(...), db: Session
             doc_raw = str(vals[5] or '').strip()
             if not doc_raw or doc_raw.lower().startswith('ver '): continue
             dc = doc_raw.upper().strip()
-            dc = DOCENTE_TYPO_MAP.get(dc, dc)
             if dc not in doc_cats: doc_cats[dc] = set()
             doc_cats[dc].add(cod)
     wb.close()
-    # Match to docentes in DB
+    # Match to docentes in DB (variantes y typos del mismo docente se juntan)
     from sqlalchemy import text
-    all_docs = db.query(Docente).all()
-    doc_by_apellido = {}
-    for d in all_docs:
-        ap = (d.apellido or '').upper().strip()
-        if ap: doc_by_apellido[ap] = d
-        full = f"{(d.apellido or '')} {(d.nombre or '')}".upper().strip()
-        if full: doc_by_apellido[full] = d
-        full2 = f"{(d.nombre or '')} {(d.apellido or '')}".upper().strip()
-        if full2: doc_by_apellido[full2] = d
-    actualizados = 0; no_match = []
+    docentes = indice_docentes(db)
+    por_docente = {}; no_match = []
     for doc_name, codes in doc_cats.items():
-        # Find docente
-        docente = doc_by_apellido.get(doc_name)
-        if not docente:
-            for key, d in doc_by_apellido.items():
-                if doc_name in key or key in doc_name:
-                    docente = d; break
+        docente = docentes.buscar(doc_name)
         if not docente:
             no_match.append(doc_name); continue
-        # Merge with existing
-        existing = set((getattr(docente, 'catedras_referencia', '') or '').split(','))
-        existing = {r.strip() for r in existing if r.strip()}
-        merged = sorted(existing | codes)
-        try:
-            db.execute(text("UPDATE docentes SET catedras_referencia = :val WHERE id = :id"),
-                {"val": ', '.join(merged), "id": docente.id})
-            actualizados += 1
-        except: pass
-    db.commit()
-    return {"actualizados": actualizados, "no_encontrados": no_match}
+        por_docente.setdefault(docente.id, set()).update(codes)
+    # Merge with existing: si no se pueden leer las referencias actuales no se escribe nada
+    # (pisarlas con solo los códigos de este archivo las perdería)
+    try:
+        actuales = dict(db.execute(text("SELECT id, catedras_referencia FROM docentes WHERE id = ANY(:ids)"),
+            {"ids": list(por_docente)}).fetchall())
+        filas = []
+        for docente_id, codes in por_docente.items():
+            existing = {r.strip() for r in (actuales.get(docente_id) or '').split(',') if r.strip()}
+            filas.append({"val": ', '.join(sorted(existing | codes)), "id": docente_id})
+        if filas:
+            db.execute(text("UPDATE docentes SET catedras_referencia = :val WHERE id = :id"), filas)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Error actualizando cátedras de referencia: {str(e)[:200]}")
+    bump_data_version()
+    return {"actualizados": len(filas), "no_encontrados": no_match}
 
 # ===== v15.0: Typo correction map for docente names =====
 DOCENTE_TYPO_MAP = {
@@ -1760,25 +2450,11 @@ DOCENTE_TYPO_MAP = {
     # NOT mapping: KAREN PAMELA FLORENTIN → goes to Caren Pamela, not Isaul
 }
 
-def _parse_horarios_excel(file_content, db, cuatrimestre_id):
-    """Parse horarios Excel and return structured data without applying changes."""
-    from openpyxl import load_workbook
-    import io
-    wb = load_workbook(io.BytesIO(file_content))
-    all_cats = {c.codigo: c for c in db.query(Catedra).all()}
-    all_docs = db.query(Docente).all()
-    doc_by_apellido = {}
-    for d in all_docs:
-        ap = (d.apellido or '').upper().strip()
-        if ap: doc_by_apellido[ap] = d
-        full = f"{(d.apellido or '')} {(d.nombre or '')}".upper().strip()
-        if full: doc_by_apellido[full] = d
-        full2 = f"{(d.nombre or '')} {(d.apellido or '')}".upper().strip()
-        if full2: doc_by_apellido[full2] = d
-        # Also match by full name as typed (e.g. "Luciano Salinas")
-        full3 = f"{(d.nombre or '')} {(d.apellido or '')}".strip()
-        if full3: doc_by_apellido[full3.upper()] = d
-    all_sedes = {s.nombre: s for s in db.query(Sede).all()}
+def _parse_horarios_excel(wb, db, cuatrimestre_id):
+    """Parse horarios Excel (workbook abierto con abrir_excel) and return structured data without applying changes."""
+    refs = referencias(db)
+    all_cats = refs.catedra_por_codigo
+    docentes = indice_docentes(db)
     dia_map = {'LUNES':'Lunes','MARTES':'Martes','MIERCOLES':'Miércoles','MIÉRCOLES':'Miércoles',
         'JUEVES':'Jueves','VIERNES':'Viernes','SABADO':'Sábado','SÁBADO':'Sábado'}
     results = []; no_cat = []; no_doc = set(); doc_to_create = set()
@@ -1806,25 +2482,13 @@ def _parse_horarios_excel(file_content, db, cuatrimestre_id):
             cat = all_cats.get(codigo)
             if not cat: no_cat.append(f"{codigo} {materia}"); continue
             sede_nombre = normalizar_sede(sede_raw) or sede_raw or ''
-            sede_obj = None
-            def _strip_accents(s):
-                import unicodedata
-                return ''.join(c for c in unicodedata.normalize('NFD', s) if unicodedata.category(c) != 'Mn')
-            for sn, so in all_sedes.items():
-                if _strip_accents(sn.lower()).replace(' ','') == _strip_accents(sede_nombre.lower()).replace(' ',''): sede_obj = so; break
-            if not sede_obj:
-                for sn, so in all_sedes.items():
-                    if _strip_accents(sede_nombre.lower())[:4] in _strip_accents(sn.lower()): sede_obj = so; break
+            sede_clave = normalizar_nombre(sede_nombre)
+            sede_obj = refs.sede_por_clave.get(sede_clave.replace(' ', '')) or refs.sede_indice.buscar_parcial(sede_clave[:4])
             docente_obj = None; doc_display = ''
             if doc_raw and not doc_raw.lower().startswith('ver '):
                 doc_clean = doc_raw.upper().strip()
                 if doc_clean.startswith('VER '): doc_clean = doc_clean[4:].strip()
-                # Apply typo map
-                corrected = DOCENTE_TYPO_MAP.get(doc_clean, doc_clean)
-                docente_obj = doc_by_apellido.get(corrected)
-                if not docente_obj:
-                    for key, d in doc_by_apellido.items():
-                        if corrected in key or key in corrected: docente_obj = d; break
+                docente_obj = docentes.buscar(doc_clean)  # typo map incluido
                 if docente_obj:
                     doc_display = f"{docente_obj.nombre} {docente_obj.apellido}"
                 else:
@@ -1841,18 +2505,64 @@ def _parse_horarios_excel(file_content, db, cuatrimestre_id):
     wb.close()
     return results, list(set(no_cat)), sorted(list(doc_to_create))
 
+# ===== v17.0: Tokens de preview de horarios =====
+# El preview guarda el resultado del parseo bajo un token (hash del contenido + cuatrimestre) con TTL;
+# horarios-aplicar?token=... lo aplica sin volver a subir ni parsear el archivo. El parseo depende de
+# cátedras, docentes y sedes: si la versión de datos cambió desde el preview, el token se rechaza.
+PREVIEW_TTL_S = 30 * 60
+PREVIEWS_RETENIDOS = 20
+_PREVIEWS = {}  # token → {"parseo", "cuatrimestre_id", "version", "creado"}
+_PREVIEWS_LOCK = threading.Lock()
+
+def hash_upload(file):
+    f = verificar_tamano_upload(file)
+    h = hashlib.sha256()
+    for bloque in iter(lambda: f.read(1024 * 1024), b""):
+        h.update(bloque)
+    f.seek(0)
+    return h.hexdigest()
+
+def _preview_vigente(token, cuatrimestre_id):
+    """(entrada, None) si el token existe, no venció, es del cuatrimestre y los datos no cambiaron; si no, (None, HTTPException)."""
+    p = _PREVIEWS.get(token)
+    if not p or time.time() - p["creado"] > PREVIEW_TTL_S:
+        return None, HTTPException(status_code=410, detail="Preview vencido o inexistente: volvé a previsualizar el archivo")
+    if p["cuatrimestre_id"] != cuatrimestre_id:
+        return None, HTTPException(status_code=400, detail=f"El preview corresponde al cuatrimestre {p['cuatrimestre_id']}")
+    if p["version"] != data_version(cuatrimestre_id):
+        return None, HTTPException(status_code=409, detail="Los datos cambiaron desde el preview: volvé a previsualizar el archivo")
+    return p, None
+
+def guardar_preview(token, parseo, cuatrimestre_id, version):
+    with _PREVIEWS_LOCK:
+        ahora = time.time()
+        for t in [t for t, p in _PREVIEWS.items() if ahora - p["creado"] > PREVIEW_TTL_S]:
+            del _PREVIEWS[t]
+        _PREVIEWS[token] = {"parseo": parseo, "cuatrimestre_id": cuatrimestre_id, "version": version, "creado": ahora}
+        for t in sorted(_PREVIEWS, key=lambda t: _PREVIEWS[t]["creado"])[:max(0, len(_PREVIEWS) - PREVIEWS_RETENIDOS)]:
+            del _PREVIEWS[t]
+
 # ===== v15.0: Preview horarios import =====
 @app.post("/api/importar/horarios-preview")
 async def horarios_preview(file: UploadFile = File(...), cuatrimestre_id: int = 1, db: Session = Depends(get_db)):
+    token = f"{hash_upload(file)[:32]}-{cuatrimestre_id}"
     try:
-        content = await file.read()
-        results, no_cat, doc_to_create = _parse_horarios_excel(content, db, cuatrimestre_id)
+        with _PREVIEWS_LOCK:
+            previo, _ = _preview_vigente(token, cuatrimestre_id)
+        if previo:  # mismo archivo y mismos datos: se reusa el parseo
+            parseo = previo["parseo"]
+        else:
+            version = data_version(cuatrimestre_id)  # antes de parsear: un cambio durante el parseo invalida el token
+            parseo = _parse_horarios_excel(abrir_excel(file), db, cuatrimestre_id)
+            guardar_preview(token, parseo, cuatrimestre_id, version)
+        results, no_cat, doc_to_create = parseo
         current_count = db.query(Asignacion).filter(Asignacion.cuatrimestre_id == cuatrimestre_id).count()
         con_doc = len([r for r in results if r['docente_id']])
         sin_doc = len([r for r in results if not r['docente_id'] and not r['doc_raw']])
         doc_new = len([r for r in results if not r['docente_id'] and r['doc_raw']])
         con_meet = len([r for r in results if r.get('meet_link')])
         return {
+            "token": token, "token_expira_s": PREVIEW_TTL_S,
             "asignaciones_actuales_a_borrar": current_count,
             "asignaciones_nuevas": len(results),
             "con_docente_existente": con_doc,
@@ -1873,10 +2583,13 @@ async def horarios_preview(file: UploadFile = File(...), cuatrimestre_id: int =
             "docentes_a_crear": [], "catedras_no_encontradas": [], "preview": []}
 
 # ===== v15.0: Apply horarios import (after preview) =====
-@app.post("/api/importar/horarios-aplicar")
-async def horarios_aplicar(file: UploadFile = File(...), cuatrimestre_id: int = 1, db: Session = Depends(get_db)):
-    content = await file.read()
-    results, no_cat, doc_to_create = _parse_horarios_excel(content, db, cuatrimestre_id)
+def _aplicar_horarios(wb, cuatrimestre_id, db, job=None):
+    return _aplicar_parseo_horarios(_parse_horarios_excel(wb, db, cuatrimestre_id), cuatrimestre_id, db, job)
+
+def _aplicar_parseo_horarios(parseo, cuatrimestre_id, db, job=None):
+    """Reemplaza las asignaciones del cuatrimestre. Una sola transacción también en background:
+    confirmar por lotes dejaría el cuatrimestre con un horario a medias."""
+    results, no_cat, doc_to_create = parseo
     # 1) Create missing docentes
     nuevos_docs = 0
     doc_created_map = {}
@@ -1915,6 +2628,7 @@ async def horarios_aplicar(file: UploadFile = File(...), cuatrimestre_id: int =
             sede_id=r['sede_id'], modalidad=r['modalidad'])
         db.add(asig)
         creados += 1
+        if job is not None: job["filas"] += 1
         # v16.0: Update meet link on cátedra if provided
         if r.get('meet_link'):
             try:
@@ -1927,6 +2641,7 @@ async def horarios_aplicar(file: UploadFile = File(...), cuatrimestre_id: int =
     except Exception as e:
         db.rollback()
         return {"error": f"Error guardando: {str(e)[:200]}"}
+    bump_data_version()  # también crea docentes y actualiza links de cátedras
     return {
         "asignaciones_borradas": deleted,
         "asignaciones_creadas": creados,
@@ -1936,6 +2651,101 @@ async def horarios_aplicar(file: UploadFile = File(...), cuatrimestre_id: int =
         "catedras_no_encontradas": no_cat[:20],
     }
 
+@app.post("/api/importar/horarios-aplicar")
+async def horarios_aplicar(file: UploadFile = File(None), token: str = None, cuatrimestre_id: int = 1, db: Session = Depends(get_db)):
+    """Con token de horarios-preview aplica el parseo guardado; sin token, parsea el archivo subido."""
+    if not token:
+        if file is None: raise HTTPException(status_code=400, detail="Falta el archivo o el token del preview")
+        return _aplicar_horarios(abrir_excel(file), cuatrimestre_id, db)
+    with _PREVIEWS_LOCK:  # se consume: dos aplicar con el mismo token no duplican el horario
+        previo, error = _preview_vigente(token, cuatrimestre_id)
+        if previo: del _PREVIEWS[token]
+    if not previo: raise error
+    resultado = _aplicar_parseo_horarios(previo["parseo"], cuatrimestre_id, db)
+    if resultado.get("error"):  # rollback: el preview sigue siendo válido para reintentar
+        with _PREVIEWS_LOCK: _PREVIEWS.setdefault(token, previo)
+    return resultado
+
+
+# ==================== JOBS DE IMPORTACIÓN ====================
+# Los imports grandes se encolan: el archivo se copia a disco, la request devuelve un job_id y un pool
+# de threads corre el importador con su propia sesión. El estado vive en memoria del worker.
+IMPORT_WORKERS = int(os.environ.get("IMPORT_WORKERS", "2"))
+JOBS_RETENIDOS = 100  # trabajos terminados que se conservan para consulta
+_JOBS = {}
+_JOBS_LOCK = threading.Lock()
+_JOBS_POOL = ThreadPoolExecutor(max_workers=IMPORT_WORKERS, thread_name_prefix="import")
+
+def _con_libro(ruta, fn, titulo="Hoja1"):
+    wb = abrir_planilla(ruta, titulo)
+    try:
+        return fn(wb)
+    finally:
+        wb.close()
+
+IMPORTADORES_JOB = {
+    "alumnos": lambda ruta, cuat, db, job: _importar_alumnos(parsear_hojas(ruta, parsear_hoja_alumnos), cuat, db, job),
+    "alumnos-bce-bea": lambda ruta, cuat, db, job: _importar_alumnos_bce_bea(parsear_hojas(ruta, parsear_hoja_bce_bea), cuat, db, job),
+    "plan-carrera": lambda ruta, cuat, db, job: _con_libro(ruta, lambda wb: _importar_plan_carrera(wb, db, job), job["titulo"]),
+    "horarios-aplicar": lambda ruta, cuat, db, job: _con_libro(ruta, lambda wb: _aplicar_horarios(wb, cuat, db, job), job["titulo"]),
+}
+
+def _ejecutar_job(job, ruta):
+    job.update(estado="procesando", iniciado=time.time())
+    db = SessionLocal()
+    try:
+        resultado = IMPORTADORES_JOB[job["tipo"]](ruta, job["cuatrimestre_id"], db, job)
+        if isinstance(resultado, dict) and resultado.get("error"):
+            job["errores"].append(resultado["error"]); job["estado"] = "error"
+        else:
+            job["estado"] = "terminado"
+        job["resultado"] = resultado
+    except Exception as e:
+        db.rollback()
+        job["errores"].append((e.detail if isinstance(e, HTTPException) else str(e))[:300]); job["estado"] = "error"
+        if job["tipo"] == "alumnos":  # hubo lotes confirmados: dejar el rollup y los caches consistentes
+            try:
+                refrescar_rollup(db, job["cuatrimestre_id"]); db.commit()
+                bump_data_version(job["cuatrimestre_id"])
+            except Exception:
+                db.rollback()
+    finally:
+        job["terminado"] = time.time()
+        db.close()
+        try: os.remove(ruta)
+        except OSError: pass
+
+def _estado_job(job):
+    fin = job["terminado"] or time.time()
+    dur = fin - job["iniciado"] if job["iniciado"] else 0
+    return dict(job, duracion_s=round(dur, 2), filas_por_segundo=round(job["filas"] / dur, 1) if dur > 0 else 0)
+
+@app.post("/api/jobs/importar/{tipo}")
+async def crear_job_importacion(tipo: str, file: UploadFile = File(...), cuatrimestre_id: int = 1):
+    if tipo not in IMPORTADORES_JOB:
+        raise HTTPException(status_code=404, detail=f"Tipo de importación desconocido: {tipo}")
+    ruta = copiar_upload(file)
+    job = {"id": uuid.uuid4().hex[:12], "tipo": tipo, "cuatrimestre_id": cuatrimestre_id, "archivo": file.filename,
+        "titulo": titulo_upload(file), "estado": "pendiente", "creado": time.time(), "iniciado": None, "terminado": None,
+        "filas": 0, "errores": [], "resultado": None}
+    with _JOBS_LOCK:
+        terminados = sorted((j for j in _JOBS.values() if j["terminado"]), key=lambda j: j["terminado"])
+        for viejo in terminados[:max(0, len(terminados) - JOBS_RETENIDOS)]:
+            del _JOBS[viejo["id"]]
+        _JOBS[job["id"]] = job
+    _JOBS_POOL.submit(_ejecutar_job, job, ruta)
+    return {"job_id": job["id"], "estado": job["estado"]}
+
+@app.get("/api/jobs/{job_id}")
+def get_job(job_id: str):
+    job = _JOBS.get(job_id)
+    if not job: raise HTTPException(status_code=404, detail="Job no encontrado")
+    return _estado_job(job)
+
+@app.get("/api/jobs")
+def listar_jobs():
+    return sorted((_estado_job(j) for j in list(_JOBS.values())), key=lambda j: -j["creado"])
+
 # ===== v13.0: Sugerencias de horarios cruzando plan + inscriptos =====
 @app.get("/api/plan-carrera/sugerencias")
 def get_sugerencias_plan(cuatrimestre_id: int = None, sede: str = None, db: Session = Depends(get_db)):
@@ -1950,17 +2760,9 @@ def get_sugerencias_plan(cuatrimestre_id: int = None, sede: str = None, db: Sess
     except: return {"sedes": [], "plan_importado": False}
     if not rows: return {"sedes": [], "plan_importado": False}
     # Get inscriptos totales
-    total_q = "SELECT catedra_id, COUNT(*) FROM inscripciones"
-    if cuatrimestre_id: total_q += f" WHERE cuatrimestre_id = {cuatrimestre_id}"
-    total_q += " GROUP BY catedra_id"
-    total_map = {}
-    try:
-        for r in db.execute(text(total_q)).fetchall(): total_map[r[0]] = r[1]
-    except: pass
+    total_map = {cid: d['total'] for cid, d in desglose_inscripciones(db, cuatrimestre_id).items()}
     # Get catedra code → id mapping
-    cat_map = {}
-    for c in db.query(Catedra).all():
-        cat_map[c.codigo] = {"id": c.id, "nombre": c.nombre}
+    cat_map = {c.codigo: {"id": c.id, "nombre": c.nombre} for c in referencias(db).catedras.values()}
     # Get current asignaciones
     asig_q = db.query(Asignacion)
     if cuatrimestre_id: asig_q = asig_q.filter(Asignacion.cuatrimestre_id == cuatrimestre_id)
@@ -2048,6 +2850,7 @@ CARRERA_NORMALIZE = {
     'TURISMO': 'TECNICO SUPERIOR EN TURISMO',
 }
 
+@lru_cache(maxsize=8192)
 def _extract_carrera(curso):
     import re
     c = curso.upper().strip()
@@ -2074,8 +2877,7 @@ def _calc_anno(fecha_str, inicio_str):
 async def control_inscripciones(file: UploadFile = File(...), cuatrimestre_id: int = 1, db: Session = Depends(get_db)):
     from openpyxl import load_workbook
     import io, re
-    content = await file.read()
-    wb = load_workbook(io.BytesIO(content))
+    wb = abrir_excel(file)
     # 1) Build plan: (sede, carrera_upper) → {anno → set of codes}
     from sqlalchemy import text
     plan = {}; cat_names_db = {}
@@ -2089,7 +2891,7 @@ async def control_inscripciones(file: UploadFile = File(...), cuatrimestre_id: i
             plan[key][r[2]].add(r[3])
             cat_names_db[r[3]] = (r[4] or '')[:30]
     except: pass
-    for c in db.query(Catedra).all():
+    for c in referencias(db).catedras.values():
         cat_names_db[c.codigo] = c.nombre[:30]
     # 2) Build inscripcion lookup: DNI → set of codigos inscritos
     insc_q = db.query(Inscripcion)
@@ -2204,8 +3006,8 @@ async def control_inscripciones(file: UploadFile = File(...), cuatrimestre_id: i
             })
     wb.close()
     results.sort(key=lambda x: (0 if x['estado']=='CORRECTO' else 1 if x['estado']=='MATERIAS_EXTRA' else 2 if x['estado'].startswith('FALTAN') else 3, x['nombre']))
-    return {"results": results, "stats": stats, "total_results": len(results),
-        "_debug": {"plan_carreras": len(plan), "inscripciones_db": len(all_insc), "dnis_con_inscripciones": len(dni_to_codes), "cuatrimestre_id": cuatrimestre_id}}
+    return JSONRapida({"results": results, "stats": stats, "total_results": len(results),
+        "_debug": {"plan_carreras": len(plan), "inscripciones_db": len(all_insc), "dnis_con_inscripciones": len(dni_to_codes), "cuatrimestre_id": cuatrimestre_id}})
 
 
 @app.post("/api/control-inscripciones/exportar")
@@ -2215,8 +3017,7 @@ async def control_inscripciones_exportar(file: UploadFile = File(...), cuatrimes
     from starlette.responses import Response
     import io, re, math
     from sqlalchemy import text
-    content = await file.read()
-    wb_in = load_workbook(io.BytesIO(content))
+    wb_in = abrir_excel(file)
     # Same logic as control_inscripciones
     plan = {}; cat_names_db = {}
     try:
@@ -2228,7 +3029,7 @@ async def control_inscripciones_exportar(file: UploadFile = File(...), cuatrimes
             plan[key][r[2]].add(r[3])
             cat_names_db[r[3]] = (r[4] or '')[:30]
     except: pass
-    for c in db.query(Catedra).all(): cat_names_db[c.codigo] = c.nombre[:30]
+    for c in referencias(db).catedras.values(): cat_names_db[c.codigo] = c.nombre[:30]
     insc_q = db.query(Inscripcion)
     if cuatrimestre_id and cuatrimestre_id > 0: insc_q = insc_q.filter(Inscripcion.cuatrimestre_id == cuatrimestre_id)
     dni_to_codes = {}
@@ -2318,6 +3119,57 @@ async def control_inscripciones_exportar(file: UploadFile = File(...), cuatrimes
         headers={'Content-Disposition': 'attachment; filename=control_inscripciones.xlsx'})
 
 
+# ===== v17.0: Índice código de cátedra → docentes candidatos =====
+# Se arma una vez por cuatrimestre y versión de datos; se invalida solo cuando cambian
+# catedras_referencia, disponibilidad o asignaciones (ver bump_data_version).
+_CANDIDATOS_CACHE = {}  # cuatrimestre_id → (version, indice)
+_CANDIDATOS_LOCK = threading.Lock()
+
+def _construir_indice_candidatos(db, cuatrimestre_id):
+    from sqlalchemy import text
+    # Disponibilidad y ocupación como bitmask de la grilla SLOTS por docente
+    disp_mask = disponibilidad_masks(db, cuatrimestre_id)
+    busy_q = db.query(Asignacion.docente_id, Asignacion.dia, Asignacion.hora_inicio).filter(
+        Asignacion.docente_id.isnot(None), Asignacion.dia.isnot(None), Asignacion.hora_inicio.isnot(None))
+    if cuatrimestre_id: busy_q = busy_q.filter(Asignacion.cuatrimestre_id == cuatrimestre_id)
+    busy_mask = {}
+    for did, dia, hora in busy_q.all():
+        busy_mask[did] = busy_mask.get(did, 0) | slot_mask(dia, hora)
+    try:
+        docs = db.execute(text("SELECT id, nombre, apellido, catedras_referencia FROM docentes")).fetchall()
+    except Exception:
+        db.rollback()
+        docs = [(d.id, d.nombre, d.apellido, None) for d in db.query(Docente).all()]
+    por_codigo = {}; docentes = {}
+    for did, nombre, apellido, refs in docs:
+        free = disp_mask.get(did, 0) & ~busy_mask.get(did, 0)  # Disponible y no asignado
+        if not free: continue  # Sin slots libres nunca es candidato
+        slots = []; m = free
+        while m and len(slots) < 3:
+            low = m & -m; slots.append(SLOTS[low.bit_length() - 1]); m ^= low
+        docentes[did] = {"id": did, "nombre": f"{nombre} {apellido}", "free_mask": free,
+            "free": bin(free).count('1'), "slots": slots}
+        for cod in {r.strip() for r in (refs or '').split(',') if r.strip()}:
+            if cod not in por_codigo: por_codigo[cod] = []
+            por_codigo[cod].append(did)
+    return {"por_codigo": por_codigo, "docentes": docentes, "slots": SLOTS}
+
+def indice_candidatos(db, cuatrimestre_id=None):
+    version = data_version(cuatrimestre_id)
+    cached = _CANDIDATOS_CACHE.get(cuatrimestre_id)
+    if cached and cached[0] == version: return cached[1]
+    indice = _construir_indice_candidatos(db, cuatrimestre_id)
+    with _CANDIDATOS_LOCK:
+        _CANDIDATOS_CACHE[cuatrimestre_id] = (version, indice)
+    return indice
+
+def top_candidatos(indice, codigo, k=3):
+    """Top-k docentes con la cátedra como referencia y slots libres: más slots libres primero, luego id."""
+    import heapq
+    docentes = indice["docentes"]
+    ids = indice["por_codigo"].get(codigo, [])
+    return [docentes[did] for did in heapq.nsmallest(k, ids, key=lambda did: (-docentes[did]["free"], did))]
+
 # ===== v16.0: Motor de sugerencias de armado de horarios =====
 @app.get("/api/sugerencias-armado")
 def get_sugerencias_armado(cuatrimestre_id: int = None, sede: str = None, db: Session = Depends(get_db)):
@@ -2330,21 +3182,14 @@ def get_sugerencias_armado(cuatrimestre_id: int = None, sede: str = None, db: Se
     except: return {"sedes": {}, "stats": {}}
     if not plan: return {"sedes": {}, "stats": {}}
     # 2) Get inscriptos count
-    total_q = "SELECT catedra_id, COUNT(*) FROM inscripciones"
-    if cuatrimestre_id: total_q += f" WHERE cuatrimestre_id = {cuatrimestre_id}"
-    total_q += " GROUP BY catedra_id"
-    total_map = {}
-    try:
-        for r in db.execute(text(total_q)).fetchall(): total_map[r[0]] = r[1]
-    except: pass
+    total_map = {cid: d['total'] for cid, d in desglose_inscripciones(db, cuatrimestre_id).items()}
     # 3) Catedra map
-    cat_map = {c.codigo: {"id": c.id, "nombre": c.nombre} for c in db.query(Catedra).all()}
+    cat_map = {c.codigo: {"id": c.id, "nombre": c.nombre} for c in referencias(db).catedras.values()}
     # 4) Current asignaciones
-    asig_q = db.query(Asignacion)
+    asig_q = db.query(Asignacion).options(joinedload(Asignacion.docente), joinedload(Asignacion.sede))
     if cuatrimestre_id: asig_q = asig_q.filter(Asignacion.cuatrimestre_id == cuatrimestre_id)
     asigs = asig_q.all()
     asig_map = {}  # catedra_id → [{docente, dia, hora, sede}]
-    docente_busy = {}  # docente_id → set of (dia, hora)
     for a in asigs:
         if a.catedra_id not in asig_map: asig_map[a.catedra_id] = []
         asig_map[a.catedra_id].append({
@@ -2353,30 +3198,8 @@ def get_sugerencias_armado(cuatrimestre_id: int = None, sede: str = None, db: Se
             "dia": a.dia, "hora": a.hora_inicio,
             "sede": a.sede.nombre if a.sede else None,
         })
-        if a.docente_id and a.dia and a.hora_inicio:
-            if a.docente_id not in docente_busy: docente_busy[a.docente_id] = set()
-            docente_busy[a.docente_id].add((a.dia, a.hora_inicio))
-    # 5) Docentes with availability and references
-    docentes = db.query(Docente).all()
-    disp_map = {}
-    try:
-        for r in db.execute(text("SELECT docente_id, dia, hora FROM docente_disponibilidad WHERE disponible = TRUE")).fetchall():
-            if r[0] not in disp_map: disp_map[r[0]] = set()
-            disp_map[r[0]].add((r[1], r[2]))
-    except: pass
-    # Build docente lookup for suggestions
-    doc_info = {}
-    for d in docentes:
-        refs = (getattr(d, 'catedras_referencia', '') or '').strip()
-        ref_codes = [r.strip() for r in refs.split(',') if r.strip()] if refs else []
-        avail = disp_map.get(d.id, set())
-        busy = docente_busy.get(d.id, set())
-        free = avail - busy  # Available and not already assigned
-        doc_info[d.id] = {
-            "id": d.id, "nombre": f"{d.nombre} {d.apellido}",
-            "ref_codes": ref_codes, "free_slots": free,
-            "sedes": [ds.sede.nombre for ds in (d.sedes or []) if ds.sede],
-        }
+    # 5) Docentes with availability and references (índice cacheado por versión de datos)
+    indice = indice_candidatos(db, cuatrimestre_id)
     # 6) Build result per sede → carrera → anno → catedras with suggestions
     sedes_result = {}
     stats = {"total": 0, "con_docente": 0, "sugerido": 0, "sin_sugerencia": 0, "asincronica": 0}
@@ -2393,23 +3216,13 @@ def get_sugerencias_armado(cuatrimestre_id: int = None, sede: str = None, db: Se
         horarios_actuales = [f"{a['dia']} {a['hora']}" for a in current_asigs if a['dia']] if current_asigs else []
         # Determine status and suggestion
         estado = "asignado"  # green
-        sugerencia_docente = None
+        sugerencia_docente = None; candidatos = []
         if criterio == "ABRIR" and tiene_docente:
             estado = "asignado"
             stats["con_docente"] += 1
         elif criterio == "ABRIR" and not tiene_docente:
-            # Find suggestion
-            candidatos = []
-            for did, dinfo in doc_info.items():
-                # Check if docente has this cátedra as reference
-                if cod in dinfo["ref_codes"]:
-                    # Has free slots → valid candidate
-                    if dinfo["free_slots"]:
-                        score = 10
-                        candidatos.append({"id": did, "nombre": dinfo["nombre"], "score": score,
-                            "free": len(dinfo["free_slots"]), "slots": list(dinfo["free_slots"])[:3]})
-                # If no ref_codes at all, NOT a candidate (we only suggest docentes who can teach this)
-            candidatos.sort(key=lambda x: -x["score"])
+            # Find suggestion: solo docentes con esta cátedra de referencia y slots libres
+            candidatos = top_candidatos(indice, cod)
             if candidatos:
                 estado = "sugerido"  # blue
                 sugerencia_docente = candidatos[0]["nombre"]
@@ -2430,6 +3243,7 @@ def get_sugerencias_armado(cuatrimestre_id: int = None, sede: str = None, db: Se
             "codigo": cod, "nombre": nombre_plan, "inscriptos": insc, "criterio": criterio,
             "estado": estado, "docente_actual": docente_actual, "sugerencia_docente": sugerencia_docente,
             "horarios": horarios_actuales,
+            "candidatos": [c["nombre"] for c in candidatos],
         })
     return {"sedes": sedes_result, "stats": stats}
 
@@ -2448,10 +3262,13 @@ def get_solapamientos_carreras(cuatrimestre_id: int = None, db: Session = Depend
         if key not in carrera_cats: carrera_cats[key] = []
         if r[3] not in carrera_cats[key]: carrera_cats[key].append(r[3])
     # 2) Get asignaciones
-    asig_q = db.query(Asignacion).filter(Asignacion.dia.isnot(None), Asignacion.hora_inicio.isnot(None))
+    asig_q = db.query(Asignacion).options(joinedload(Asignacion.catedra), joinedload(Asignacion.sede), joinedload(Asignacion.docente))
+    asig_q = asig_q.filter(Asignacion.dia.isnot(None), Asignacion.hora_inicio.isnot(None))
     if cuatrimestre_id: asig_q = asig_q.filter(Asignacion.cuatrimestre_id == cuatrimestre_id)
     asigs = asig_q.all()
-    # Build: code → {sede_name → set of (dia, hora)} and code → all slots
+    # Build: code → {sede_name → bitmask de slots} and code → bitmask de todos sus slots
+    # Cada (dia, hora) distinto es un bit; intersecciones y comparaciones son operaciones sobre ints.
+    slot_index = {}; slot_list = []
     code_sede_slots = {}; code_all_slots = {}; code_names = {}; code_docentes = {}
     docente_schedule = {}
     for a in asigs:
@@ -2461,11 +3278,12 @@ def get_solapamientos_carreras(cuatrimestre_id: int = None, db: Session = Depend
         doc_name = f"{a.docente.nombre} {a.docente.apellido}" if a.docente else None
         code_names[cod] = a.catedra.nombre
         slot = (a.dia, a.hora_inicio)
+        if slot not in slot_index:
+            slot_index[slot] = len(slot_list); slot_list.append(slot)
+        bit = 1 << slot_index[slot]
         if cod not in code_sede_slots: code_sede_slots[cod] = {}
-        if sede_n not in code_sede_slots[cod]: code_sede_slots[cod][sede_n] = set()
-        code_sede_slots[cod][sede_n].add(slot)
-        if cod not in code_all_slots: code_all_slots[cod] = set()
-        code_all_slots[cod].add(slot)
+        code_sede_slots[cod][sede_n] = code_sede_slots[cod].get(sede_n, 0) | bit
+        code_all_slots[cod] = code_all_slots.get(cod, 0) | bit
         # Track docente per (cod, dia, hora)
         if doc_name:
             if cod not in code_docentes: code_docentes[cod] = {}
@@ -2476,44 +3294,56 @@ def get_solapamientos_carreras(cuatrimestre_id: int = None, db: Session = Depend
     # Helper to get docente for a (cod, dia, hora)
     def get_doc(cod, dia, hora):
         return (code_docentes.get(cod) or {}).get((dia, hora))
+    def bits(mask):
+        while mask:
+            low = mask & -mask
+            yield low.bit_length() - 1
+            mask ^= low
+    def conflicto(sede_p, carrera, anno, cod_a, cod_b, dia, hora, tipo):
+        return {"sede_plan": sede_p, "carrera": carrera, "anno": anno,
+            "dia": dia, "hora": hora,
+            "catedras_en_conflicto": [
+                {"codigo": cod_a, "nombre": code_names.get(cod_a,''), "docente": get_doc(cod_a, dia, hora)},
+                {"codigo": cod_b, "nombre": code_names.get(cod_b,''), "docente": get_doc(cod_b, dia, hora)}],
+            "tipo": tipo}
     # === TIPO 1: PRESENCIALES (por sede) ===
+    # Índice invertido slot → cátedras: solo se enumeran los pares que efectivamente comparten un bit.
     conf_presencial = []
     for (sede_p, carrera, anno), codigos in carrera_cats.items():
         if not anno or sede_p.upper() == 'CIED': continue
-        cat_slots = {}
+        sede_pref = sede_p.upper().replace(' ','')[:4]
+        por_slot = {}
         for cod in codigos:
-            for s_name, slots in (code_sede_slots.get(cod) or {}).items():
-                if s_name.upper().replace(' ','')[:4] == sede_p.upper().replace(' ','')[:4]:
-                    if cod not in cat_slots: cat_slots[cod] = set()
-                    cat_slots[cod].update(slots)
-        cods = list(cat_slots.keys())
-        for i in range(len(cods)):
-            for j in range(i+1, len(cods)):
-                overlap = cat_slots[cods[i]] & cat_slots[cods[j]]
-                for (dia, hora) in overlap:
-                    conf_presencial.append({"sede_plan": sede_p, "carrera": carrera, "anno": anno,
-                        "dia": dia, "hora": hora,
-                        "catedras_en_conflicto": [
-                            {"codigo": cods[i], "nombre": code_names.get(cods[i],''), "docente": get_doc(cods[i], dia, hora)},
-                            {"codigo": cods[j], "nombre": code_names.get(cods[j],''), "docente": get_doc(cods[j], dia, hora)}],
-                        "tipo": "presencial"})
+            mask = 0
+            for s_name, s_mask in (code_sede_slots.get(cod) or {}).items():
+                if s_name.upper().replace(' ','')[:4] == sede_pref: mask |= s_mask
+            for b in bits(mask):
+                if b not in por_slot: por_slot[b] = []
+                por_slot[b].append(cod)
+        for b, cods in por_slot.items():
+            if len(cods) < 2: continue
+            dia, hora = slot_list[b]
+            for i in range(len(cods)):
+                for j in range(i+1, len(cods)):
+                    conf_presencial.append(conflicto(sede_p, carrera, anno, cods[i], cods[j], dia, hora, "presencial"))
     # === TIPO 1b: CIED (conflicto solo si NO hay combinación posible) ===
+    # Con al menos dos slots distintos entre ambas cátedras siempre hay combinación que evita el choque,
+    # así que solo chocan las que tienen exactamente el mismo slot único (mismo mask con un solo bit).
     conf_cied = []
     for (sede_p, carrera, anno), codigos in carrera_cats.items():
         if not anno or sede_p.upper() != 'CIED': continue
-        cat_slots = {cod: code_all_slots.get(cod, set()) for cod in codigos if code_all_slots.get(cod)}
-        cods = list(cat_slots.keys())
-        for i in range(len(cods)):
-            for j in range(i+1, len(cods)):
-                can_avoid = any(sa != sb for sa in cat_slots[cods[i]] for sb in cat_slots[cods[j]])
-                if not can_avoid and cat_slots[cods[i]] & cat_slots[cods[j]]:
-                    dia, hora = list(cat_slots[cods[i]] & cat_slots[cods[j]])[0]
-                    conf_cied.append({"sede_plan": "CIED", "carrera": carrera, "anno": anno,
-                        "dia": dia, "hora": hora,
-                        "catedras_en_conflicto": [
-                            {"codigo": cods[i], "nombre": code_names.get(cods[i],''), "docente": get_doc(cods[i], dia, hora)},
-                            {"codigo": cods[j], "nombre": code_names.get(cods[j],''), "docente": get_doc(cods[j], dia, hora)}],
-                        "tipo": "cied"})
+        por_mask = {}
+        for cod in codigos:
+            mask = code_all_slots.get(cod, 0)
+            if not mask or mask & (mask - 1): continue
+            if mask not in por_mask: por_mask[mask] = []
+            por_mask[mask].append(cod)
+        for mask, cods in por_mask.items():
+            if len(cods) < 2: continue
+            dia, hora = slot_list[mask.bit_length() - 1]
+            for i in range(len(cods)):
+                for j in range(i+1, len(cods)):
+                    conf_cied.append(conflicto("CIED", carrera, anno, cods[i], cods[j], dia, hora, "cied"))
     # === TIPO 2: DOCENTES (mismo docente, distinta cátedra, mismo dia+hora) ===
     conf_docentes = []
     for doc_name, schedule in docente_schedule.items():
@@ -2545,35 +3375,9 @@ def exportar_horarios(cuatrimestre_id: int = None, db: Session = Depends(get_db)
     q = db.query(Asignacion)
     if cuatrimestre_id: q = q.filter(Asignacion.cuatrimestre_id == cuatrimestre_id)
     asigs = sorted(q.all(), key=lambda a: sort_key_codigo(a.catedra.codigo if a.catedra else 'c.9999'))
-    # -- Inscriptos desglosados --
-    insc_q = """SELECT catedra_id, turno, modalidad_alumno, sede_referencia, COUNT(*) FROM inscripciones WHERE modalidad_alumno IS NOT NULL"""
-    if cuatrimestre_id: insc_q += f" AND cuatrimestre_id = {cuatrimestre_id}"
-    insc_q += " GROUP BY catedra_id, turno, modalidad_alumno, sede_referencia"
-    insc_desg = {}
-    try:
-        for r in db.execute(text(insc_q)).fetchall():
-            cid, turno, mod, sede, cnt = r
-            if cid not in insc_desg:
-                insc_desg[cid] = {'total':0,'tm_av':0,'tm_cab':0,'tm_vl':0,'tm_cied':0,'tn_av':0,'tn_cab':0,'tn_vl':0,'tn_cied':0,'virt':0}
-            d = insc_desg[cid]; d['total'] += cnt
-            es_cied = (mod == 'virtual')
-            sk = None
-            if not es_cied:
-                sl = (sede or '').lower()
-                if 'avellaneda' in sl: sk = 'av'
-                elif 'caballito' in sl: sk = 'cab'
-                elif 'vicente' in sl: sk = 'vl'
-            if turno == 'Mañana': d[f'tm_{sk}' if sk else 'tm_cied'] += cnt
-            elif turno == 'Noche': d[f'tn_{sk}' if sk else 'tn_cied'] += cnt
-            else: d['virt'] += cnt
-    except: pass
-    total_insc_q = "SELECT catedra_id, COUNT(*) FROM inscripciones"
-    if cuatrimestre_id: total_insc_q += f" WHERE cuatrimestre_id = {cuatrimestre_id}"
-    total_insc_q += " GROUP BY catedra_id"
-    total_insc_map = {}
-    try:
-        for r in db.execute(text(total_insc_q)).fetchall(): total_insc_map[r[0]] = r[1]
-    except: pass
+    # -- Inscriptos desglosados (cache por cuatrimestre) --
+    insc_desg = desglose_inscripciones(db, cuatrimestre_id)
+    total_insc_map = {cid: d['total'] for cid, d in insc_desg.items()}
     hf = Font(bold=True, color="FFFFFF", size=10)
     YELLOW = PatternFill("solid", fgColor="FFFFCC")
     def make_hdr(ws, headers, color='1D6F42'):
@@ -2592,13 +3396,13 @@ def exportar_horarios(cuatrimestre_id: int = None, db: Session = Depends(get_db)
         s_av = d.get('tm_av',0)+d.get('tn_av',0)
         s_cab = d.get('tm_cab',0)+d.get('tn_cab',0)
         s_vl = d.get('tm_vl',0)+d.get('tn_vl',0)
-        s_cied = d.get('tm_cied',0)+d.get('tn_cied',0)+d.get('virt',0)
+        s_cied = d.get('tm_cied',0)+d.get('tn_cied',0)+d.get('virt_cied',0)
         tot = total_insc_map.get(cat.id, 0)
         if tot == 0 and d.get('total',0) == 0: continue
         ws0.append([i, cat.codigo, cat.nombre,
             d.get('tm_av',0) or '', d.get('tm_cab',0) or '', d.get('tm_vl',0) or '', d.get('tm_cied',0) or '', tm_t or '',
             d.get('tn_av',0) or '', d.get('tn_cab',0) or '', d.get('tn_vl',0) or '', d.get('tn_cied',0) or '', tn_t or '',
-            d.get('virt',0) or '', s_av or '', s_cab or '', s_vl or '', s_cied or '', tot or ''])
+            d.get('virt_cied',0) or '', s_av or '', s_cab or '', s_vl or '', s_cied or '', tot or ''])
         if tot >= 10:
             tiene = any(1 for a in asigs if a.catedra_id == cat.id)
             if not tiene:
@@ -2621,7 +3425,7 @@ def exportar_horarios(cuatrimestre_id: int = None, db: Session = Depends(get_db)
         ws1.append([i, a.catedra.codigo if a.catedra else "", a.catedra.nombre if a.catedra else "",
             d.get('tm_av',0) or '', d.get('tm_cab',0) or '', d.get('tm_vl',0) or '', d.get('tm_cied',0) or '', tm_t or '',
             d.get('tn_av',0) or '', d.get('tn_cab',0) or '', d.get('tn_vl',0) or '', d.get('tn_cied',0) or '', tn_t or '',
-            d.get('virt',0) or '', tot or '',
+            d.get('virt_cied',0) or '', tot or '',
             f"{a.docente.nombre} {a.docente.apellido}" if a.docente else "Sin asignar", td,
             mod, a.dia or "Pend.", a.hora_inicio or "Pend.", a.sede.nombre if a.sede else "Remoto"])
         if tot >= 10 and not a.docente_id:
@@ -2637,7 +3441,7 @@ def exportar_horarios(cuatrimestre_id: int = None, db: Session = Depends(get_db)
             sede_asigs = [a for a in asigs if not a.sede_id or (a.modalidad and ('virtual' in a.modalidad or a.modalidad == 'asincronica'))]
         else:
             ws.append(["#","Código","Cátedra",f"TM {sede_name}",f"TN {sede_name}","TOTAL","Docente","Turno","Día","Hora"])
-            sede_db = db.query(Sede).filter(Sede.nombre == sede_name).first()
+            sede_db = referencias(db).sede_por_nombre.get(sede_name)
             sede_asigs = [a for a in asigs if a.sede_id == (sede_db.id if sede_db else -1)]
         for cell in ws[1]:
             cell.font = hf; cell.fill = PatternFill("solid", fgColor=color); cell.alignment = Alignment(horizontal="center")
@@ -2646,7 +3450,7 @@ def exportar_horarios(cuatrimestre_id: int = None, db: Session = Depends(get_db)
             mod = a.modalidad or ''
             td = 'Mañana' if 'tm' in mod else ('Noche' if 'tn' in mod else 'Otro')
             if sede_key == 'cied':
-                tm_v=d.get('tm_cied',0); tn_v=d.get('tn_cied',0); vv=d.get('virt',0)
+                tm_v=d.get('tm_cied',0); tn_v=d.get('tn_cied',0); vv=d.get('virt_cied',0)
                 ws.append([i, a.catedra.codigo if a.catedra else "", a.catedra.nombre if a.catedra else "",
                     tm_v or '', tn_v or '', vv or '', (tm_v+tn_v+vv) or '',
                     f"{a.docente.nombre} {a.docente.apellido}" if a.docente else "Sin asignar", td, a.dia or "Pend.", a.hora_inicio or "Pend."])
@@ -2730,19 +3534,18 @@ def exportar_horarios(cuatrimestre_id: int = None, db: Session = Depends(get_db)
     ws_cur.append(["#","Curso","Sede","Modalidad","Tipo","Alumnos (DNI)","Inscripciones"])
     for cell in ws_cur[1]:
         cell.font = hf; cell.fill = PatternFill("solid", fgColor="6B21A8"); cell.alignment = Alignment(horizontal="center")
-    c_q = """SELECT curso_nombre, COUNT(DISTINCT alumno_id), COUNT(*) FROM inscripciones WHERE curso_nombre IS NOT NULL AND curso_nombre != ''"""
-    if cuatrimestre_id: c_q += f" AND cuatrimestre_id = {cuatrimestre_id}"
-    c_q += " GROUP BY curso_nombre ORDER BY COUNT(*) DESC"
+    c_q = """SELECT i.curso_nombre, COUNT(DISTINCT i.alumno_id), COUNT(*), cc.sede, cc.modalidad, cc.tipo_curso
+        FROM inscripciones i LEFT JOIN curso_clasificado cc ON cc.curso_nombre = i.curso_nombre
+        WHERE i.curso_nombre IS NOT NULL AND i.curso_nombre != ''"""
+    if cuatrimestre_id: c_q += f" AND i.cuatrimestre_id = {cuatrimestre_id}"
+    c_q += " GROUP BY i.curso_nombre, cc.sede, cc.modalidad, cc.tipo_curso ORDER BY COUNT(*) DESC"
     try:
         for i, r in enumerate(db.execute(text(c_q)).fetchall(), 1):
             curso_raw, unicos, total = r[0], r[1], r[2]
-            es_cied = 'CIED' in curso_raw.upper()
-            m_s = re.search(r'\(([^)]+)\)', curso_raw)
-            sede_r = normalizar_sede(m_s.group(1).strip()) if m_s else 'Sin sede'
-            mod = 'CIED' if (es_cied or sede_r in ['Online - Interior']) else 'Presencial'
-            es_bce = 'BCE' in curso_raw.upper() or 'SECUNDARIO' in curso_raw.upper()
-            tipo = 'BCE' if es_bce else ('BEA' if 'BEA' in curso_raw.upper() else 'Superior')
-            ws_cur.append([i, curso_raw, sede_r, mod, tipo, unicos, total])
+            if r[4]: sede_r, mod, tipo = r[3], r[4], r[5]
+            else:
+                cc = clasificar_curso(curso_raw); sede_r, mod, tipo = cc["sede"], cc["modalidad"], cc["tipo_curso"]
+            ws_cur.append([i, curso_raw, sede_r or 'Sin sede', mod, tipo, unicos, total])
     except: pass
     for col, w in [('A',4),('B',60),('C',18),('D',12),('E',10),('F',16),('G',14)]:
         ws_cur.column_dimensions[col].width = w
@@ -2817,7 +3620,7 @@ def exportar_horarios(cuatrimestre_id: int = None, db: Session = Depends(get_db)
     # ========== HOJA: Horarios por Día y Sede ==========
     DIAS_ORDEN = ['Lunes','Martes','Miércoles','Jueves','Viernes','Sábado']
     HORAS_EXPORT = ['07:00','08:00','09:00','10:00','11:00','12:00','13:00','14:00','17:00','18:00','19:00','20:00','21:00','22:00','23:00']
-    for sede_db_obj in [None] + list(db.query(Sede).all()):
+    for sede_db_obj in [None] + list(referencias(db).sedes):
         if sede_db_obj:
             sede_asigs_dia = [a for a in asigs if a.sede_id == sede_db_obj.id]
             sheet_name = f"Horario {sede_db_obj.nombre}"[:31]
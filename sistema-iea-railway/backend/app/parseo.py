@@ -0,0 +1,284 @@
+"""
+Lectura y parseo de planillas de importación (xlsx y CSV/TSV).
+
+Módulo sin dependencias de la app ni de la base: lo importan los procesos del pool de parseo
+(ver parsear_hojas), que arrancan con "spawn" y no deben ejecutar el arranque de app.main.
+"""
+import os
+import re
+import io
+import csv
+import codecs
+import threading
+import multiprocessing
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from openpyxl import load_workbook
+
+
+# ===== v17.0: Fuente de filas: xlsx (openpyxl read-only) o CSV/TSV con la misma interfaz =====
+class HojaCSV:
+    def __init__(self, libro, title):
+        self.title = title
+        self._libro = libro
+
+    def iter_rows(self, min_row=1, max_row=None, values_only=True):
+        return self._libro._filas(min_row, max_row)
+
+class LibroCSV:
+    """
+    CSV/TSV presentado con la interfaz read-only de openpyxl que usan los importadores: sheetnames,
+    wb[nombre], worksheets, iteración y ws.iter_rows(min_row=..., values_only=True). Es un libro de una
+    hoja; las celdas vacías vuelven como None y las filas se completan al ancho del encabezado.
+    Encoding (UTF-8 o Windows-1252) y separador (, ; tab |) se detectan sobre el comienzo del archivo.
+    """
+    DELIMITADORES = ",;\t|"
+
+    def __init__(self, origen, titulo="Hoja1"):
+        self._propio = isinstance(origen, (str, os.PathLike))
+        self._f = open(origen, "rb") if self._propio else origen
+        self._f.seek(0)
+        muestra = self._f.read(64 * 1024)
+        try:
+            codecs.getincrementaldecoder("utf-8")().decode(muestra)
+            self._encoding = "utf-8-sig"
+        except UnicodeDecodeError:
+            self._encoding = "cp1252"
+        # Separador: el más frecuente en el encabezado (csv.Sniffer falla con filas de largo desparejo)
+        encabezado = muestra.decode(self._encoding, errors="ignore").splitlines()[:1] or [""]
+        self._delimitador = max(self.DELIMITADORES, key=encabezado[0].count) if encabezado[0] else ","
+        self.active = HojaCSV(self, titulo)
+        self.worksheets = [self.active]
+        self.sheetnames = [titulo]
+
+    def __getitem__(self, nombre):
+        if nombre not in self.sheetnames: raise KeyError(nombre)
+        return self.active
+
+    def __iter__(self):
+        return iter(self.worksheets)
+
+    def _filas(self, min_row, max_row):
+        self._f.seek(0)
+        texto = io.TextIOWrapper(self._f, encoding=self._encoding, errors="replace", newline="")
+        try:
+            ancho = 0
+            for n, fila in enumerate(csv.reader(texto, delimiter=self._delimitador), start=1):
+                if n == 1: ancho = len(fila)
+                if max_row and n > max_row: break
+                if n < min_row: continue
+                fila = [c if c != "" else None for c in fila]
+                if len(fila) < ancho: fila.extend([None] * (ancho - len(fila)))
+                yield tuple(fila)
+        finally:
+            texto.detach()  # el archivo de origen sigue abierto para otra pasada
+
+    def close(self):
+        if self._propio: self._f.close()
+
+def abrir_planilla(origen, titulo="Hoja1"):
+    """Ruta o archivo binario → libro read-only de openpyxl (xlsx) o LibroCSV. Un xlsx es un zip: se mira la firma."""
+    if isinstance(origen, (str, os.PathLike)):
+        with open(origen, "rb") as f: firma = f.read(4)
+    else:
+        origen.seek(0); firma = origen.read(4); origen.seek(0)
+    if firma == b"PK\x03\x04":
+        return load_workbook(origen, read_only=True)
+    return LibroCSV(origen, titulo)
+
+
+# ===== v5.0: Clasificación sede/turno/modalidad =====
+SEDES_NORMALIZADAS = {
+    'avellaneda': 'Avellaneda',
+    'caballito': 'Caballito',
+    'vicente lopez': 'Vicente López',
+    'vicente lópez': 'Vicente López',
+    'online interior': 'Online - Interior',
+    'online - interior': 'Online - Interior',
+    'online- interior': 'Online - Interior',
+    'online': 'Online - Interior',
+    'liniers': 'Liniers',
+}
+
+def normalizar_sede(texto):
+    if not texto:
+        return None
+    t = texto.strip().lower()
+    return SEDES_NORMALIZADAS.get(t, texto.strip())
+
+@lru_cache(maxsize=8192)
+def clasificar_alumno_curso(curso_texto):
+    """
+    Clasifica un alumno según su CURSO:
+    - es_cied: True si dice CIED o es Online/Interior
+    - sede_referencia: sede normalizada extraída del paréntesis
+    - modalidad_alumno: 'virtual' si CIED/Online, 'presencial' si no
+    """
+    if not curso_texto:
+        return 'virtual', None, True
+    curso = curso_texto.strip()
+    es_cied = 'CIED' in curso.upper()
+    # Extraer sede del paréntesis
+    m_sede = re.search(r'\(([^)]+)\)', curso)
+    sede_raw = m_sede.group(1).strip() if m_sede else None
+    sede = normalizar_sede(sede_raw) if sede_raw else None
+    # Online-Interior siempre es virtual (igual que CIED)
+    es_online = sede in ['Online - Interior'] if sede else False
+    if es_cied or es_online:
+        modalidad = 'virtual'
+    else:
+        modalidad = 'presencial'
+    return modalidad, sede, es_cied
+
+def extraer_turno_materia(materia_texto):
+    """Extrae el turno de la columna MATERIA: Mañana, Noche, Virtual"""
+    if not materia_texto:
+        return None
+    m = re.search(r'-\s*(Mañana|Noche|Virtual|Tarde)', materia_texto, re.IGNORECASE)
+    return m.group(1).capitalize() if m else None
+
+
+# ===== v17.0: Parseo de hojas en paralelo =====
+# Las planillas de inscripción traen una hoja por cátedra. El parseo (regex, nombres, clasificación)
+# es CPU puro: cada hoja se parsea en un proceso del pool y vuelve como tuplas planas; el merge contra
+# la base y la escritura quedan en el proceso principal.
+# Los procesos se crean con "spawn": la app ya corre threads (AnyIO, jobs, pool de SQLAlchemy) y un fork
+# heredaría locks tomados y sockets de la base. Un hijo "spawn" solo importa este módulo, que no depende
+# de la app ni de la base.
+PARSE_WORKERS_MAX = 4  # tope del default: cada proceso es un intérprete con openpyxl cargado
+
+def _cpus_disponibles():
+    """CPUs usables por este proceso: afinidad y, si hay, cuota del cgroup (contenedores de Railway)."""
+    try: cpus = len(os.sched_getaffinity(0))
+    except AttributeError: cpus = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:  # cgroup v2: "<cuota> <período>" o "max <período>"
+            cuota, periodo = f.read().split()[:2]
+        if cuota != "max": cpus = min(cpus, max(1, int(cuota) // int(periodo)))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+PARSE_WORKERS = int(os.environ.get("PARSE_WORKERS", "0")) or min(PARSE_WORKERS_MAX, _cpus_disponibles())
+PARSEO_PARALELO_MIN_BYTES = 512 * 1024  # por debajo, el costo de abrir el libro en cada proceso no compensa
+_PARSE_POOL = None
+_PARSE_POOL_LOCK = threading.Lock()
+
+def _pool_parseo():
+    global _PARSE_POOL
+    with _PARSE_POOL_LOCK:
+        if _PARSE_POOL is None:
+            _PARSE_POOL = ProcessPoolExecutor(max_workers=PARSE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _PARSE_POOL
+
+def _parsear_hoja(parser, ruta, hoja):
+    wb = abrir_planilla(ruta)
+    try:
+        return parser(wb[hoja])
+    finally:
+        wb.close()
+
+def parsear_hojas(ruta, parser):
+    """
+    Aplica parser(ws) a cada hoja del libro y devuelve los resultados en el orden de las hojas.
+    parser debe ser una función de este módulo y devolver datos picklables (tuplas, listas, strings).
+    Con varias hojas y un archivo grande, una hoja por tarea en el pool de procesos; si no, en serie.
+    """
+    wb = abrir_planilla(ruta)
+    try:
+        hojas = wb.sheetnames
+        if len(hojas) < 2 or PARSE_WORKERS < 2 or os.path.getsize(ruta) < PARSEO_PARALELO_MIN_BYTES:
+            return [parser(wb[h]) for h in hojas]
+    finally:
+        wb.close()
+    n = len(hojas)
+    return list(_pool_parseo().map(_parsear_hoja, [parser] * n, [ruta] * n, hojas))
+
+
+# ===== Parsers por hoja (corren en el pool) =====
+def parsear_hoja_alumnos(ws):
+    """
+    una hoja → (filas, edi_count), con filas =
+    [(dni, nombre, apellido, codigo, turno, modalidad, sede, curso, es_edi, edi_materia)].
+    """
+    # v16.0: find dominant code per sheet for EDI matching
+    # v17.0: dos pasadas en streaming sobre la hoja en vez de materializarla con list()
+    sheet_codes = {}
+    for pre_row in ws.iter_rows(min_row=2, values_only=True):
+        pv = [str(c).strip() if c is not None else "" for c in pre_row]
+        if len(pv) < 4: continue
+        pm = re.match(r'^(c\.\d+)', pv[3], re.IGNORECASE)
+        if pm:
+            pc = pm.group(1)
+            sheet_codes[pc] = sheet_codes.get(pc, 0) + 1
+    dominant_code = max(sheet_codes, key=sheet_codes.get) if sheet_codes else None
+    edi_count = 0
+    filas = []
+    for row in ws.iter_rows(min_row=2, values_only=True):
+        vals = [str(c).strip() if c is not None else "" for c in row]
+        if len(vals) < 4: continue
+        alumno_texto = vals[1]
+        dni_raw = str(vals[2]).strip() if vals[2] else ""
+        materia_texto = vals[3]
+        curso_texto = vals[4] if len(vals) > 4 else ""
+        dni = re.sub(r'[.\-\s]', '', dni_raw)
+        if '.' in dni:
+            try: dni = str(int(float(dni)))
+            except: pass
+        if not dni or len(dni) < 6: continue
+        m_cod = re.match(r'^(c\.\d+)', materia_texto, re.IGNORECASE)
+        is_edi = False; edi_mat = None
+        if not m_cod:
+            # v16.0: If it says EDI, use the dominant cátedra code of this sheet
+            if 'EDI' in materia_texto.upper() and dominant_code:
+                codigo = dominant_code
+                is_edi = True; edi_mat = materia_texto[:100]
+                edi_count += 1
+            else:
+                continue
+        else:
+            codigo = m_cod.group(1)
+        # v5.0: Clasificar por curso
+        modalidad_alumno, sede_ref, es_cied = clasificar_alumno_curso(curso_texto)
+        turno = extraer_turno_materia(materia_texto)
+        m_nombre = re.match(r'^(.+?)\s*\(\d+\)', alumno_texto)
+        nombre_completo = m_nombre.group(1).strip() if m_nombre else alumno_texto
+        partes = nombre_completo.strip().split(' ')
+        filas.append((dni, ' '.join(partes[:-1]) if len(partes) >= 2 else nombre_completo,
+            partes[-1] if len(partes) >= 2 else "", codigo, turno, modalidad_alumno, sede_ref,
+            curso_texto[:200] if curso_texto else None, is_edi, edi_mat))
+    return filas, edi_count
+
+def parsear_hoja_bce_bea(ws):
+    """
+    una hoja → (filas, errores), con filas =
+    [(nombre, dni, materia, curso, codigo_materia, codigo_curso, sede)].
+    """
+    filas = []; errores = []
+    for row in ws.iter_rows(min_row=2, values_only=True):
+        try:
+            vals = list(row)
+            if len(vals) < 5: continue
+            alumno_nombre = str(vals[1] or '').strip()
+            dni = str(vals[2] or '').strip()
+            materia = str(vals[3] or '').strip()
+            curso = str(vals[4] or '').strip()
+            if not alumno_nombre or not materia: continue
+            # Códigos candidatos: primero el de la materia, después el del curso
+            cod_materia = re.search(r'c\.(\d+)', materia)
+            cod_curso = re.search(r'c\.(\d+)', curso)
+            # Determine BCE or BEA
+            es_bea = 'BEA' in curso.upper() or 'BEA' in materia.upper()
+            if es_bea:
+                sede_ref = 'Caballito'
+            else:
+                sede_match = re.search(r'\(([^)]+)\)', curso)
+                sede_ref = normalizar_sede(sede_match.group(1).strip()) if sede_match else 'Online - Interior'
+            # Clean DNI
+            dni = re.sub(r'[^\d]', '', dni)[:10]
+            filas.append((re.sub(r'\s*\(.*\)', '', alumno_nombre).strip(), dni, materia, curso,
+                f"c.{cod_materia.group(1)}" if cod_materia else None,
+                f"c.{cod_curso.group(1)}" if cod_curso else None, sede_ref))
+        except Exception as e:
+            errores.append(str(e)[:100])
+    return filas, errores
@@ -0,0 +1,47 @@
+"""Planillas sintéticas con el formato del export de inscripciones (una hoja por cátedra) para los benchmarks."""
+import csv
+import os
+import random
+import sys
+
+# Los scripts se corren desde backend/ o desde bench/: el paquete app tiene que ser importable igual
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ENCABEZADO = ["Nro", "Alumno", "DNI", "Materia", "Curso"]
+CURSOS = [
+    "Profesorado de Educación Primaria (Caballito)",
+    "Profesorado de Educación Inicial (Avellaneda)",
+    "Tecnicatura en Administración (Vicente López)",
+    "Profesorado de Educación Primaria - CIED (Online - Interior)",
+]
+TURNOS = ["Mañana", "Noche", "Virtual"]
+CODIGO_BASE = 9000  # códigos de cátedra del benchmark: c.9000, c.9001, ...
+
+def generar_hojas(filas, hojas, semilla=17):
+    """{nombre_hoja: [filas]} con `filas` filas repartidas en `hojas` cátedras; ~2% son EDI."""
+    rnd = random.Random(semilla)
+    por_hoja = {}
+    for i in range(filas):
+        h = i % hojas
+        codigo = f"c.{CODIGO_BASE + h}"
+        dni = str(90000000 + rnd.randrange(filas * 2))
+        materia = f"Taller EDI {h}" if rnd.random() < 0.02 else f"{codigo} Materia {h} - {rnd.choice(TURNOS)}"
+        por_hoja.setdefault(f"{codigo}", []).append(
+            [i + 1, f"Apellido{i} Nombre{i} ({dni})", dni, materia, rnd.choice(CURSOS)])
+    return por_hoja
+
+def escribir_xlsx(ruta, por_hoja):
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    for nombre, filas in por_hoja.items():
+        ws = wb.create_sheet(nombre[:31])
+        ws.append(ENCABEZADO)
+        for fila in filas: ws.append(fila)
+    wb.save(ruta)
+
+def escribir_csv(ruta, por_hoja, delimitador=";"):
+    """Todas las hojas en un solo CSV (un CSV es un libro de una hoja)."""
+    with open(ruta, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f, delimiter=delimitador)
+        w.writerow(ENCABEZADO)
+        for filas in por_hoja.values(): w.writerows(filas)
@@ -0,0 +1,51 @@
+"""
+Benchmark de ingesta CSV contra xlsx: escribe los mismos datos como xlsx de una hoja y como CSV y mide
+parsear_hojas(ruta, parsear_hoja_alumnos) sobre cada uno (filas por segundo y tamaño del archivo).
+
+Con una sola hoja parsear_hojas corre en serie, así que la comparación es openpyxl read-only contra el
+módulo csv, sin el pool de procesos de por medio.
+
+    cd backend
+    python bench/bench_csv_vs_xlsx.py --filas 50000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from _planillas import escribir_csv, escribir_xlsx, generar_hojas
+from app.parseo import parsear_hoja_alumnos, parsear_hojas
+
+def medir(nombre, ruta, filas):
+    t0 = time.perf_counter()
+    hojas = parsear_hojas(ruta, parsear_hoja_alumnos)
+    dur = time.perf_counter() - t0
+    leidas = sum(len(f) for f, _ in hojas)
+    print(f"{nombre:<5} {os.path.getsize(ruta) / 1e6:6.1f} MB  {dur:6.2f} s  → {filas / dur:>9,.0f} filas/s  ({leidas:,} filas válidas)")
+    return hojas
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--filas", type=int, default=20000)
+    ap.add_argument("--hojas", type=int, default=20, help="cátedras entre las que se reparten las filas")
+    args = ap.parse_args()
+    por_hoja = generar_hojas(args.filas, args.hojas)
+    # Un CSV es un libro de una hoja: el xlsx lleva las mismas filas en una sola hoja para comparar lo mismo
+    una_hoja = {"Hoja1": [fila for filas in por_hoja.values() for fila in filas]}
+    rutas = []
+    try:
+        for sufijo in (".xlsx", ".csv"):
+            fd, ruta = tempfile.mkstemp(suffix=sufijo); os.close(fd); rutas.append(ruta)
+        ruta_xlsx, ruta_csv = rutas
+        escribir_xlsx(ruta_xlsx, una_hoja)
+        escribir_csv(ruta_csv, una_hoja)
+        print(f"{args.filas:,} filas de {args.hojas} cátedras")
+        xlsx = medir("xlsx", ruta_xlsx, args.filas)
+        csv_ = medir("csv", ruta_csv, args.filas)
+        if xlsx != csv_:
+            print("⚠️ los dos formatos no produjeron las mismas filas")
+    finally:
+        for ruta in rutas: os.remove(ruta)
+
+if __name__ == "__main__":
+    main()
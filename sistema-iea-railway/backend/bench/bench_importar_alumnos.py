@@ -0,0 +1,65 @@
+"""
+Benchmark de /api/importar/alumnos: filas por segundo del parseo (parsear_hojas + parsear_hoja_alumnos)
+y, con --db, del merge + escritura (_importar_alumnos) contra la base de DATABASE_URL.
+
+La escritura corre dentro de una transacción externa que se descarta al final (los commit del importador
+quedan en savepoints): no deja datos en la base, pero conviene apuntar a una base de prueba.
+
+    cd backend
+    python bench/bench_importar_alumnos.py --filas 50000 --hojas 40
+    DATABASE_URL=postgresql://... python bench/bench_importar_alumnos.py --filas 50000 --hojas 40 --db
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from _planillas import CODIGO_BASE, escribir_xlsx, generar_hojas
+from app.parseo import PARSE_WORKERS, parsear_hoja_alumnos, parsear_hojas
+
+def medir_escritura(hojas_parseadas, n_hojas, filas):
+    from sqlalchemy.dialects.postgresql import insert as pg_insert
+    from sqlalchemy.orm import Session
+    from app.database import engine
+    from app.main import _importar_alumnos, Catedra, Cuatrimestre
+    conn = engine.connect()
+    externa = conn.begin()
+    db = Session(bind=conn, join_transaction_mode="create_savepoint")
+    try:
+        db.execute(pg_insert(Catedra.__table__).values([{"codigo": f"c.{CODIGO_BASE + h}", "nombre": f"Bench {h}"}
+            for h in range(n_hojas)]).on_conflict_do_nothing(index_elements=["codigo"]))
+        cuat = db.query(Cuatrimestre).order_by(Cuatrimestre.id).first()
+        if not cuat:
+            cuat = Cuatrimestre(nombre="Bench", anio=2099, numero=1, activo=False); db.add(cuat); db.flush()
+        t0 = time.perf_counter()
+        resultado = _importar_alumnos(hojas_parseadas, cuat.id, db)
+        dur = time.perf_counter() - t0
+        print(f"merge + escritura: {dur:.2f} s  → {filas / dur:,.0f} filas/s  "
+            f"(alumnos nuevos {resultado['alumnos_nuevos']}, inscripciones nuevas {resultado['inscripciones_nuevas']})")
+    finally:
+        db.close()
+        externa.rollback()
+        conn.close()
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--filas", type=int, default=20000)
+    ap.add_argument("--hojas", type=int, default=20)
+    ap.add_argument("--db", action="store_true", help="medir también merge + escritura contra DATABASE_URL")
+    args = ap.parse_args()
+    por_hoja = generar_hojas(args.filas, args.hojas)
+    fd, ruta = tempfile.mkstemp(suffix=".xlsx"); os.close(fd)
+    try:
+        escribir_xlsx(ruta, por_hoja)
+        print(f"{args.filas:,} filas en {args.hojas} hojas, {os.path.getsize(ruta) / 1e6:.1f} MB, PARSE_WORKERS={PARSE_WORKERS}")
+        t0 = time.perf_counter()
+        hojas = parsear_hojas(ruta, parsear_hoja_alumnos)
+        dur = time.perf_counter() - t0
+        print(f"parseo:            {dur:.2f} s  → {args.filas / dur:,.0f} filas/s")
+        if args.db:
+            medir_escritura(hojas, args.hojas, args.filas)
+    finally:
+        os.remove(ruta)
+
+if __name__ == "__main__":
+    main()
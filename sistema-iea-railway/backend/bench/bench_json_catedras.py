@@ -0,0 +1,87 @@
+"""
+Benchmark de serialización de GET /api/catedras: JSONResponse de FastAPI (jsonable_encoder + json) contra
+JSONRapida (orjson si está instalado, si no json de la stdlib), con y sin gzip al nivel que usa
+GZipMiddleware. Reporta ms por render y bytes en el cable.
+
+El payload se genera con la misma forma que arma get_catedras; no toca la base (la app se importa contra
+SQLite en memoria salvo que DATABASE_URL esté definida).
+
+    cd backend
+    python bench/bench_json_catedras.py --catedras 400 --asignaciones 6
+"""
+import argparse
+import gzip
+import os
+import random
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from _planillas import CODIGO_BASE  # noqa: E402  (agrega backend/ al sys.path)
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from app.main import JSONRapida, orjson  # noqa: E402
+
+NIVEL_GZIP = 9  # compresslevel por defecto de GZipMiddleware
+DIAS = ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado"]
+MODALIDADES = ["presencial_virtual", "virtual_tm", "virtual_tn", "sabado"]
+SEDES = ["Avellaneda", "Caballito", "Vicente López", "Online - Interior"]
+
+def generar_catedras(n, asignaciones, semilla=13):
+    """Lista de cátedras con las claves que devuelve get_catedras."""
+    rnd = random.Random(semilla)
+    result = []
+    for i in range(n):
+        d = {k: rnd.randrange(60) for k in ("tm_av", "tm_cab", "tm_vl", "tm_cied", "tn_av", "tn_cab", "tn_vl", "tn_cied", "virt_cied")}
+        tm_total = d["tm_av"] + d["tm_cab"] + d["tm_vl"] + d["tm_cied"]
+        tn_total = d["tn_av"] + d["tn_cab"] + d["tn_vl"] + d["tn_cied"]
+        sin_clasificar = rnd.randrange(5)
+        inscriptos = tm_total + tn_total + d["virt_cied"] + sin_clasificar
+        asigs = [{
+            "id": i * asignaciones + j, "modalidad": rnd.choice(MODALIDADES), "dia": rnd.choice(DIAS),
+            "hora_inicio": f"{rnd.randrange(8, 22):02d}:00", "hora_fin": None, "sede_id": rnd.randrange(1, 5),
+            "sede_nombre": rnd.choice(SEDES), "recibe_alumnos_presenciales": rnd.random() < 0.5,
+            "docente": {"id": rnd.randrange(1, 900), "nombre": f"Nombre{j} Apellido{i}"},
+        } for j in range(asignaciones)]
+        result.append({
+            "id": i + 1, "codigo": f"c.{CODIGO_BASE + i}", "nombre": f"Cátedra de prueba {i} - Didáctica y práctica",
+            "link_meet": f"https://meet.google.com/abc-{i:04d}-xyz" if i % 3 else None,
+            "notas": None, "decision_apertura": rnd.choice([None, "abrir", "cerrar"]),
+            "inscriptos": inscriptos, **d, "tm_total": tm_total, "tn_total": tn_total,
+            "sede_av": d["tm_av"] + d["tn_av"], "sede_cab": d["tm_cab"] + d["tn_cab"],
+            "sede_vl": d["tm_vl"] + d["tn_vl"], "sede_cied": d["tm_cied"] + d["tn_cied"] + d["virt_cied"],
+            "sin_clasificar": sin_clasificar,
+            "docentes_sugeridos": (1 if inscriptos <= 100 else (1 + -(-max(0, inscriptos - 100) // 100))) if inscriptos >= 10 else 0,
+            "cursos_vinculados": [{"id": i, "curso_id": i, "curso_nombre": f"Curso {i}", "turno": rnd.choice(["Mañana", "Noche"]),
+                "sede_nombre": rnd.choice(SEDES)}],
+            "asignaciones": asigs,
+        })
+    return result
+
+def medir(nombre, render, repeticiones):
+    cuerpo = render()
+    t0 = time.perf_counter()
+    for _ in range(repeticiones):
+        render()
+    ms = (time.perf_counter() - t0) * 1000 / repeticiones
+    t0 = time.perf_counter()
+    for _ in range(repeticiones):
+        comprimido = gzip.compress(cuerpo, compresslevel=NIVEL_GZIP)
+    ms_gzip = (time.perf_counter() - t0) * 1000 / repeticiones
+    print(f"{nombre:<14} {ms:8.2f} ms {len(cuerpo):>11,} B   +gzip {ms + ms_gzip:8.2f} ms {len(comprimido):>9,} B")
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--catedras", type=int, default=400)
+    ap.add_argument("--asignaciones", type=int, default=6, help="asignaciones por cátedra")
+    ap.add_argument("--repeticiones", type=int, default=20)
+    args = ap.parse_args()
+    payload = generar_catedras(args.catedras, args.asignaciones)
+    print(f"{args.catedras} cátedras × {args.asignaciones} asignaciones, JSONRapida con "
+        f"{'orjson' if orjson is not None else 'json (stdlib)'}, gzip nivel {NIVEL_GZIP}")
+    # Lo que hace FastAPI cuando el endpoint devuelve el dict/lista sin envolver
+    medir("JSONResponse", lambda: JSONResponse(jsonable_encoder(payload)).body, args.repeticiones)
+    medir("JSONRapida", lambda: JSONRapida(payload).body, args.repeticiones)
+
+if __name__ == "__main__":
+    main()
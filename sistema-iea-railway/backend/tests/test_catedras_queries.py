@@ -0,0 +1,91 @@
+"""
+Presupuesto de consultas de GET /api/catedras: la cantidad de sentencias SQL no puede depender de la
+cantidad de cátedras (sin N+1 por asignaciones, docentes, sedes ni cursos vinculados).
+
+Corre contra SQLite en memoria: la app se importa con DATABASE_URL apuntando ahí.
+"""
+import os
+import sys
+
+os.environ["DATABASE_URL"] = "sqlite://"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from sqlalchemy import event, text
+
+from app.database import engine, SessionLocal
+from app import main
+from app.main import (Asignacion, Catedra, CatedraCurso, Cuatrimestre, Curso, Docente, Sede,
+    get_catedras, _DESGLOSE_CACHE)
+
+PRESUPUESTO_CONSULTAS = 5
+CUATRIMESTRE = 1
+
+# En producción la crea run_migration; sin ella el desglose falla, hace rollback y expira las cátedras
+# ya cargadas (cada acceso posterior sería una consulta más).
+ROLLUP_DDL = """CREATE TABLE IF NOT EXISTS inscripciones_rollup (
+    cuatrimestre_id INTEGER NOT NULL, catedra_id INTEGER NOT NULL,
+    turno VARCHAR NOT NULL DEFAULT '', sede_key VARCHAR NOT NULL DEFAULT '',
+    modalidad VARCHAR NOT NULL DEFAULT '', count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (cuatrimestre_id, catedra_id, turno, sede_key, modalidad))"""
+
+@pytest.fixture
+def db():
+    sesion = SessionLocal()
+    sesion.execute(text(ROLLUP_DDL))
+    for modelo in (Asignacion, CatedraCurso, Curso, Catedra, Docente, Sede, Cuatrimestre):
+        sesion.query(modelo).delete()
+    sesion.add(Cuatrimestre(id=CUATRIMESTRE, nombre="1er Cuatrimestre 2026", anio=2026, numero=1, activo=True))
+    sesion.commit()
+    _DESGLOSE_CACHE.clear()
+    yield sesion
+    sesion.close()
+
+def poblar(db, n):
+    sede = Sede(nombre="Caballito", color="bg-blue-500")
+    db.add(sede); db.flush()
+    for i in range(n):
+        cat = Catedra(codigo=f"c.{i + 1}", nombre=f"Cátedra {i + 1}")
+        doc = Docente(dni=f"{20000000 + i}", nombre=f"Nombre{i}", apellido=f"Apellido{i}")
+        curso = Curso(nombre=f"Curso {i}", sede_id=sede.id)
+        db.add_all([cat, doc, curso]); db.flush()
+        db.add_all([
+            Asignacion(catedra_id=cat.id, docente_id=doc.id, cuatrimestre_id=CUATRIMESTRE, modalidad="presencial_virtual",
+                dia="Lunes", hora_inicio="19:00", sede_id=sede.id),
+            Asignacion(catedra_id=cat.id, docente_id=doc.id, cuatrimestre_id=CUATRIMESTRE, modalidad="virtual_tn",
+                dia="Martes", hora_inicio="18:00"),
+            CatedraCurso(catedra_id=cat.id, curso_id=curso.id, turno="Noche", sede_id=sede.id),
+        ])
+    db.commit()
+    db.expire_all()
+
+def contar_consultas(db):
+    sentencias = []
+    def registrar(conn, cursor, statement, parameters, context, executemany):
+        sentencias.append(statement)
+    event.listen(engine, "before_cursor_execute", registrar)
+    try:
+        respuesta = get_catedras(cuatrimestre_id=CUATRIMESTRE, db=db)
+    finally:
+        event.remove(engine, "before_cursor_execute", registrar)
+    return sentencias, respuesta
+
+@pytest.mark.parametrize("n", [1, 40])
+def test_get_catedras_presupuesto_fijo(db, n):
+    poblar(db, n)
+    sentencias, respuesta = contar_consultas(db)
+    assert len(sentencias) <= PRESUPUESTO_CONSULTAS, sentencias
+    cuerpo = main.json.loads(respuesta.body)
+    assert len(cuerpo) == n
+    assert all(len(c["asignaciones"]) == 2 and c["asignaciones"][0]["docente"] for c in cuerpo)
+    assert all(len(c["cursos_vinculados"]) == 1 and c["cursos_vinculados"][0]["sede_nombre"] == "Caballito" for c in cuerpo)
+
+def test_get_catedras_no_crece_con_las_catedras(db):
+    poblar(db, 1)
+    una, _ = contar_consultas(db)
+    for modelo in (Asignacion, CatedraCurso, Curso, Catedra, Docente, Sede):
+        db.query(modelo).delete()
+    db.commit(); _DESGLOSE_CACHE.clear()
+    poblar(db, 30)
+    muchas, _ = contar_consultas(db)
+    assert len(una) == len(muchas)
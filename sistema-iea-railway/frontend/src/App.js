@@ -2621,8 +2621,12 @@ function ImportarView({ recargar, cuatrimestres, cuatrimestre }) {
               <button onClick={async () => {
                 setUploading('Aplicar Horarios');
                 try {
-                  const form = new FormData(); form.append('file', horariosPreview.file);
-                  const res = await fetch(`${API_URL}/api/importar/horarios-aplicar?cuatrimestre_id=${cuatriSeleccionado}`, { method: 'POST', body: form });
+                  // Con token se aplica el parseo del preview sin volver a subir el Excel; si venció (410), se sube el archivo
+                  const aplicarUrl = `${API_URL}/api/importar/horarios-aplicar?cuatrimestre_id=${cuatriSeleccionado}`;
+                  const subirArchivoHorarios = () => { const form = new FormData(); form.append('file', horariosPreview.file); return fetch(aplicarUrl, { method: 'POST', body: form }); };
+                  const token = horariosPreview.data.token;
+                  let res = token ? await fetch(`${aplicarUrl}&token=${encodeURIComponent(token)}`, { method: 'POST' }) : await subirArchivoHorarios();
+                  if (token && res.status === 410) res = await subirArchivoHorarios();
                   if (!res.ok) { const txt = await res.text(); throw new Error(txt); }
                   const data = await res.json();
                   if (data.error) { alert('⚠️ ' + data.error); setUploading(null); return; }